@@ -0,0 +1,119 @@
+"""partition messages and call_logs by month
+
+Converts the plain tables created by older versions into RANGE-partitioned
+ones (monthly partitions named <table>_pYYYY_MM, see
+backend/app/services/partitions.py). Rows are copied inside the migration
+transaction, so run it with the API stopped. Databases created by the
+current code already have partitioned tables and are left as they are.
+
+Revision ID: 3c1f0a7d2b91
+Revises:
+Create Date: 2026-10-19 09:00:00
+
+"""
+from datetime import date, datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID
+
+
+# revision identifiers, used by Alembic.
+revision = '3c1f0a7d2b91'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+PREMAKE_MONTHS = 2
+
+
+def _columns(table):
+    if table == "messages":
+        return [
+            sa.Column("id", UUID(as_uuid=True), nullable=False),
+            sa.Column("room_id", UUID(as_uuid=True), sa.ForeignKey("rooms.id", ondelete="CASCADE"), nullable=False),
+            sa.Column("user_id", UUID(as_uuid=True), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+            sa.Column("content_ciphertext", sa.Text(), nullable=False),
+            sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        ]
+    return [
+        sa.Column("id", UUID(as_uuid=True), nullable=False),
+        sa.Column("room_id", UUID(as_uuid=True), sa.ForeignKey("rooms.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("user_id", UUID(as_uuid=True), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("joined_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("left_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("duration_seconds", sa.Integer(), nullable=True),
+    ]
+
+
+KEYS = {"messages": "created_at", "call_logs": "joined_at"}
+INDEXES = {
+    "messages": [("ix_messages_room_created", ["room_id", "created_at"])],
+    "call_logs": [("ix_call_logs_left_at_id", ["left_at", "id"]), ("ix_call_logs_room_joined", ["room_id", "joined_at"])],
+}
+
+
+def _relkind(table):
+    return op.get_bind().execute(sa.text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:t)"), {"t": table}).scalar()
+
+
+def _add_months(month, n):
+    m = month.month - 1 + n
+    return date(month.year + m // 12, m % 12 + 1, 1)
+
+
+def _create_partitions(table, old):
+    key = KEYS[table]
+    lo, hi = op.get_bind().execute(sa.text(f"SELECT min({key}), max({key}) FROM {old}")).one()
+    now = datetime.now(timezone.utc)
+    month = date((lo or now).year, (lo or now).month, 1)
+    last = max(_add_months(date(now.year, now.month, 1), PREMAKE_MONTHS), date((hi or now).year, (hi or now).month, 1))
+    while month <= last:
+        op.execute(
+            f"CREATE TABLE {table}_p{month:%Y_%m} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') TO ('{_add_months(month, 1).isoformat()} 00:00:00+00')"
+        )
+        month = _add_months(month, 1)
+
+
+def _set_aside(table, suffix):
+    # index names are schema-wide, so free them up for the new table
+    op.execute(f"ALTER TABLE {table} RENAME TO {table}_{suffix}")
+    op.execute(f"ALTER TABLE {table}_{suffix} RENAME CONSTRAINT {table}_pkey TO {table}_{suffix}_pkey")
+    for name, _ in INDEXES[table]:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+def _copy(table, old):
+    names = ", ".join(c.name for c in _columns(table))
+    op.execute(f"INSERT INTO {table} ({names}) SELECT {names} FROM {old}")
+    op.execute(f"DROP TABLE {old}")
+
+
+def upgrade() -> None:
+    for table, key in KEYS.items():
+        if _relkind(table) != "r":
+            # missing (create_all makes it partitioned) or already partitioned
+            continue
+        _set_aside(table, "unpartitioned")
+        op.create_table(
+            table,
+            *_columns(table),
+            sa.PrimaryKeyConstraint("id", key, name=f"{table}_pkey"),
+            postgresql_partition_by=f"RANGE ({key})",
+        )
+        for name, cols in INDEXES[table]:
+            op.create_index(name, table, cols)
+        _create_partitions(table, f"{table}_unpartitioned")
+        _copy(table, f"{table}_unpartitioned")
+
+
+def downgrade() -> None:
+    for table in KEYS:
+        if _relkind(table) != "p":
+            continue
+        _set_aside(table, "partitioned")
+        op.create_table(table, *_columns(table), sa.PrimaryKeyConstraint("id", name=f"{table}_pkey"))
+        for name, cols in INDEXES[table]:
+            op.create_index(name, table, cols)
+        _copy(table, f"{table}_partitioned")
@@ -0,0 +1,37 @@
+"""index user foreign keys
+
+Deleting a user (the guest cleanup job does it in batches) cascades into
+every table that references users; without an index on the referencing
+column each deleted row costs a full scan of that table.
+
+Revision ID: 8e4b6d1c5a07
+Revises: 3c1f0a7d2b91
+Create Date: 2026-10-19 12:00:00
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '8e4b6d1c5a07'
+down_revision = '3c1f0a7d2b91'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("ix_participants_user_room", "participants", ["user_id", "room_id"]),
+    ("ix_messages_user", "messages", ["user_id"]),
+    ("ix_call_logs_user", "call_logs", ["user_id"]),
+    ("ix_key_bundles_user", "key_bundles", ["user_id"]),
+    ("ix_rooms_owner", "rooms", ["owner_id"]),
+]
+
+
+def upgrade() -> None:
+    for name, table, cols in INDEXES:
+        op.create_index(name, table, cols, if_not_exists=True)
+
+
+def downgrade() -> None:
+    for name, table, _ in INDEXES:
+        op.drop_index(name, table_name=table, if_exists=True)
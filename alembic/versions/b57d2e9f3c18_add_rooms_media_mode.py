@@ -0,0 +1,29 @@
+"""add rooms.media_mode
+
+Revision ID: b57d2e9f3c18
+Revises: 8e4b6d1c5a07
+Create Date: 2026-10-19 15:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b57d2e9f3c18'
+down_revision = '8e4b6d1c5a07'
+branch_labels = None
+depends_on = None
+
+
+def _has_column(table, column):
+    return column in {c["name"] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade() -> None:
+    if not _has_column("rooms", "media_mode"):
+        op.add_column("rooms", sa.Column("media_mode", sa.String(length=8), server_default="mesh", nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column("rooms", "media_mode")
@@ -0,0 +1,34 @@
+"""call log owner
+
+Every call log records the worker that writes it, so a starting worker
+sweeps only the logs of workers that are gone (hub_workers itself is
+created on startup like hub_nodes).
+
+Revision ID: c4e7f9a2b813
+Revises: f3b8e1a7c624
+Create Date: 2026-10-19 20:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4e7f9a2b813'
+down_revision = 'f3b8e1a7c624'
+branch_labels = None
+depends_on = None
+
+
+def _has_column(table, column):
+    return column in {c["name"] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade() -> None:
+    # on the partitioned parent, so every partition gets it
+    if not _has_column("call_logs", "worker_id"):
+        op.add_column("call_logs", sa.Column("worker_id", sa.String(length=32), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("call_logs", "worker_id")
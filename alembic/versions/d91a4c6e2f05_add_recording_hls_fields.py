@@ -0,0 +1,35 @@
+"""add recordings HLS manifest and thumbnail
+
+Revision ID: d91a4c6e2f05
+Revises: b57d2e9f3c18
+Create Date: 2026-10-19 17:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd91a4c6e2f05'
+down_revision = 'b57d2e9f3c18'
+branch_labels = None
+depends_on = None
+
+
+def _has_column(table, column):
+    return column in {c["name"] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade() -> None:
+    if not _has_column("recordings", "manifest_key"):
+        op.add_column("recordings", sa.Column("manifest_key", sa.String(length=512), nullable=True))
+    if not _has_column("recordings", "manifest_url"):
+        op.add_column("recordings", sa.Column("manifest_url", sa.String(length=1024), nullable=True))
+    if not _has_column("recordings", "thumbnail_url"):
+        op.add_column("recordings", sa.Column("thumbnail_url", sa.String(length=1024), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("recordings", "thumbnail_url")
+    op.drop_column("recordings", "manifest_url")
+    op.drop_column("recordings", "manifest_key")
@@ -0,0 +1,34 @@
+"""call log rolled_up
+
+Marks call logs already folded into the usage rollup, so a log whose
+left_at moves after it was counted is not counted again. Logs behind the
+rollup's high-water mark are never read again and keep the default.
+
+Revision ID: e5a2d8c7f410
+Revises: c4e7f9a2b813
+Create Date: 2026-10-19 21:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a2d8c7f410'
+down_revision = 'c4e7f9a2b813'
+branch_labels = None
+depends_on = None
+
+
+def _has_column(table, column):
+    return column in {c["name"] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade() -> None:
+    # a constant default: no table rewrite on Postgres 11+
+    if not _has_column("call_logs", "rolled_up"):
+        op.add_column("call_logs", sa.Column("rolled_up", sa.Boolean(), server_default=sa.false(), nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column("call_logs", "rolled_up")
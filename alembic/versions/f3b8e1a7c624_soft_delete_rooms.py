@@ -0,0 +1,36 @@
+"""soft delete rooms
+
+Revision ID: f3b8e1a7c624
+Revises: d91a4c6e2f05
+Create Date: 2026-10-19 18:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b8e1a7c624'
+down_revision = 'd91a4c6e2f05'
+branch_labels = None
+depends_on = None
+
+
+def _has_column(table, column):
+    return column in {c["name"] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade() -> None:
+    if not _has_column("rooms", "deleted_at"):
+        op.add_column("rooms", sa.Column("deleted_at", sa.DateTime(timezone=True), nullable=True))
+    if not _has_column("rooms", "purged_rows"):
+        op.add_column("rooms", sa.Column("purged_rows", sa.BigInteger(), server_default="0", nullable=False))
+    op.create_index(
+        "ix_rooms_deleted_at", "rooms", ["deleted_at"], postgresql_where=sa.text("deleted_at IS NOT NULL"), if_not_exists=True
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_rooms_deleted_at", table_name="rooms", if_exists=True)
+    op.drop_column("rooms", "purged_rows")
+    op.drop_column("rooms", "deleted_at")
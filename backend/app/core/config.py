@@ -11,6 +11,13 @@ class Settings(BaseSettings):
     access_token_expire_minutes: int = Field(default=60 * 24)
 
     database_url: str = Field(default="postgresql+psycopg://app:app@db:5432/app")
+    # Optional streaming replica for read-only routes. Reads stay on the
+    # primary while it lags more than REPLICA_MAX_LAG_S or is unreachable,
+    # and for READ_YOUR_WRITES_S after the same user committed a write
+    database_replica_url: str = Field(default="")
+    replica_max_lag_s: float = Field(default=2)
+    replica_check_interval_s: float = Field(default=1)
+    read_your_writes_s: float = Field(default=5)
 
     # Optional external IP for TURN, comes from env var TURN_EXTERNAL_IP
     turn_external_ip: str | None = Field(default=None)
@@ -23,8 +30,148 @@ class Settings(BaseSettings):
     s3_secret_key: str | None = Field(default=None, alias="S3_SECRET_KEY")
     s3_force_path_style: bool = Field(default=True, alias="S3_FORCE_PATH_STYLE")
 
+    # Relay RoomHub events (live roster) between workers via Postgres LISTEN/NOTIFY
+    hub_bus_enabled: bool = Field(default=False)
+    # Every worker re-broadcasts its share of the roster this often, so lost
+    # or dropped bus events heal; without the bus, rows loaded from the
+    # participants table are re-read after this long
+    roster_sync_s: float = Field(default=30)
+    # Outgoing frames buffered per socket before a slow client starts losing them
+    ws_send_queue_size: int = Field(default=256)
+    # Admission: distinct users connected to one room (across workers) and
+    # rooms / sockets held by one worker; 0 is unlimited. Over a limit a new
+    # socket is accepted into a FIFO waiting room and gets `waiting` frames
+    # with its position until a seat frees up; a full queue refuses it (1013)
+    room_max_connections: int = Field(default=0)
+    worker_max_rooms: int = Field(default=0)
+    worker_max_connections: int = Field(default=0)
+    ws_waiting_room_max: int = Field(default=100)
+    ws_waiting_timeout_s: float = Field(default=300)
+    # Load shedding: while event-loop lag (about a one second average) is
+    # above this, new sockets get 1013 and HTTP requests 503; 0 is off
+    shed_loop_lag_s: float = Field(default=0)
+    # Incoming frame limits as {frame type: [rate per second, burst]}, JSON in env
+    ws_conn_limits: dict[str, tuple[float, float]] = Field(default={
+        "signal": (50, 200),
+        "state": (10, 20),
+        "resync": (1, 3),
+        "sfu": (5, 20),
+    })
+    ws_room_limits: dict[str, tuple[float, float]] = Field(default={
+        "signal": (2000, 5000),
+        "state": (100, 200),
+        "sfu": (200, 500),
+    })
+    # is_speaking changes are coalesced to at most one broadcast per window
+    ws_speaking_debounce_ms: int = Field(default=250)
+    # server pings connections quiet for this long; clients answer with `pong`
+    ws_ping_interval_s: float = Field(default=20)
+    # connections with no frame for this long are closed and cleaned up
+    ws_idle_timeout_s: float = Field(default=60)
+
+    # Drain on deploy: clients get a `reconnect` frame with a resume token,
+    # spread over DRAIN_JITTER_MS; leftovers are closed after DRAIN_TIMEOUT_S.
+    # Keep the timeout below the container stop grace period (docker: 10s).
+    drain_on_sigterm: bool = Field(default=True)
+    drain_timeout_s: float = Field(default=8)
+    drain_jitter_ms: int = Field(default=5000)
+    resume_token_expire_minutes: int = Field(default=2)
+    # enables /admin endpoints when set
+    admin_token: str = Field(default="")
+
+    # Diagnostics, all off by default. The loop monitor samples event-loop
+    # lag and logs the loop thread's stack when something blocks it for
+    # DIAG_SLOW_CALLBACK_S; a fraction of requests can be timed (log line and
+    # Server-Timing header); /admin/profile samples stacks on demand
+    diag_loop_monitor_enabled: bool = Field(default=False)
+    diag_loop_interval_s: float = Field(default=0.1)
+    diag_slow_callback_s: float = Field(default=0.25)
+    diag_request_sample_rate: float = Field(default=0)
+    diag_profile_max_s: float = Field(default=60)
+
+    # Room placement: every room is served by one node, chosen by consistent
+    # hashing over the live nodes in hub_nodes. Needs HUB_BUS_ENABLED and one
+    # addressable URL per node (NODE_WS_URL, e.g. wss://node-1.example.com).
+    placement_enabled: bool = Field(default=False)
+    node_id: str = Field(default="")
+    node_ws_url: str = Field(default="")
+    node_heartbeat_s: float = Field(default=5)
+    # nodes silent for this long leave the ring
+    node_ttl_s: float = Field(default=15)
+    placement_vnodes: int = Field(default=160)
+
+    # SFU media mode: STUN servers for the server's own peer connections
+    # (JSON list in env) and a cap on publishers per room
+    sfu_stun_urls: list[str] = Field(default=[])
+    sfu_max_publishers: int = Field(default=25)
+
+    # Call logs are buffered and written in batches
+    calllog_flush_interval_ms: int = Field(default=1000)
+    calllog_batch_size: int = Field(default=500)
+    # close logs left open by workers that are gone when this one starts
+    calllog_sweep_on_startup: bool = Field(default=True)
+
+    # Every worker process heartbeats into hub_workers; one silent for
+    # WORKER_TTL_S is dead and the call logs it left open are closed
+    worker_heartbeat_s: float = Field(default=5)
+    worker_ttl_s: float = Field(default=30)
+
+    # Usage rollups from call_logs into usage_daily / room_daily_peak
+    analytics_rollup_enabled: bool = Field(default=True)
+    analytics_rollup_interval_s: int = Field(default=60)
+    analytics_rollup_batch_size: int = Field(default=5000)
+    # calls closed more recently than this are picked up on a later run
+    analytics_rollup_lag_s: int = Field(default=120)
+
+    # messages / call_logs are range-partitioned by month; partitions are
+    # created this many months ahead so inserts never miss one
+    partition_premake_months: int = Field(default=2)
+    partition_maintenance_interval_s: int = Field(default=3600)
+    # months that ended longer ago than this are dropped whole; 0 keeps everything
+    messages_retention_days: int = Field(default=0)
+    call_logs_retention_days: int = Field(default=0)
+
+    # Guests get a self-contained token; their users row is written only when
+    # something references it, and rows nothing references are deleted in batches
+    anon_gc_enabled: bool = Field(default=True)
+    anon_gc_interval_s: int = Field(default=3600)
+    anon_gc_batch_size: int = Field(default=1000)
+
+    # Deleted rooms are purged in the background, one batch of rows per
+    # statement; the grace period lets in-flight work (recording uploads) finish
+    room_purge_interval_s: float = Field(default=60)
+    room_purge_grace_s: float = Field(default=300)
+    room_purge_batch_size: int = Field(default=5000)
+
+    # invite code -> room cache; unknown codes are cached briefly too. Without
+    # the hub bus a regenerate or delete on another worker can't invalidate
+    # it, so the short TTL applies instead (to unknown codes as well); 0 turns
+    # the cache off
+    invite_cache_ttl_s: float = Field(default=60)
+    invite_cache_local_ttl_s: float = Field(default=2)
+    invite_cache_negative_ttl_s: float = Field(default=10)
+    invite_cache_max_size: int = Field(default=10000)
+
+    # (room, user) -> role cache behind require_role. Without the hub bus role
+    # changes made on another worker can't invalidate it, so the short TTL
+    # applies instead; 0 turns the cache off
+    role_cache_ttl_s: float = Field(default=300)
+    role_cache_local_ttl_s: float = Field(default=2)
+
+    # Server-Sent Events readers
+    sse_queue_size: int = Field(default=256)
+    sse_keepalive_s: float = Field(default=15)
+    # messages replayed per query when resuming from Last-Event-ID
+    sse_backlog_page: int = Field(default=500)
+
     # Recorder config
     ws_base_url: str = Field(default="ws://localhost:8000", alias="WS_BASE_URL")
+    # Finished recordings are remuxed to HLS (fMP4 segments) with a thumbnail
+    # in a separate process pool, then uploaded in parallel
+    recording_hls_enabled: bool = Field(default=True)
+    recording_postprocess_workers: int = Field(default=2)
+    recording_hls_segment_s: int = Field(default=4)
+    recording_upload_concurrency: int = Field(default=8)
 
     class Config:
         env_file = ".env"
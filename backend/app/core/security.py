@@ -3,16 +3,19 @@ from typing import Optional
 import bcrypt
 import jwt
 from ..core.config import settings
+from ..lib.metrics import BCRYPT
 
 
 def hash_password(password: str) -> str:
     salt = bcrypt.gensalt(rounds=12)
-    return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+    with BCRYPT.labels("hash").time():
+        return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
 
 
 def verify_password(password: str, password_hash: str) -> bool:
     try:
-        return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+        with BCRYPT.labels("verify").time():
+            return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
     except Exception:
         return False
 
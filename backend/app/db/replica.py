@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import threading
+import time
+
+from fastapi.requests import HTTPConnection
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker
+
+from ..core.config import settings
+from ..core.security import decode_token
+from ..lib.metrics import DB_READS, DB_REPLICA_LAG, instrument_db
+from .session import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+replica_engine = create_engine(settings.database_replica_url, future=True) if settings.database_replica_url else None
+ReadSessionLocal = sessionmaker(bind=replica_engine, autoflush=False, autocommit=False, future=True) if replica_engine else None
+if replica_engine is not None:
+    instrument_db(replica_engine, ReadSessionLocal)
+
+# seconds the replica is behind; an idle primary sends no WAL, so a replica
+# that has replayed everything it received counts as caught up
+LAG_SQL = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0"
+    " ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+# last measured lag; None until the first check succeeds and while the replica is unreachable
+_lag: dict[str, float | None] = {"s": None}
+# user id -> monotonic deadline of their read-your-writes window
+_recent_writes: dict[str, float] = {}
+MAX_RECENT_WRITES = 100_000
+# note_write runs in the threadpool from after_commit; pruning iterates the dict
+_writes_lock = threading.Lock()
+_pruned_at = {"t": 0.0}
+
+
+def _user_id(authorization: str | None) -> str | None:
+    if not authorization or not authorization.lower().startswith("bearer "):
+        return None
+    try:
+        return decode_token(authorization.split(" ", 1)[1]).get("sub")
+    except Exception:
+        return None
+
+
+def note_write(user_id) -> None:
+    """Send this user's reads to the primary for READ_YOUR_WRITES_S."""
+    if replica_engine is None or not user_id:
+        return
+    now = time.monotonic()
+    with _writes_lock:
+        # a full scan at most once per window: everything noted before the
+        # previous one has expired by then
+        if len(_recent_writes) >= MAX_RECENT_WRITES and now - _pruned_at["t"] >= settings.read_your_writes_s:
+            _pruned_at["t"] = now
+            for k in [k for k, deadline in _recent_writes.items() if deadline <= now]:
+                del _recent_writes[k]
+        _recent_writes[str(user_id)] = now + settings.read_your_writes_s
+
+
+def _wrote_recently(authorization: str | None) -> bool:
+    if not _recent_writes:
+        return False
+    user_id = _user_id(authorization)
+    deadline = _recent_writes.get(user_id) if user_id else None
+    if deadline is None:
+        return False
+    if deadline <= time.monotonic():
+        with _writes_lock:
+            _recent_writes.pop(user_id, None)
+        return False
+    return True
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _after_commit(session):
+    # get_db stores the caller's Authorization header on the session
+    authorization = session.info.get("authorization")
+    if replica_engine is not None and authorization:
+        note_write(_user_id(authorization))
+
+
+def read_target(authorization: str | None) -> str:
+    if replica_engine is None:
+        return "primary"
+    lag = _lag["s"]
+    if lag is None or lag > settings.replica_max_lag_s:
+        return "primary_lagging"
+    if _wrote_recently(authorization):
+        return "primary_recent_write"
+    return "replica"
+
+
+def get_read_db(conn: HTTPConnection):
+    """Session for read-only routes: the replica when it is configured and
+    caught up, the primary otherwise.
+
+    Read-your-writes is tracked per worker process; with several workers a
+    read that lands on another one is still bounded by REPLICA_MAX_LAG_S.
+    """
+    target = read_target(conn.headers.get("authorization"))
+    DB_READS.labels(target).inc()
+    db = ReadSessionLocal() if target == "replica" else SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def check_lag() -> float | None:
+    try:
+        with replica_engine.connect() as conn:
+            if replica_engine.dialect.name != "postgresql":
+                conn.execute(text("SELECT 1"))
+                return 0.0
+            lag = conn.execute(LAG_SQL).scalar()
+    except Exception as e:
+        logger.warning("replica.check_failed error=%s", e)
+        return None
+    return float(lag) if lag is not None else None
+
+
+class ReplicaMonitor:
+    """Measures replica lag every REPLICA_CHECK_INTERVAL_S for get_read_db."""
+
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+
+    async def start(self):
+        if replica_engine is not None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            lag = await asyncio.to_thread(check_lag)
+            if (lag is None) != (_lag["s"] is None):
+                logger.info("replica.%s lag=%s", "down" if lag is None else "up", lag)
+            _lag["s"] = lag
+            DB_REPLICA_LAG.set(lag if lag is not None else -1)
+            await asyncio.sleep(settings.replica_check_interval_s)
+
+
+replica_monitor = ReplicaMonitor()
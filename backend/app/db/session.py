@@ -1,17 +1,22 @@
+from fastapi.requests import HTTPConnection
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 from ..core.config import settings
+from ..lib.metrics import instrument_db
 
 engine = create_engine(settings.database_url, future=True)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+instrument_db(engine, SessionLocal)
 
 
 class Base(DeclarativeBase):
     pass
 
 
-def get_db():
+def get_db(conn: HTTPConnection):
     db = SessionLocal()
+    # commits made with it start the caller's read-your-writes window, see db/replica.py
+    db.info["authorization"] = conn.headers.get("authorization")
     try:
         yield db
     finally:
@@ -0,0 +1,222 @@
+import asyncio
+import gc
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from contextvars import ContextVar
+from functools import lru_cache
+
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+
+from ..core.config import settings
+from .metrics import GC_PAUSE, LOOP_LAG, LOOP_STALLS
+
+logger = logging.getLogger(__name__)
+
+
+class LoopMonitor:
+    """Event-loop lag sampler with a stall watchdog.
+
+    A task sleeps DIAG_LOOP_INTERVAL_S and records how late it woke up.
+    A thread watches the task's last wake-up; when the loop has not come
+    back for DIAG_SLOW_CALLBACK_S it captures the loop thread's stack,
+    which is then the callback that is blocking it (a sync DB call,
+    bcrypt, a long encode). GC pauses are timed alongside.
+
+    Load shedding (SHED_LOOP_LAG_S) needs only the sampler, so that
+    alone runs when shedding is on and diagnostics are off.
+    """
+
+    def __init__(self):
+        self.lag_s = 0.0
+        # moving average over about a second, what load shedding compares against
+        self.lag_avg = 0.0
+        self.stalls: deque[dict] = deque(maxlen=20)
+        self._task: asyncio.Task | None = None
+        self._watchdog: threading.Thread | None = None
+        self._stop = threading.Event()
+        self._loop_thread: int | None = None
+        self._tick = 0.0
+        self._stack: str | None = None
+        self._gc_t0: float | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self):
+        if self._task is not None or not (settings.diag_loop_monitor_enabled or settings.shed_loop_lag_s > 0):
+            return
+        self._loop_thread = threading.get_ident()
+        self._tick = time.monotonic()
+        self._task = asyncio.create_task(self._run())
+        if settings.diag_loop_monitor_enabled:
+            self._stop.clear()
+            self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._watchdog.start()
+            gc.callbacks.append(self._gc)
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self._watchdog is not None:
+            self._stop.set()
+            await asyncio.to_thread(self._watchdog.join)
+            self._watchdog = None
+            gc.callbacks.remove(self._gc)
+
+    async def _run(self):
+        interval = settings.diag_loop_interval_s
+        while True:
+            t0 = time.monotonic()
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            self._tick = now
+            self.lag_s = lag = max(0.0, now - t0 - interval)
+            self.lag_avg += (lag - self.lag_avg) * min(1.0, interval)
+            LOOP_LAG.observe(lag)
+            if self._watchdog is not None and lag >= settings.diag_slow_callback_s:
+                stack, self._stack = self._stack, None
+                LOOP_STALLS.inc()
+                self.stalls.append({"at": time.time(), "lag_s": round(lag, 4), "stack": stack})
+                logger.warning("loop.stall lag=%.3fs stack:\n%s", lag, stack or "(ended before the watchdog looked)")
+
+    def _watch(self):
+        slow = settings.diag_slow_callback_s
+        limit = settings.diag_loop_interval_s + slow
+        seen = None
+        while not self._stop.wait(slow / 2):
+            tick = self._tick
+            if tick != seen and time.monotonic() - tick > limit:
+                frame = sys._current_frames().get(self._loop_thread)
+                if frame is not None:
+                    self._stack = "".join(traceback.format_stack(frame))
+                seen = tick
+
+    def _gc(self, phase, info):
+        # collections stop every thread, so start/stop pairs never interleave
+        if phase == "start":
+            self._gc_t0 = time.perf_counter()
+        elif self._gc_t0 is not None:
+            GC_PAUSE.labels(str(info["generation"])).observe(time.perf_counter() - self._gc_t0)
+            self._gc_t0 = None
+
+
+loop_monitor = LoopMonitor()
+
+
+@lru_cache(maxsize=4096)
+def _frame_name(name: str, path: str, line: int) -> str:
+    i = path.rfind("site-packages/")
+    if i >= 0:
+        path = path[i + len("site-packages/"):]
+    elif path.startswith(os.getcwd()):
+        path = os.path.relpath(path)
+    return f"{name} ({path}:{line})"
+
+
+# one profile per worker at a time
+profile_lock = threading.Lock()
+
+
+def sample_stacks(seconds: float, interval: float) -> tuple[str, int]:
+    """Sample every other thread's stack for `seconds`.
+
+    Returns folded stacks, one "thread;outer;...;inner count" line per
+    distinct stack (flamegraph.pl, speedscope and inferno read it), and
+    the number of samples taken.
+    """
+    me = threading.get_ident()
+    names = {t.ident: t.name for t in threading.enumerate()}
+    counts: Counter[str] = Counter()
+    samples = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            if ident not in names:
+                names = {t.ident: t.name for t in threading.enumerate()}
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(_frame_name(code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            stack.append(names.get(ident, f"thread-{ident}"))
+            counts[";".join(reversed(stack))] += 1
+        samples += 1
+        time.sleep(interval)
+    return "".join(f"{stack} {n}\n" for stack, n in counts.most_common()), samples
+
+
+# [seconds in queries, query count] of the request being timed
+_request_timing: ContextVar[list | None] = ContextVar("request_timing", default=None)
+
+
+def time_request_queries(engine):
+    """Adds statement time to the timed request, if any; only installed with sampling on."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if _request_timing.get() is not None:
+            conn.info["diag_t0"] = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        timing = _request_timing.get()
+        t0 = conn.info.pop("diag_t0", None)
+        if timing is not None and t0 is not None:
+            timing[0] += time.perf_counter() - t0
+            timing[1] += 1
+
+
+class TimingMiddleware:
+    """Times a random `rate` fraction of HTTP requests.
+
+    Sampled responses carry a Server-Timing header (DB time and query
+    count, time to first byte) that browser dev tools display, and the
+    full timing is logged once the body is sent.
+    """
+
+    def __init__(self, app, rate: float):
+        self.app = app
+        self.rate = rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or random.random() >= self.rate:
+            return await self.app(scope, receive, send)
+        timing = [0.0, 0]
+        token = _request_timing.set(timing)
+        status = {"code": 500}
+        t0 = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                MutableHeaders(scope=message).append(
+                    "Server-Timing",
+                    f'db;dur={timing[0] * 1000:.1f};desc="{timing[1]} queries", app;dur={(time.perf_counter() - t0) * 1000:.1f}',
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_timing.reset(token)
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            logger.info(
+                "request.timing method=%s route=%s status=%s total_ms=%.1f db_ms=%.1f db_queries=%d",
+                scope["method"], route, status["code"], (time.perf_counter() - t0) * 1000, timing[0] * 1000, timing[1],
+            )
@@ -0,0 +1,183 @@
+import os
+import threading
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from sqlalchemy import event
+
+# every worker process exports its own series; scrape each one
+WORKER = str(os.getpid())
+
+# sub-millisecond buckets for in-process hot paths
+FAST_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+
+HTTP_LATENCY = Histogram(
+    "hackrtc_http_request_duration_seconds", "REST request latency by route template",
+    ["method", "route", "status"],
+)
+WS_FANOUT = Histogram(
+    "hackrtc_ws_fanout_seconds", "Time to serialize one room broadcast and enqueue it on every socket",
+    buckets=FAST_BUCKETS,
+)
+WS_SEND_DROPPED = Counter(
+    "hackrtc_ws_send_dropped_total", "Outgoing frames lost because a client's send queue was full",
+)
+DB_CHECKOUT_WAIT = Histogram(
+    "hackrtc_db_checkout_wait_seconds", "Wait for a pooled connection before a session's first statement",
+    buckets=FAST_BUCKETS + (0.25, 0.5, 1.0, 2.5),
+)
+DB_QUERY = Histogram(
+    "hackrtc_db_query_seconds", "Statement execution time",
+    buckets=FAST_BUCKETS + (0.25, 0.5, 1.0, 2.5),
+)
+DB_IN_USE = Gauge("hackrtc_db_connections_in_use", "Pooled connections checked out")
+DB_REPLICA_LAG = Gauge("hackrtc_db_replica_lag_seconds", "Last measured replica lag, -1 while unreachable")
+DB_READS = Counter("hackrtc_db_read_sessions_total", "Sessions opened by read-only routes by where they went", ["target"])
+BCRYPT = Histogram(
+    "hackrtc_bcrypt_seconds", "bcrypt hash/verify time", ["op"],
+    buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 2.0),
+)
+RECORDER_CPU = Counter(
+    "hackrtc_recorder_cpu_seconds_total", "Process CPU time spent while a recording was running",
+)
+RECORDER_TRACKS = Gauge("hackrtc_recorder_tracks", "Media tracks being recorded")
+WS_ADMISSION = Counter("hackrtc_ws_admission_total", "New WebSocket connections by admission outcome", ["result"])
+HTTP_SHED = Counter("hackrtc_http_shed_total", "HTTP requests refused with 503 while the loop was lagging")
+UPLOAD_BYTES = Counter("hackrtc_recording_upload_bytes_total", "Recording bytes uploaded to S3")
+UPLOAD_SECONDS = Histogram(
+    "hackrtc_recording_upload_seconds", "Recording upload duration",
+    buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+ROOM_PURGE_ROWS = Counter("hackrtc_room_purge_rows_total", "Rows of deleted rooms purged", ["table"])
+ROOM_PURGE_OBJECTS = Counter("hackrtc_room_purge_s3_objects_total", "Recording objects of deleted rooms removed from S3")
+LOOP_LAG = Histogram(
+    "hackrtc_event_loop_lag_seconds", "How late the loop monitor's timer fired",
+    buckets=FAST_BUCKETS + (0.25, 0.5, 1.0, 2.5),
+)
+LOOP_STALLS = Counter("hackrtc_event_loop_stalls_total", "Loop lag samples over DIAG_SLOW_CALLBACK_S")
+GC_PAUSE = Histogram("hackrtc_gc_pause_seconds", "Garbage collection pauses", ["generation"], buckets=FAST_BUCKETS)
+POSTPROCESS_SECONDS = Histogram(
+    "hackrtc_recording_postprocess_seconds", "HLS remux and thumbnail time per recording, in the process pool",
+    buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+
+
+class HubCollector:
+    """Reads RoomHub's plain counters at scrape time.
+
+    The signaling path only bumps dict counters; nothing Prometheus-related
+    runs per frame.
+    """
+
+    def __init__(self, hub):
+        self.hub = hub
+
+    def collect(self):
+        conns = GaugeMetricFamily("hackrtc_ws_connections", "Open WebSocket connections", labels=["room", "worker"])
+        depth = GaugeMetricFamily("hackrtc_ws_send_queue_depth", "Queued outgoing frames on this worker", labels=["worker", "stat"])
+        total = peak = 0
+        for room_key, room in list(self.hub.rooms.items()):
+            conns.add_metric([room_key, WORKER], len(room))
+            for c in list(room):
+                q = c.queue.qsize()
+                total += q
+                peak = max(peak, q)
+        depth.add_metric([WORKER, "total"], total)
+        depth.add_metric([WORKER, "max"], peak)
+        waiting = GaugeMetricFamily("hackrtc_ws_waiting", "Sockets in waiting rooms for a seat", labels=["worker"])
+        waiting.add_metric([WORKER], len(self.hub.waiting))
+        yield conns
+        yield depth
+        yield waiting
+        for name, doc, counts in (
+            ("hackrtc_ws_frames_in", "Frames received from clients by type", self.hub.frames_in),
+            ("hackrtc_ws_frames_out", "Frames queued to clients by type", self.hub.frames_out),
+            ("hackrtc_ws_frames_rate_limited", "Incoming frames rejected by rate limits by type", self.hub.dropped_frames),
+        ):
+            fam = CounterMetricFamily(name, doc, labels=["type"])
+            for t, n in list(counts.items()):
+                fam.add_metric([t], n)
+            yield fam
+        reaped = CounterMetricFamily("hackrtc_ws_reaped", "Connections closed for missing heartbeats", labels=["worker"])
+        reaped.add_metric([WORKER], self.hub.reaped)
+        yield reaped
+
+
+def register_hub(hub):
+    REGISTRY.register(HubCollector(hub))
+
+
+def render() -> tuple[bytes, str]:
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware timing HTTP requests per route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            # unmatched paths share one label so scanners can't blow up cardinality
+            path = getattr(route, "path", None) or "unmatched"
+            HTTP_LATENCY.labels(scope["method"], path, str(status["code"])).observe(time.perf_counter() - t0)
+
+
+_pending = threading.local()
+
+
+def instrument_db(engine, session_factory):
+    """Time pool checkout waits and statements with SQLAlchemy events.
+
+    The pool has no "checkout started" event, so the start is taken when the
+    ORM begins executing a statement; the checkout event only fires if that
+    statement had to acquire a connection.
+    """
+
+    @event.listens_for(session_factory, "do_orm_execute")
+    def _orm_execute(orm_execute_state):
+        _pending.t0 = time.perf_counter()
+
+    @event.listens_for(engine.pool, "checkout")
+    def _checkout(dbapi_conn, record, proxy):
+        DB_IN_USE.inc()
+        t0 = getattr(_pending, "t0", None)
+        if t0 is not None:
+            DB_CHECKOUT_WAIT.observe(time.perf_counter() - t0)
+            _pending.t0 = None
+
+    @event.listens_for(engine.pool, "checkin")
+    def _checkin(dbapi_conn, record):
+        DB_IN_USE.dec()
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        _pending.t0 = None
+        conn.info.setdefault("query_t0", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        stack = conn.info.get("query_t0")
+        if stack:
+            DB_QUERY.observe(time.perf_counter() - stack.pop())
+
+    @event.listens_for(engine, "handle_error")
+    def _error(ctx):
+        stack = ctx.connection.info.get("query_t0") if ctx.connection is not None else None
+        if stack:
+            stack.pop()
@@ -0,0 +1,23 @@
+import orjson
+from fastapi.responses import Response
+
+
+def json_response(content, status_code: int = 200, headers: dict | None = None) -> Response:
+    """Serialize with orjson and skip FastAPI's jsonable_encoder pass.
+
+    orjson writes UUIDs, enums and datetimes itself; naive datetimes (all
+    written with utcnow) come out as UTC, like `.isoformat()` on aware ones.
+    Routes still declare a response_model for the schema; returning a
+    Response bypasses its validation.
+    """
+    return Response(
+        orjson.dumps(content, option=orjson.OPT_NAIVE_UTC),
+        status_code=status_code,
+        headers=headers,
+        media_type="application/json",
+    )
+
+
+def rows_response(rows, headers: dict | None = None) -> Response:
+    """A column-only query's rows as a JSON array; columns are labelled with the response model's fields."""
+    return json_response([r._asdict() for r in rows], headers=headers)
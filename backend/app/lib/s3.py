@@ -3,6 +3,10 @@ from botocore.config import Config
 from ..core.config import settings
 
 
+def s3_configured() -> bool:
+    return bool(settings.s3_bucket and settings.s3_endpoint and settings.s3_access_key and settings.s3_secret_key)
+
+
 def get_s3_client():
     session = boto3.session.Session(
         aws_access_key_id=settings.s3_access_key,
@@ -13,13 +17,36 @@ def get_s3_client():
     return session.client('s3', endpoint_url=settings.s3_endpoint, config=cfg)
 
 
-def upload_fileobj(fileobj, key: str, content_type: str = 'application/octet-stream') -> str:
-    client = get_s3_client()
+def public_url(key: str) -> str:
     bucket = settings.s3_bucket
-    assert bucket, "S3_BUCKET is not configured"
-    client.upload_fileobj(fileobj, bucket, key, ExtraArgs={'ContentType': content_type})
     if settings.s3_endpoint and settings.s3_force_path_style:
         return f"{settings.s3_endpoint}/{bucket}/{key}"
     # default virtual-hosted-style url
     host = f"https://{bucket}.s3.{settings.s3_region}.amazonaws.com" if settings.s3_region else f"https://{bucket}.s3.amazonaws.com"
     return f"{host}/{key}"
+
+
+def upload_fileobj(fileobj, key: str, content_type: str = 'application/octet-stream', client=None) -> str:
+    # clients are thread-safe; pass one in when uploading many files
+    client = client or get_s3_client()
+    bucket = settings.s3_bucket
+    assert bucket, "S3_BUCKET is not configured"
+    client.upload_fileobj(fileobj, bucket, key, ExtraArgs={'ContentType': content_type})
+    return public_url(key)
+
+
+def delete_prefix(prefix: str, client=None) -> int:
+    """Delete every object under `prefix`, up to 1000 per request. Returns the count."""
+    client = client or get_s3_client()
+    bucket = settings.s3_bucket
+    assert bucket, "S3_BUCKET is not configured"
+    deleted = 0
+    for page in client.get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=prefix):
+        keys = [{'Key': obj['Key']} for obj in page.get('Contents', [])]
+        if not keys:
+            continue
+        resp = client.delete_objects(Bucket=bucket, Delete={'Objects': keys, 'Quiet': True})
+        if resp.get('Errors'):
+            raise RuntimeError(f"S3 delete failed for {len(resp['Errors'])} objects under {prefix}")
+        deleted += len(keys)
+    return deleted
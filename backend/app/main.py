@@ -1,14 +1,53 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
+from fastapi.responses import JSONResponse, ORJSONResponse
 from .routers.api import api_router
+from .core.config import settings
 from .db.session import Base, engine
+from .db.replica import replica_engine, replica_monitor
+from .routers.ws import hub
+from .services.analytics import rollup
+from .services.partitions import maintain_once, partition_maintenance
+from .services.guests import guest_cleanup
+from .services.postprocess import postprocessor
+from .services.purge import room_purge
+from .services.admission import LoadShedMiddleware
+from .lib import diagnostics, metrics
 from fastapi.middleware.cors import CORSMiddleware
 
-app = FastAPI(title="HackRTC API")
+app = FastAPI(title="HackRTC API", default_response_class=ORJSONResponse)
 
 @app.on_event("startup")
 def on_startup():
     Base.metadata.create_all(bind=engine)
+    # inserts fail without a partition for the current month
+    maintain_once(drop=False)
 
+@app.on_event("startup")
+async def start_background():
+    await diagnostics.loop_monitor.start()
+    await hub.start()
+    await replica_monitor.start()
+    await rollup.start()
+    await partition_maintenance.start()
+    await guest_cleanup.start()
+    await room_purge.start()
+    if settings.drain_on_sigterm:
+        hub.install_drain_handler()
+
+@app.on_event("shutdown")
+async def stop_background():
+    await room_purge.stop()
+    await guest_cleanup.stop()
+    await postprocessor.stop()
+    await partition_maintenance.stop()
+    await rollup.stop()
+    await replica_monitor.stop()
+    await hub.stop()
+    await diagnostics.loop_monitor.stop()
+
+if settings.shed_loop_lag_s > 0:
+    # inside CORS so browsers can read the 503
+    app.add_middleware(LoadShedMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -16,9 +55,24 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(metrics.MetricsMiddleware)
+if settings.diag_request_sample_rate > 0:
+    app.add_middleware(diagnostics.TimingMiddleware, rate=settings.diag_request_sample_rate)
+    for e in (engine, replica_engine):
+        if e is not None:
+            diagnostics.time_request_queries(e)
+metrics.register_hub(hub)
 
 @app.get("/health")
 def health():
+    # load balancers stop routing to a draining worker
+    if hub.draining:
+        return JSONResponse({"status": "draining"}, status_code=503)
     return {"status": "ok"}
 
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
 app.include_router(api_router)
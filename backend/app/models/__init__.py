@@ -5,3 +5,5 @@ from .message import Message
 from .key import KeyBundle
 from .calllog import CallLog
 from .recording import Recording, RecordingStatus
+from .analytics import UsageDaily, RoomDailyPeak, RollupState
+from .node import HubNode, HubWorker
@@ -0,0 +1,43 @@
+import uuid
+from datetime import date, datetime
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import BigInteger, Date, DateTime, ForeignKey, Index, Integer, String
+from ..db.session import Base
+
+
+class UsageDaily(Base):
+    """Call seconds per room, user and UTC day, rolled up from call_logs."""
+
+    __tablename__ = "usage_daily"
+    __table_args__ = (
+        Index("ix_usage_daily_user_day", "user_id", "day"),
+    )
+
+    room_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("rooms.id", ondelete="CASCADE"), primary_key=True)
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    user_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+
+    seconds: Mapped[int] = mapped_column(BigInteger, default=0, nullable=False)
+    # calls that started on this day
+    sessions: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+
+class RoomDailyPeak(Base):
+    __tablename__ = "room_daily_peak"
+
+    room_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("rooms.id", ondelete="CASCADE"), primary_key=True)
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+
+    peak_concurrency: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+
+class RollupState(Base):
+    """High-water mark of a rollup: the last (left_at, id) already folded in."""
+
+    __tablename__ = "rollup_state"
+
+    name: Mapped[str] = mapped_column(String(64), primary_key=True)
+    last_left_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    last_id: Mapped[uuid.UUID | None] = mapped_column(UUID(as_uuid=True), nullable=True)
+    updated_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
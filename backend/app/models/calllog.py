@@ -2,17 +2,31 @@ import uuid
 from datetime import datetime
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy import DateTime, ForeignKey, Integer
+from sqlalchemy import Boolean, DateTime, ForeignKey, Index, Integer, String, false
 from ..db.session import Base
 
 
 class CallLog(Base):
     __tablename__ = "call_logs"
+    __table_args__ = (
+        # rollup scan by high-water mark and per-room overlap queries
+        Index("ix_call_logs_left_at_id", "left_at", "id"),
+        Index("ix_call_logs_room_joined", "room_id", "joined_at"),
+        Index("ix_call_logs_user", "user_id"),
+        # monthly range partitions, see services/partitions.py
+        {"postgresql_partition_by": "RANGE (joined_at)"},
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     room_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("rooms.id", ondelete="CASCADE"), nullable=False)
     user_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
 
-    joined_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow, nullable=False)
+    # part of the key because the table is partitioned on it
+    joined_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True, default=datetime.utcnow, nullable=False)
     left_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
     duration_seconds: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    # the worker writing the log (hub_workers); sweeps close only logs of dead workers
+    worker_id: Mapped[str | None] = mapped_column(String(32), nullable=True)
+    # folded into usage_daily already; a log closed again later (swept, then
+    # closed for real by its worker) must not be counted twice
+    rolled_up: Mapped[bool] = mapped_column(Boolean, default=False, server_default=false(), nullable=False)
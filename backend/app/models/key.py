@@ -2,7 +2,7 @@ import uuid
 from datetime import datetime
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy import String, DateTime, ForeignKey, UniqueConstraint, Text
+from sqlalchemy import String, DateTime, ForeignKey, UniqueConstraint, Text, Index
 from ..db.session import Base
 
 
@@ -10,6 +10,7 @@ class KeyBundle(Base):
     __tablename__ = "key_bundles"
     __table_args__ = (
         UniqueConstraint("room_id", "user_id", name="uq_key_bundle_room_user"),
+        Index("ix_key_bundles_user", "user_id"),
     )
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
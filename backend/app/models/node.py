@@ -0,0 +1,26 @@
+from datetime import datetime
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import Boolean, DateTime, String
+from ..db.session import Base
+
+
+class HubNode(Base):
+    """A signaling node that can own rooms; kept alive by its heartbeat."""
+
+    __tablename__ = "hub_nodes"
+
+    node_id: Mapped[str] = mapped_column(String(128), primary_key=True)
+    ws_url: Mapped[str] = mapped_column(String(512), nullable=False)
+    last_seen: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    # a draining node keeps its sockets until they moved but takes no rooms
+    draining: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+
+
+class HubWorker(Base):
+    """An API worker process; owns the call logs it writes, alive while it heartbeats."""
+
+    __tablename__ = "hub_workers"
+
+    worker_id: Mapped[str] = mapped_column(String(32), primary_key=True)
+    node_id: Mapped[str] = mapped_column(String(128), nullable=False)
+    last_seen: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
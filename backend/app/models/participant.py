@@ -2,7 +2,7 @@ import uuid
 from datetime import datetime
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy import String, DateTime, ForeignKey, Boolean, Enum
+from sqlalchemy import String, DateTime, ForeignKey, Boolean, Enum, Index
 import enum
 from ..db.session import Base
 
@@ -15,6 +15,10 @@ class Role(str, enum.Enum):
 
 class Participant(Base):
     __tablename__ = "participants"
+    __table_args__ = (
+        # membership lookups, and the guest cleanup / user delete cascade by user_id
+        Index("ix_participants_user_room", "user_id", "room_id"),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     room_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("rooms.id", ondelete="CASCADE"), nullable=False)
@@ -25,6 +25,10 @@ class Recording(Base):
     status: Mapped[RecordingStatus] = mapped_column(Enum(RecordingStatus), default=RecordingStatus.starting, nullable=False)
     storage_key: Mapped[str | None] = mapped_column(String(512), nullable=True)
     public_url: Mapped[str | None] = mapped_column(String(1024), nullable=True)
+    # HLS rendition and poster written by post-processing, next to storage_key
+    manifest_key: Mapped[str | None] = mapped_column(String(512), nullable=True)
+    manifest_url: Mapped[str | None] = mapped_column(String(1024), nullable=True)
+    thumbnail_url: Mapped[str | None] = mapped_column(String(1024), nullable=True)
 
     started_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow, nullable=False)
     stopped_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
@@ -2,7 +2,7 @@ import uuid
 from datetime import datetime
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy import String, DateTime, ForeignKey, UniqueConstraint
+from sqlalchemy import BigInteger, String, DateTime, ForeignKey, Index, UniqueConstraint, text
 from ..db.session import Base
 
 
@@ -10,12 +10,20 @@ class Room(Base):
     __tablename__ = "rooms"
     __table_args__ = (
         UniqueConstraint("invite_code", name="uq_rooms_invite_code"),
+        Index("ix_rooms_owner", "owner_id"),
+        # the purge job's queue
+        Index("ix_rooms_deleted_at", "deleted_at", postgresql_where=text("deleted_at IS NOT NULL")),
     )
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     name: Mapped[str] = mapped_column(String(128), nullable=False)
     invite_code: Mapped[str] = mapped_column(String(16), nullable=False)
+    # "mesh": peers connect to each other; "sfu": everyone publishes once to the server
+    media_mode: Mapped[str] = mapped_column(String(8), default="mesh", server_default="mesh", nullable=False)
     owner_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow, nullable=False)
+    # set by DELETE /rooms/{id}; the row and its data are removed later by services/purge.py
+    deleted_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    purged_rows: Mapped[int] = mapped_column(BigInteger, default=0, server_default="0", nullable=False)
 
     owner = relationship("User")
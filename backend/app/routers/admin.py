@@ -0,0 +1,58 @@
+import asyncio
+import os
+import secrets
+from fastapi import APIRouter, HTTPException, Header, Query, Response
+from ..core.config import settings
+from ..lib.diagnostics import loop_monitor, profile_lock, sample_stacks
+from .ws import hub
+
+router = APIRouter()
+
+
+def require_admin(x_admin_token: str | None):
+    # disabled unless ADMIN_TOKEN is configured
+    if not settings.admin_token:
+        raise HTTPException(status_code=404, detail="Not found")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, settings.admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+@router.post("/drain")
+async def drain(x_admin_token: str | None = Header(default=None)):
+    """Drain the worker that handles this request (deploy scripts call it per worker)."""
+    require_admin(x_admin_token)
+    connections = len(hub.conns)
+    hub.start_drain()
+    return {"status": "draining", "connections": connections}
+
+
+@router.get("/loop")
+async def loop_status(x_admin_token: str | None = Header(default=None)):
+    """This worker's last loop lag sample and recent stalls with the stacks that caused them."""
+    require_admin(x_admin_token)
+    return {
+        "worker": os.getpid(),
+        "monitor": loop_monitor.running,
+        "lag_s": loop_monitor.lag_s,
+        "stalls": list(loop_monitor.stalls),
+    }
+
+
+@router.get("/profile")
+async def profile(
+    seconds: float = Query(default=10, gt=0),
+    interval_ms: float = Query(default=10, ge=1),
+    x_admin_token: str | None = Header(default=None),
+):
+    """Sample this worker's thread stacks and return them as folded stacks for a flamegraph."""
+    require_admin(x_admin_token)
+    if not profile_lock.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    try:
+        body, samples = await asyncio.to_thread(sample_stacks, min(seconds, settings.diag_profile_max_s), interval_ms / 1000)
+    finally:
+        profile_lock.release()
+    return Response(body, media_type="text/plain", headers={
+        "Content-Disposition": f'attachment; filename="profile-{os.getpid()}.folded"',
+        "X-Profile-Samples": str(samples),
+    })
@@ -0,0 +1,143 @@
+from datetime import date, datetime, timedelta, timezone
+from fastapi import APIRouter, Depends, HTTPException, Header, Query
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from ..db.session import get_db
+from ..models import RollupState, RoomDailyPeak, UsageDaily
+from ..services.analytics import ROLLUP_NAME
+from ..services.permissions import require_role
+from .auth import get_current_user
+
+router = APIRouter()
+
+MAX_RANGE_DAYS = 366
+
+
+def parse_token(authorization: str | None) -> str:
+    if not authorization:
+        raise HTTPException(status_code=401, detail="Missing Authorization header")
+    if not authorization.lower().startswith("bearer "):
+        raise HTTPException(status_code=401, detail="Invalid Authorization header")
+    return authorization.split(" ", 1)[1]
+
+
+def date_range(start: date | None, end: date | None) -> tuple[date, date]:
+    end = end or datetime.now(timezone.utc).date()
+    start = start or end - timedelta(days=29)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start is after end")
+    if (end - start).days >= MAX_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail=f"Range is limited to {MAX_RANGE_DAYS} days")
+    return start, end
+
+
+def rolled_up_to(db: Session) -> str | None:
+    state = db.get(RollupState, ROLLUP_NAME)
+    return state.last_left_at.isoformat() if state and state.last_left_at else None
+
+
+@router.get("/rooms/{room_id}")
+def room_usage(
+    room_id: str,
+    start: date | None = Query(default=None),
+    end: date | None = Query(default=None),
+    db: Session = Depends(get_db),
+    authorization: str | None = Header(default=None),
+):
+    token = parse_token(authorization)
+    me = get_current_user(token, db)
+    require_role(db, room_id, me.id)
+    start, end = date_range(start, end)
+
+    usage = (
+        db.query(
+            UsageDaily.day,
+            func.sum(UsageDaily.seconds),
+            func.sum(UsageDaily.sessions),
+            func.count(UsageDaily.user_id),
+        )
+        .filter(UsageDaily.room_id == room_id, UsageDaily.day >= start, UsageDaily.day <= end)
+        .group_by(UsageDaily.day)
+        .all()
+    )
+    peaks = dict(
+        db.query(RoomDailyPeak.day, RoomDailyPeak.peak_concurrency)
+        .filter(RoomDailyPeak.room_id == room_id, RoomDailyPeak.day >= start, RoomDailyPeak.day <= end)
+        .all()
+    )
+    days = [
+        {
+            "day": day.isoformat(),
+            "seconds": int(seconds or 0),
+            "minutes": round((seconds or 0) / 60, 1),
+            "sessions": int(sessions or 0),
+            "users": users,
+            "peak_concurrency": peaks.get(day, 0),
+        }
+        for day, seconds, sessions, users in sorted(usage)
+    ]
+    return {
+        "room_id": room_id,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "total_seconds": sum(d["seconds"] for d in days),
+        "days": days,
+        "rolled_up_to": rolled_up_to(db),
+    }
+
+
+@router.get("/rooms/{room_id}/users")
+def room_usage_by_user(
+    room_id: str,
+    start: date | None = Query(default=None),
+    end: date | None = Query(default=None),
+    db: Session = Depends(get_db),
+    authorization: str | None = Header(default=None),
+):
+    token = parse_token(authorization)
+    me = get_current_user(token, db)
+    require_role(db, room_id, me.id)
+    start, end = date_range(start, end)
+
+    rows = (
+        db.query(UsageDaily.user_id, func.sum(UsageDaily.seconds), func.sum(UsageDaily.sessions))
+        .filter(UsageDaily.room_id == room_id, UsageDaily.day >= start, UsageDaily.day <= end)
+        .group_by(UsageDaily.user_id)
+        .all()
+    )
+    items = [
+        {"user_id": str(user_id), "seconds": int(seconds or 0), "sessions": int(sessions or 0)}
+        for user_id, seconds, sessions in rows
+    ]
+    items.sort(key=lambda i: i["seconds"], reverse=True)
+    return {"room_id": room_id, "start": start.isoformat(), "end": end.isoformat(), "items": items, "rolled_up_to": rolled_up_to(db)}
+
+
+@router.get("/me")
+def my_usage(
+    start: date | None = Query(default=None),
+    end: date | None = Query(default=None),
+    db: Session = Depends(get_db),
+    authorization: str | None = Header(default=None),
+):
+    token = parse_token(authorization)
+    me = get_current_user(token, db)
+    start, end = date_range(start, end)
+
+    rows = (
+        db.query(UsageDaily.day, UsageDaily.room_id, UsageDaily.seconds, UsageDaily.sessions)
+        .filter(UsageDaily.user_id == me.id, UsageDaily.day >= start, UsageDaily.day <= end)
+        .order_by(UsageDaily.day, UsageDaily.room_id)
+        .all()
+    )
+    items = [
+        {"day": day.isoformat(), "room_id": str(room_id), "seconds": seconds, "sessions": sessions}
+        for day, room_id, seconds, sessions in rows
+    ]
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "total_seconds": sum(i["seconds"] for i in items),
+        "items": items,
+        "rolled_up_to": rolled_up_to(db),
+    }
@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from . import auth, rooms, chat, ws, moderation, keys, users, recordings
+from . import auth, rooms, chat, ws, moderation, keys, users, recordings, analytics, events, admin
 
 api_router = APIRouter()
 
@@ -11,3 +11,6 @@ api_router.include_router(ws.router, prefix="/ws", tags=["ws"])
 api_router.include_router(moderation.router, prefix="/moderation", tags=["moderation"])
 api_router.include_router(keys.router, prefix="/keys", tags=["keys"])
 api_router.include_router(recordings.router, prefix="/recordings", tags=["recordings"])
+api_router.include_router(analytics.router, prefix="/analytics", tags=["analytics"])
+api_router.include_router(events.router, prefix="/events", tags=["events"])
+api_router.include_router(admin.router, prefix="/admin", tags=["admin"], include_in_schema=False)
@@ -1,20 +1,45 @@
-from fastapi import APIRouter, Depends, HTTPException
+import uuid
+from fastapi import APIRouter, HTTPException
+from sqlalchemy import inspect
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
-from ..db.session import get_db
 from ..models import User
 from ..schemas.auth import AnonymousAuthRequest, TokenResponse
 from ..core.security import create_access_token, decode_token
 
 router = APIRouter()
 
+
+def anonymous_token(user_id, display_name: str, avatar_url: str | None) -> str:
+    # the profile lives in the token; see get_current_user / ensure_user
+    return create_access_token(str(user_id), extra={"display_name": display_name, "avatar_url": avatar_url, "anon": True})
+
+
 @router.post("/anonymous", response_model=TokenResponse)
-def anonymous_login(payload: AnonymousAuthRequest, db: Session = Depends(get_db)):
-    user = User(display_name=payload.display_name, avatar_url=str(payload.avatar_url) if payload.avatar_url else None)
-    db.add(user)
-    db.commit()
-    db.refresh(user)
-    token = create_access_token(str(user.id), extra={"display_name": user.display_name})
-    return TokenResponse(access_token=token)
+def anonymous_login(payload: AnonymousAuthRequest):
+    avatar_url = str(payload.avatar_url) if payload.avatar_url else None
+    return TokenResponse(access_token=anonymous_token(uuid.uuid4(), payload.display_name, avatar_url))
+
+
+def token_user(payload: dict) -> User:
+    """Transient User built from the claims of an anonymous token, without touching the DB."""
+    return User(id=uuid.UUID(payload["sub"]), display_name=payload.get("display_name") or "", avatar_url=payload.get("avatar_url"))
+
+
+def ensure_user(db: Session, user: User) -> None:
+    """Write the users row for a guest before something references it by foreign key.
+
+    No-op for users loaded from the DB. Guests from get_current_user are
+    transient; their row is inserted with ON CONFLICT DO NOTHING, so repeats
+    and concurrent first writes are harmless.
+    """
+    if not inspect(user).transient:
+        return
+    db.execute(
+        insert(User)
+        .values(id=user.id, display_name=user.display_name, avatar_url=user.avatar_url)
+        .on_conflict_do_nothing(index_elements=[User.id])
+    )
 
 
 def get_current_user(token: str, db: Session) -> User:
@@ -25,6 +50,11 @@ def get_current_user(token: str, db: Session) -> User:
     user_id = payload.get("sub")
     if not user_id:
         raise HTTPException(status_code=401, detail="Invalid token")
+    if payload.get("anon"):
+        try:
+            return token_user(payload)
+        except ValueError:
+            raise HTTPException(status_code=401, detail="Invalid token")
     user = db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
@@ -1,8 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, Header
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Header, Query
 from sqlalchemy.orm import Session
 from ..db.session import get_db
+from ..db.replica import get_read_db
 from ..models import Message, Room
-from .auth import get_current_user
+from ..schemas.chat import MessageOut
+from ..lib.responses import rows_response
+from .auth import ensure_user, get_current_user
 from .ws import hub
 
 router = APIRouter()
@@ -16,10 +20,28 @@ def parse_token(authorization: str | None) -> str:
     return authorization.split(" ", 1)[1]
 
 
-@router.get("/{room_id}")
-def get_messages(room_id: str, db: Session = Depends(get_db)):
-    msgs = db.query(Message).filter(Message.room_id == room_id).order_by(Message.created_at.asc()).all()
-    return [{"id": str(m.id), "user_id": str(m.user_id), "ciphertext": m.content_ciphertext, "created_at": m.created_at.isoformat()} for m in msgs]
+def chat_frame(m: Message) -> dict:
+    return {"type": "chat", "room_id": str(m.room_id), "msg": {"id": str(m.id), "user_id": str(m.user_id), "ciphertext": m.content_ciphertext, "created_at": m.created_at.isoformat()}}
+
+
+@router.get("/{room_id}", response_model=list[MessageOut])
+def get_messages(
+    room_id: str,
+    since: datetime | None = Query(default=None),
+    before: datetime | None = Query(default=None),
+    db: Session = Depends(get_read_db),
+):
+    room = db.get(Room, room_id)
+    if not room or room.deleted_at:
+        return []
+    # messages is partitioned by created_at: bounding it lets Postgres skip
+    # the months outside the range, and nothing is older than the room
+    q = db.query(Message.id, Message.user_id, Message.content_ciphertext.label("ciphertext"), Message.created_at).filter(Message.room_id == room.id, Message.created_at >= room.created_at)
+    if since is not None:
+        q = q.filter(Message.created_at > since)
+    if before is not None:
+        q = q.filter(Message.created_at < before)
+    return rows_response(q.order_by(Message.created_at.asc()).all())
 
 
 @router.post("/{room_id}")
@@ -28,7 +50,7 @@ async def post_message(room_id: str, payload: dict, db: Session = Depends(get_db
     user = get_current_user(token, db)
 
     room = db.get(Room, room_id)
-    if not room:
+    if not room or room.deleted_at:
         raise HTTPException(status_code=404, detail="Room not found")
 
     ciphertext = (payload.get("ciphertext") or "").strip()
@@ -37,11 +59,11 @@ async def post_message(room_id: str, payload: dict, db: Session = Depends(get_db
     if len(ciphertext) > 4000:
         raise HTTPException(status_code=422, detail="message too long")
 
+    ensure_user(db, user)
     msg = Message(room_id=room.id, user_id=user.id, content_ciphertext=ciphertext)
     db.add(msg)
     db.commit()
     db.refresh(msg)
-    # broadcast to room via ws
-    payload = {"type": "chat", "room_id": str(room.id), "msg": {"id": str(msg.id), "user_id": str(user.id), "ciphertext": msg.content_ciphertext, "created_at": msg.created_at.isoformat()}}
-    await hub.broadcast(str(room.id), payload)
+    # to sockets and SSE readers on every worker
+    hub.dispatch("chat", str(room.id), chat_frame(msg))
     return {"id": str(msg.id)}
@@ -0,0 +1,106 @@
+import asyncio
+import uuid
+from datetime import datetime
+from fastapi import APIRouter, HTTPException, Header, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import tuple_
+from ..core.config import settings
+from ..core.security import decode_token
+from ..db.session import SessionLocal
+from ..models import Message
+from .chat import chat_frame
+from .ws import dump, hub, sse_frame
+
+router = APIRouter()
+
+
+def parse_event_id(value: str | None) -> tuple[datetime, uuid.UUID] | None:
+    # "<created_at iso>_<message id>", as stamped on chat frames
+    if not value:
+        return None
+    try:
+        created_at, msg_id = value.rsplit("_", 1)
+        return datetime.fromisoformat(created_at), uuid.UUID(msg_id)
+    except ValueError:
+        return None
+
+
+def load_backlog(room_id: str, after: tuple[datetime, uuid.UUID]) -> list[Message]:
+    db = SessionLocal()
+    try:
+        return (
+            db.query(Message)
+            # the plain created_at bound is what prunes partitions; the tuple breaks ties
+            .filter(Message.room_id == room_id, Message.created_at >= after[0], tuple_(Message.created_at, Message.id) > tuple_(*after))
+            .order_by(Message.created_at, Message.id)
+            .limit(settings.sse_backlog_page)
+            .all()
+        )
+    finally:
+        db.close()
+
+
+@router.get("/{room_id}")
+async def room_events(
+    room_id: str,
+    request: Request,
+    token: str | None = Query(default=None),
+    authorization: str | None = Header(default=None),
+    last_event_id: str | None = Header(default=None),
+):
+    """Room events as Server-Sent Events: chat plus roster/moderation/key frames.
+
+    EventSource can't set headers, so the token may come as a query param
+    like on the WebSocket. With Last-Event-ID (header, or `last_event_id`
+    query param for the first connect) missed chat messages are replayed
+    from the messages table before live frames.
+    """
+    if not token and authorization and authorization.lower().startswith("bearer "):
+        token = authorization.split(" ", 1)[1]
+    try:
+        decode_token(token or "")
+    except Exception:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    try:
+        room_key = str(uuid.UUID(room_id))
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Room not found")
+    after = parse_event_id(last_event_id or request.query_params.get("last_event_id"))
+
+    async def stream():
+        # subscribe before reading the backlog so nothing falls between the two
+        sub = hub.subscribe(room_key)
+        try:
+            yield "retry: 3000\n\n"
+            last = after
+            while last is not None:
+                rows = await asyncio.to_thread(load_backlog, room_key, last)
+                for m in rows:
+                    message = chat_frame(m)
+                    yield sse_frame(message, dump(message))[1]
+                    last = (m.created_at, m.id)
+                if len(rows) < settings.sse_backlog_page:
+                    break
+            # a closed room still delivers what was queued, ending with `room_deleted`
+            while not sub.lagged and not (sub.closed and sub.queue.empty()):
+                try:
+                    eid, frame = await asyncio.wait_for(sub.queue.get(), timeout=settings.sse_keepalive_s)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": ping\n\n"
+                    continue
+                if eid and last is not None:
+                    # already replayed from the table
+                    seen = parse_event_id(eid)
+                    if seen is not None and seen <= last:
+                        continue
+                yield frame
+        finally:
+            hub.unsubscribe(sub)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,12 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, Header
+from datetime import datetime, timedelta, timezone
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Response
 from pydantic import BaseModel
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from ..db.session import get_db
 from ..models import KeyBundle
-from .auth import get_current_user
+from ..schemas.key import KeyBundleOut
+from ..lib.responses import rows_response
+from .auth import ensure_user, get_current_user
+from .ws import hub
 
 router = APIRouter()
 
+# `since` looks back this far so a bundle committed late with an earlier
+# updated_at (or stamped by a worker with a slower clock) is not skipped;
+# clients upsert by user_id, so the overlap is harmless
+SINCE_OVERLAP = timedelta(seconds=5)
+
 class PublishKeyBundle(BaseModel):
     identity_key: str
     pre_key: str | None = None
@@ -20,6 +30,10 @@ def parse_token(authorization: str | None) -> str:
     return authorization.split(" ", 1)[1]
 
 
+def utc(dt: datetime) -> datetime:
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt
+
+
 @router.post("/{room_id}")
 def publish(room_id: str, payload: PublishKeyBundle, db: Session = Depends(get_db), authorization: str | None = Header(default=None)):
     token = parse_token(authorization)
@@ -27,23 +41,34 @@ def publish(room_id: str, payload: PublishKeyBundle, db: Session = Depends(get_d
 
     kb = db.query(KeyBundle).filter(KeyBundle.room_id == room_id, KeyBundle.user_id == me.id).first()
     if not kb:
+        ensure_user(db, me)
         kb = KeyBundle(room_id=room_id, user_id=me.id, identity_key=payload.identity_key, pre_key=payload.pre_key)
         db.add(kb)
+    elif kb.identity_key == payload.identity_key and kb.pre_key == payload.pre_key:
+        # unchanged: keep updated_at so ETags stay valid and nobody is told to re-fetch
+        return {"status": "ok"}
     else:
         kb.identity_key = payload.identity_key
         kb.pre_key = payload.pre_key
     db.commit()
+    hub.dispatch("keys.updated", str(room_id), {"user_id": str(me.id), "updated_at": utc(kb.updated_at).isoformat()})
     return {"status": "ok"}
 
 
-@router.get("/{room_id}")
-def list_bundles(room_id: str, db: Session = Depends(get_db)):
-    bundles = db.query(KeyBundle).filter(KeyBundle.room_id == room_id).all()
-    return [
-        {
-            "user_id": str(b.user_id),
-            "identity_key": b.identity_key,
-            "pre_key": b.pre_key,
-        }
-        for b in bundles
-    ]
+@router.get("/{room_id}", response_model=list[KeyBundleOut])
+def list_bundles(
+    room_id: str,
+    since: datetime | None = Query(default=None),
+    db: Session = Depends(get_db),
+    if_none_match: str | None = Header(default=None),
+):
+    # room version from one aggregate; the bundles are only loaded when it changed
+    count, latest = db.query(func.count(KeyBundle.id), func.max(KeyBundle.updated_at)).filter(KeyBundle.room_id == room_id).one()
+    etag = f'W/"{count}-{utc(latest).timestamp() if latest else 0}"'
+    if if_none_match and etag in [t.strip() for t in if_none_match.split(",")]:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    q = db.query(KeyBundle.user_id, KeyBundle.identity_key, KeyBundle.pre_key, KeyBundle.updated_at).filter(KeyBundle.room_id == room_id)
+    if since is not None:
+        q = q.filter(KeyBundle.updated_at >= utc(since) - SINCE_OVERLAP)
+    return rows_response(q.all(), headers={"ETag": etag})
@@ -1,11 +1,41 @@
+import uuid
+from typing import Literal
 from fastapi import APIRouter, Depends, HTTPException, Header
+from pydantic import BaseModel, Field
+from sqlalchemy import delete, update
 from sqlalchemy.orm import Session
 from ..db.session import get_db
 from ..models import Participant, Room
+from ..models.participant import Role
 from .auth import get_current_user
+from ..services.permissions import require_role, role_cache
+from .ws import hub
 
 router = APIRouter()
 
+# who may apply each action
+ACTIONS = {
+    "mute": ("host", "moderator"),
+    "unmute": ("host", "moderator"),
+    "kick": ("host", "moderator"),
+    "promote": ("host",),
+    "demote": ("host",),
+}
+UPDATES = {
+    "mute": {"muted_by_moderator": True},
+    "unmute": {"muted_by_moderator": False},
+    "promote": {"role": Role.moderator},
+    "demote": {"role": Role.guest},
+}
+MAX_BULK = 500
+# hub events travel over the bus, whose payloads are capped
+EVENT_CHUNK = 100
+
+
+class BulkModerationRequest(BaseModel):
+    action: Literal["mute", "unmute", "kick", "promote", "demote"]
+    user_ids: list[uuid.UUID] = Field(min_length=1, max_length=MAX_BULK)
+
 
 def parse_token(authorization: str | None) -> str:
     if not authorization:
@@ -15,84 +45,82 @@ def parse_token(authorization: str | None) -> str:
     return authorization.split(" ", 1)[1]
 
 
-def require_role(db: Session, room_id, user_id, allowed=("host", "moderator")) -> Participant:
-    me = db.query(Participant).filter(Participant.room_id == room_id, Participant.user_id == user_id).first()
-    if not me:
-        raise HTTPException(status_code=403, detail="Not in room")
-    if me.role not in allowed:
-        raise HTTPException(status_code=403, detail="Insufficient role")
-    return me
+def moderate(db: Session, room_id: str, me, action: str, target_ids: list[uuid.UUID]) -> list[str]:
+    """Apply one action to many participants with a single UPDATE/DELETE.
+
+    Returns the user ids that were in the room; the room is told through
+    the hub and kicked users' sockets are closed.
+    """
+    require_role(db, room_id, me.id, allowed=ACTIONS[action])
+    if action == "kick" and me.id in target_ids:
+        raise HTTPException(status_code=400, detail="Cannot kick yourself")
+    where = (Participant.room_id == room_id, Participant.user_id.in_(target_ids))
+    if action == "kick":
+        stmt = delete(Participant).where(*where)
+    else:
+        stmt = update(Participant).where(*where).values(**UPDATES[action])
+    applied = [str(u) for u in db.execute(stmt.returning(Participant.user_id)).scalars()]
+    db.commit()
+    # this worker sees the new roles at once; the hub event updates the others
+    if action == "kick":
+        role_cache.forget(room_id, applied)
+    elif action in ("promote", "demote"):
+        role_cache.set_roles(room_id, applied, UPDATES[action]["role"])
+    for i in range(0, len(applied), EVENT_CHUNK):
+        hub.dispatch("moderation", str(room_id), {"action": action, "user_ids": applied[i:i + EVENT_CHUNK], "by": str(me.id)})
+    return applied
+
+
+def moderate_one(db: Session, room_id: str, me, action: str, target_user_id: str):
+    try:
+        target = uuid.UUID(target_user_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Target not found")
+    if not moderate(db, room_id, me, action, [target]):
+        raise HTTPException(status_code=404, detail="Target not found")
+    return {"status": "ok"}
+
+
+@router.post("/{room_id}/bulk")
+def bulk(room_id: str, payload: BulkModerationRequest, db: Session = Depends(get_db), authorization: str | None = Header(default=None)):
+    token = parse_token(authorization)
+    me = get_current_user(token, db)
+    targets = list(dict.fromkeys(payload.user_ids))
+    applied = moderate(db, room_id, me, payload.action, targets)
+    found = set(applied)
+    return {"status": "ok", "applied": applied, "missing": [str(u) for u in targets if str(u) not in found]}
 
 
 @router.post("/{room_id}/mute/{target_user_id}")
 def mute(room_id: str, target_user_id: str, db: Session = Depends(get_db), authorization: str | None = Header(default=None)):
     token = parse_token(authorization)
     me = get_current_user(token, db)
-    require_role(db, room_id, me.id)
-
-    target = db.query(Participant).filter(Participant.room_id == room_id, Participant.user_id == target_user_id).first()
-    if not target:
-        raise HTTPException(status_code=404, detail="Target not found")
-    target.muted_by_moderator = True
-    db.commit()
-    return {"status": "ok"}
+    return moderate_one(db, room_id, me, "mute", target_user_id)
 
 
 @router.post("/{room_id}/unmute/{target_user_id}")
 def unmute(room_id: str, target_user_id: str, db: Session = Depends(get_db), authorization: str | None = Header(default=None)):
     token = parse_token(authorization)
     me = get_current_user(token, db)
-    require_role(db, room_id, me.id)
-
-    target = db.query(Participant).filter(Participant.room_id == room_id, Participant.user_id == target_user_id).first()
-    if not target:
-        raise HTTPException(status_code=404, detail="Target not found")
-    target.muted_by_moderator = False
-    db.commit()
-    return {"status": "ok"}
+    return moderate_one(db, room_id, me, "unmute", target_user_id)
 
 
 @router.post("/{room_id}/kick/{target_user_id}")
 def kick(room_id: str, target_user_id: str, db: Session = Depends(get_db), authorization: str | None = Header(default=None)):
     token = parse_token(authorization)
     me = get_current_user(token, db)
-    admin = require_role(db, room_id, me.id)
-
-    target = db.query(Participant).filter(Participant.room_id == room_id, Participant.user_id == target_user_id).first()
-    if not target:
-        raise HTTPException(status_code=404, detail="Target not found")
-    if admin.user_id == target_user_id:
-        raise HTTPException(status_code=400, detail="Cannot kick yourself")
-    db.delete(target)
-    db.commit()
-    return {"status": "ok"}
+    return moderate_one(db, room_id, me, "kick", target_user_id)
 
 
 @router.post("/{room_id}/promote/{target_user_id}")
 def promote(room_id: str, target_user_id: str, db: Session = Depends(get_db), authorization: str | None = Header(default=None)):
     token = parse_token(authorization)
     me = get_current_user(token, db)
-    # Only host can promote to moderator
-    my_p = require_role(db, room_id, me.id, allowed=("host",))
-
-    target = db.query(Participant).filter(Participant.room_id == room_id, Participant.user_id == target_user_id).first()
-    if not target:
-        raise HTTPException(status_code=404, detail="Target not found")
-    target.role = "moderator"
-    db.commit()
-    return {"status": "ok"}
+    return moderate_one(db, room_id, me, "promote", target_user_id)
 
 
 @router.post("/{room_id}/demote/{target_user_id}")
 def demote(room_id: str, target_user_id: str, db: Session = Depends(get_db), authorization: str | None = Header(default=None)):
     token = parse_token(authorization)
     me = get_current_user(token, db)
-    # Only host can demote
-    my_p = require_role(db, room_id, me.id, allowed=("host",))
-
-    target = db.query(Participant).filter(Participant.room_id == room_id, Participant.user_id == target_user_id).first()
-    if not target:
-        raise HTTPException(status_code=404, detail="Target not found")
-    target.role = "guest"
-    db.commit()
-    return {"status": "ok"}
+    return moderate_one(db, room_id, me, "demote", target_user_id)
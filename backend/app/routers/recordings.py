@@ -4,12 +4,18 @@ from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException, Header
 from sqlalchemy.orm import Session
 from ..db.session import get_db, SessionLocal
+from ..db.replica import get_read_db
 from ..models import Room, Participant, Recording, RecordingStatus
 from ..core.security import create_access_token
-from ..core.config import settings
 from ..services.recorder import RoomRecorder
+from ..services.permissions import require_role
+from ..services.postprocess import postprocessor
 from .auth import get_current_user
-from ..lib.s3 import upload_fileobj
+from .ws import hub
+from ..lib.s3 import s3_configured
+from ..lib.metrics import POSTPROCESS_SECONDS, UPLOAD_BYTES, UPLOAD_SECONDS
+from ..lib.responses import rows_response
+from ..schemas.recording import RecordingOut
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -26,21 +32,12 @@ def parse_token(authorization: str | None) -> str:
     return authorization.split(" ", 1)[1]
 
 
-def require_role(db: Session, room_id, user_id, allowed=("host", "moderator")) -> Participant:
-    me = db.query(Participant).filter(Participant.room_id == room_id, Participant.user_id == user_id).first()
-    if not me:
-        raise HTTPException(status_code=403, detail="Not in room")
-    if me.role not in allowed:
-        raise HTTPException(status_code=403, detail="Insufficient role")
-    return me
-
-
 @router.post("/{room_id}/start")
 async def start_recording(room_id: str, db: Session = Depends(get_db), authorization: str | None = Header(default=None)):
     token = parse_token(authorization)
     me = get_current_user(token, db)
     room = db.get(Room, room_id)
-    if not room:
+    if not room or room.deleted_at:
         raise HTTPException(status_code=404, detail="Room not found")
     require_role(db, room_id, me.id)
     if room_id in _recorders:
@@ -57,7 +54,9 @@ async def start_recording(room_id: str, db: Session = Depends(get_db), authoriza
     service_sub = f"recorder:{room_id}"
     service_token = create_access_token(service_sub, extra={"display_name": "Recorder", "recorder": True})
     # create initial recorder instance and store reference for stop/status
-    rr = RoomRecorder(room_id, service_token)
+    # record on the room's node so its signaling stays local
+    url = hub.placement.ws_url(room_id) if hub.placement.enabled else None
+    rr = RoomRecorder(room_id, service_token, url)
     _recorders[room_id] = (None, rr, str(rec.id))  # type: ignore
 
     async def run():
@@ -77,26 +76,26 @@ async def start_recording(room_id: str, db: Session = Depends(get_db), authoriza
                 if rec2:
                     rec2.status = RecordingStatus.stopping
                     db2.commit()
-                # upload to S3 (if configured)
-                url = None
-                key = None
-                try:
-                    if settings.s3_bucket and settings.s3_endpoint and settings.s3_access_key and settings.s3_secret_key:
-                        with open(rr.output_path, "rb") as f:
-                            key = f"recordings/{room_id}/{int(datetime.utcnow().timestamp())}.mkv"
-                            url = upload_fileobj(f, key, content_type="video/x-matroska")
-                        logger.info("recording.uploaded room_id=%s recording_id=%s key=%s url=%s", room_id, rec_id, key, url)
-                    else:
-                        logger.warning("recording.s3_not_configured room_id=%s recording_id=%s path=%s", room_id, rec_id, rr.output_path)
-                except Exception:
-                    logger.exception("recording.upload_failed room_id=%s recording_id=%s path=%s", room_id, rec_id, rr.output_path)
+                stopped_at = datetime.utcnow()
+                # HLS remux, thumbnail and S3 upload (if configured) run in the process pool
+                out = await postprocessor.run(rr.output_path, f"recordings/{room_id}/{rec_id}")
+                POSTPROCESS_SECONDS.observe(out["process_seconds"])
+                if out["source_url"]:
+                    UPLOAD_SECONDS.observe(out["upload_seconds"])
+                    UPLOAD_BYTES.inc(out["upload_bytes"])
+                    logger.info("recording.uploaded room_id=%s recording_id=%s key=%s manifest=%s", room_id, rec_id, out["source_key"], out["manifest_key"])
                 rec2 = db2.get(Recording, rec_id)
                 if rec2:
-                    rec2.public_url = url
-                    rec2.storage_key = key
-                    rec2.status = RecordingStatus.completed if url or not settings.s3_bucket else RecordingStatus.failed
-                    rec2.stopped_at = datetime.utcnow()
-                    if rr.started_at:
+                    rec2.public_url = out["source_url"]
+                    rec2.storage_key = out["source_key"]
+                    rec2.manifest_key = out["manifest_key"]
+                    rec2.manifest_url = out["manifest_url"]
+                    rec2.thumbnail_url = out["thumbnail_url"]
+                    rec2.status = RecordingStatus.completed if out["source_url"] or not s3_configured() else RecordingStatus.failed
+                    rec2.stopped_at = stopped_at
+                    if out["duration_seconds"] is not None:
+                        rec2.duration_seconds = out["duration_seconds"]
+                    elif rr.started_at:
                         rec2.duration_seconds = int((rec2.stopped_at - rr.started_at).total_seconds())
                     db2.commit()
                 logger.info("recording.worker_finished room_id=%s recording_id=%s status=%s", room_id, rec_id, rec2.status.value if rec2 else "unknown")
@@ -140,26 +139,28 @@ async def stop_recording(room_id: str, db: Session = Depends(get_db), authorizat
     rec = db.get(Recording, rec_id)
     # cleanup registry entry after stop completes
     _recorders.pop(room_id, None)
-    return {"status": rec.status.value if rec else "unknown", "recording_id": rec_id, "url": rec.public_url if rec else None}
+    return {
+        "status": rec.status.value if rec else "unknown",
+        "recording_id": rec_id,
+        "url": rec.public_url if rec else None,
+        "manifest_url": rec.manifest_url if rec else None,
+        "thumbnail_url": rec.thumbnail_url if rec else None,
+    }
 
 
-@router.get("/{room_id}")
-async def list_recordings(room_id: str, db: Session = Depends(get_db), authorization: str | None = Header(default=None)):
+@router.get("/{room_id}", response_model=list[RecordingOut])
+async def list_recordings(room_id: str, db: Session = Depends(get_read_db), authorization: str | None = Header(default=None)):
     # anyone in room can view recordings list
     token = parse_token(authorization)
     me = get_current_user(token, db)
     p = db.query(Participant).filter(Participant.room_id == room_id, Participant.user_id == me.id).first()
     if not p:
         raise HTTPException(status_code=403, detail="Not in room")
-    recs = db.query(Recording).filter(Recording.room_id == room_id).order_by(Recording.started_at.desc()).all()
-    return [{
-        "id": str(r.id),
-        "status": r.status.value,
-        "url": r.public_url,
-        "started_at": r.started_at.isoformat(),
-        "stopped_at": r.stopped_at.isoformat() if r.stopped_at else None,
-        "duration_seconds": r.duration_seconds,
-    } for r in recs]
+    recs = db.query(
+        Recording.id, Recording.status, Recording.public_url.label("url"), Recording.manifest_url,
+        Recording.thumbnail_url, Recording.started_at, Recording.stopped_at, Recording.duration_seconds,
+    ).filter(Recording.room_id == room_id).order_by(Recording.started_at.desc())
+    return rows_response(recs.all())
 
 
 @router.get("/{room_id}/status")
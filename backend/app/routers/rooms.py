@@ -1,10 +1,19 @@
 import secrets
+from datetime import datetime, timezone
 from fastapi import APIRouter, Depends, HTTPException, Header
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 from ..db.session import get_db
+from ..db.replica import get_read_db
 from ..models import Room, User, Participant
-from ..schemas.room import RoomCreate, RoomOut
-from .auth import get_current_user
+from ..schemas.room import MediaModeUpdate, ParticipantList, RoomCreate, RoomOut, RoomSummary
+from ..lib.responses import json_response, rows_response
+from .auth import ensure_user, get_current_user
+from .ws import hub
+from ..services.roster import FLAG_FIELDS, role_value
+from ..services.invites import invite_cache
+from ..services.permissions import role_cache
+from ..services.purge import remaining
 
 router = APIRouter()
 
@@ -17,13 +26,32 @@ def parse_token(authorization: str | None) -> str:
     return authorization.split(" ", 1)[1]
 
 
+def resolve_invite(db: Session, invite_code: str) -> dict:
+    hit, room = invite_cache.get(invite_code)
+    if not hit:
+        gen = invite_cache.generation()
+        row = db.query(Room.id, Room.name, Room.invite_code, Room.media_mode).filter(Room.invite_code == invite_code, Room.deleted_at.is_(None)).first()
+        room = {"id": row.id, "name": row.name, "invite_code": row.invite_code, "media_mode": row.media_mode} if row else None
+        invite_cache.put(invite_code, room, gen)
+    if room is None:
+        raise HTTPException(status_code=404, detail="Room not found")
+    return room
+
+
+def invalidate_invites(room_id, *codes: str):
+    # locally right away so this worker never serves the old code, then on every other worker
+    invite_cache.invalidate(*codes)
+    hub.dispatch("invite.invalidate", str(room_id), {"codes": list(codes)})
+
+
 @router.post("/", response_model=RoomOut)
 def create_room(payload: RoomCreate, db: Session = Depends(get_db), authorization: str | None = Header(default=None)):
     token = parse_token(authorization)
     user = get_current_user(token, db)
 
+    ensure_user(db, user)
     invite_code = secrets.token_urlsafe(8)[:12]
-    room = Room(name=payload.name, invite_code=invite_code, owner_id=user.id)
+    room = Room(name=payload.name, invite_code=invite_code, owner_id=user.id, media_mode=payload.media_mode)
     db.add(room)
     db.commit()
     db.refresh(room)
@@ -31,16 +59,14 @@ def create_room(payload: RoomCreate, db: Session = Depends(get_db), authorizatio
     participant = Participant(room_id=room.id, user_id=user.id, role="host", connected=False)
     db.add(participant)
     db.commit()
+    role_cache.put(room.id, user.id, "host")
 
     return room
 
 
 @router.get("/by-invite/{invite_code}", response_model=RoomOut)
 def get_room_by_invite(invite_code: str, db: Session = Depends(get_db)):
-    room = db.query(Room).filter(Room.invite_code == invite_code).first()
-    if not room:
-        raise HTTPException(status_code=404, detail="Room not found")
-    return room
+    return resolve_invite(db, invite_code)
 
 
 @router.post("/join/{invite_code}")
@@ -48,65 +74,86 @@ def join_room(invite_code: str, db: Session = Depends(get_db), authorization: st
     token = parse_token(authorization)
     user = get_current_user(token, db)
 
-    room = db.query(Room).filter(Room.invite_code == invite_code).first()
-    if not room:
-        raise HTTPException(status_code=404, detail="Room not found")
+    room = resolve_invite(db, invite_code)
 
-    exists = db.query(Participant).filter(Participant.room_id == room.id, Participant.user_id == user.id).first()
+    exists = db.query(Participant).filter(Participant.room_id == room["id"], Participant.user_id == user.id).first()
     if not exists:
-        p = Participant(room_id=room.id, user_id=user.id)
+        ensure_user(db, user)
+        p = Participant(room_id=room["id"], user_id=user.id)
         db.add(p)
         db.commit()
+        hub.dispatch("member.add", str(room["id"]), {"user_id": str(user.id), "display_name": user.display_name, "role": "guest"})
 
-    return {"room_id": str(room.id), "invite_code": room.invite_code}
+    # membership is never refused; a full room only means the socket will queue
+    admission = "open" if hub.room_has_seat(str(room["id"]), str(user.id)) else "waiting"
+    return {"room_id": str(room["id"]), "invite_code": room["invite_code"], "admission": admission}
 
 
-@router.get("/{room_id}/participants")
-def list_participants(room_id: str, db: Session = Depends(get_db)):
+@router.get("/{room_id}/participants", response_model=ParticipantList)
+def list_participants(room_id: str, db: Session = Depends(get_read_db)):
+    # live rooms are served from the hub roster; the table is only read for
+    # rooms nobody is connected to and once to load a live room's offline members
+    items = hub.roster.snapshot(room_id)
+    if items is not None:
+        return json_response({"items": items})
     q = (
-        db.query(Participant, User)
+        db.query(Participant.user_id, User.display_name, Participant.role, Participant.connected, *[getattr(Participant, f) for f in FLAG_FIELDS])
         .join(User, Participant.user_id == User.id)
         .filter(Participant.room_id == room_id)
     )
-    items = []
-    for p, u in q.all():
-        items.append({
-            "user_id": str(u.id),
-            "display_name": u.display_name,
-            "role": p.role.value if hasattr(p.role, 'value') else str(p.role),
+    rows = []
+    for p in q.all():
+        row = {
+            "user_id": str(p.user_id),
+            "display_name": p.display_name,
+            "role": role_value(p.role),
             "connected": bool(p.connected),
-            "mic_on": bool(getattr(p, 'mic_on', True)),
-            "cam_on": bool(getattr(p, 'cam_on', True)),
-            "screen_sharing": bool(getattr(p, 'screen_sharing', False)),
-            "is_speaking": bool(getattr(p, 'is_speaking', False)),
-            "raised_hand": bool(getattr(p, 'raised_hand', False)),
-            "muted_by_moderator": bool(getattr(p, 'muted_by_moderator', False)),
-        })
-    return {"items": items}
-
-
-@router.get("/{room_id}", response_model=RoomOut)
-def get_room(room_id: str, db: Session = Depends(get_db)):
+        }
+        row.update({f: bool(getattr(p, f)) for f in FLAG_FIELDS})
+        rows.append(row)
+    if hub.roster.get(room_id) is None:
+        return json_response({"items": rows})
+    hub.hydrate_roster(room_id, rows)
+    return json_response({"items": hub.roster.merge(room_id, rows)})
+
+
+@router.get("/{room_id}/ws-endpoint")
+def ws_endpoint(room_id: str, db: Session = Depends(get_db)):
+    """Where to open the room's WebSocket: the node that owns the room."""
     room = db.get(Room, room_id)
-    if not room:
+    if not room or room.deleted_at:
         raise HTTPException(status_code=404, detail="Room not found")
-    return room
+    return {"room_id": room_id, "node": hub.placement.owner(room_id), "url": hub.placement.ws_url(room_id)}
 
 
-@router.get("/mine")
-def my_rooms(db: Session = Depends(get_db), authorization: str | None = Header(default=None)):
+# declared before /{room_id}, which would otherwise take "mine" and "joined" as ids
+@router.get("/mine", response_model=list[RoomSummary])
+def my_rooms(db: Session = Depends(get_read_db), authorization: str | None = Header(default=None)):
     token = parse_token(authorization)
     me = get_current_user(token, db)
-    rooms = db.query(Room).filter(Room.owner_id == me.id).order_by(Room.created_at.desc()).all()
-    return [{"id": str(r.id), "name": r.name, "invite_code": r.invite_code} for r in rooms]
+    rooms = db.query(Room.id, Room.name, Room.invite_code).filter(Room.owner_id == me.id, Room.deleted_at.is_(None)).order_by(Room.created_at.desc())
+    return rows_response(rooms.all())
 
 
-@router.get("/joined")
-def joined_rooms(db: Session = Depends(get_db), authorization: str | None = Header(default=None)):
+@router.get("/joined", response_model=list[RoomSummary])
+def joined_rooms(db: Session = Depends(get_read_db), authorization: str | None = Header(default=None)):
     token = parse_token(authorization)
     me = get_current_user(token, db)
-    rooms = db.query(Room).join(Participant, Participant.room_id == Room.id).filter(Participant.user_id == me.id).order_by(Room.created_at.desc()).all()
-    return [{"id": str(r.id), "name": r.name, "invite_code": r.invite_code} for r in rooms]
+    rooms = (
+        db.query(Room.id, Room.name, Room.invite_code)
+        .join(Participant, Participant.room_id == Room.id)
+        .filter(Participant.user_id == me.id, Room.deleted_at.is_(None))
+        .order_by(Room.created_at.desc())
+    )
+    return rows_response(rooms.all())
+
+
+@router.get("/{room_id}", response_model=RoomOut)
+def get_room(room_id: str, db: Session = Depends(get_read_db)):
+    room = db.get(Room, room_id)
+    if not room or room.deleted_at:
+        raise HTTPException(status_code=404, detail="Room not found")
+    return room
 
 
 @router.post("/{room_id}/regenerate-invite")
@@ -114,26 +161,71 @@ def regenerate_invite(room_id: str, db: Session = Depends(get_db), authorization
     token = parse_token(authorization)
     me = get_current_user(token, db)
     room = db.get(Room, room_id)
-    if not room:
+    if not room or room.deleted_at:
         raise HTTPException(status_code=404, detail="Room not found")
     if room.owner_id != me.id:
         raise HTTPException(status_code=403, detail="Only owner can regenerate invite")
+    old_invite = room.invite_code
     new_invite = secrets.token_urlsafe(8)[:12]
     room.invite_code = new_invite
     db.commit()
     db.refresh(room)
+    # the new code may have been probed and cached as unknown
+    invalidate_invites(room.id, old_invite, new_invite)
     return {"invite_code": room.invite_code}
 
 
+@router.put("/{room_id}/media-mode")
+def set_media_mode(room_id: str, payload: MediaModeUpdate, db: Session = Depends(get_db), authorization: str | None = Header(default=None)):
+    token = parse_token(authorization)
+    me = get_current_user(token, db)
+    room = db.get(Room, room_id)
+    if not room or room.deleted_at:
+        raise HTTPException(status_code=404, detail="Room not found")
+    if room.owner_id != me.id:
+        raise HTTPException(status_code=403, detail="Only owner can change media mode")
+    if room.media_mode != payload.media_mode:
+        room.media_mode = payload.media_mode
+        db.commit()
+        # cached invite lookups carry the mode
+        invalidate_invites(room.id, room.invite_code)
+        hub.dispatch("room.media_mode", str(room.id), {"media_mode": room.media_mode})
+    return {"media_mode": room.media_mode}
+
+
 @router.delete("/{room_id}")
 def delete_room(room_id: str, db: Session = Depends(get_db), authorization: str | None = Header(default=None)):
     token = parse_token(authorization)
     me = get_current_user(token, db)
     room = db.get(Room, room_id)
-    if not room:
+    if not room or room.deleted_at:
         raise HTTPException(status_code=404, detail="Room not found")
     if room.owner_id != me.id:
         raise HTTPException(status_code=403, detail="Only owner can delete room")
-    db.delete(room)
+    # rows, recordings and S3 objects are removed later by services/purge.py
+    room.deleted_at = datetime.now(timezone.utc)
     db.commit()
-    return {"status": "ok"}
+    invalidate_invites(room_id, room.invite_code)
+    role_cache.drop_room(room_id)
+    hub.dispatch("room.deleted", str(room_id), {})
+    return JSONResponse({"status": "deleting"}, status_code=202)
+
+
+@router.get("/{room_id}/deletion")
+def deletion_status(room_id: str, db: Session = Depends(get_db), authorization: str | None = Header(default=None)):
+    """Progress of a room's purge; 404 once the room is completely gone."""
+    token = parse_token(authorization)
+    me = get_current_user(token, db)
+    room = db.get(Room, room_id)
+    if not room:
+        raise HTTPException(status_code=404, detail="Room not found")
+    if room.owner_id != me.id:
+        raise HTTPException(status_code=403, detail="Only owner can view deletion")
+    if not room.deleted_at:
+        raise HTTPException(status_code=409, detail="Room is not deleted")
+    return {
+        "status": "deleting",
+        "deleted_at": room.deleted_at.isoformat(),
+        "purged_rows": room.purged_rows,
+        "remaining": remaining(db, room.id),
+    }
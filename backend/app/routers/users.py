@@ -2,9 +2,12 @@ from fastapi import APIRouter, Depends, HTTPException, Header
 from pydantic import BaseModel, EmailStr, HttpUrl
 from sqlalchemy.orm import Session
 from ..db.session import get_db
+from ..db.replica import get_read_db, note_write
 from ..models import User, Participant
 from ..core.security import create_access_token, hash_password, verify_password
-from .auth import get_current_user
+from ..schemas.room import RoomSummary
+from ..lib.responses import rows_response
+from .auth import anonymous_token, ensure_user, get_current_user
 
 router = APIRouter()
 
@@ -26,6 +29,8 @@ class UserOut(BaseModel):
     email: str | None = None
     display_name: str
     avatar_url: str | None = None
+    # guests only: their profile lives in the token, so a change comes with a new one
+    access_token: str | None = None
 
 
 class ProfileUpdate(BaseModel):
@@ -55,6 +60,8 @@ def register(payload: RegisterRequest, db: Session = Depends(get_db)):
     db.add(u)
     db.commit()
     db.refresh(u)
+    # the request had no token yet, so the commit could not start the window
+    note_write(u.id)
     token = create_access_token(str(u.id), extra={"display_name": u.display_name})
     return {"access_token": token, "token_type": "bearer"}
 
@@ -79,30 +86,33 @@ def me(authorization: str | None = Header(default=None), db: Session = Depends(g
 def update_me(payload: ProfileUpdate, authorization: str | None = Header(default=None), db: Session = Depends(get_db)):
     token = parse_token(authorization)
     u = get_current_user(token, db)
+    anonymous = u.email is None and u.password_hash is None
+    ensure_user(db, u)
+    u = db.get(User, u.id)
     if payload.display_name is not None:
         u.display_name = payload.display_name
     if payload.avatar_url is not None:
         u.avatar_url = str(payload.avatar_url)
     db.commit()
     db.refresh(u)
-    return UserOut(id=str(u.id), email=u.email, display_name=u.display_name, avatar_url=u.avatar_url)
+    access_token = anonymous_token(u.id, u.display_name, u.avatar_url) if anonymous else None
+    return UserOut(id=str(u.id), email=u.email, display_name=u.display_name, avatar_url=u.avatar_url, access_token=access_token)
 
 
-@router.get("/me/rooms")
-def my_rooms(authorization: str | None = Header(default=None), db: Session = Depends(get_db)):
+@router.get("/me/rooms", response_model=list[RoomSummary])
+def my_rooms(authorization: str | None = Header(default=None), db: Session = Depends(get_read_db)):
     token = parse_token(authorization)
     u = get_current_user(token, db)
     # rooms I own
     from ..models import Room
-    own = db.query(Room).filter(Room.owner_id == u.id).order_by(Room.created_at.desc()).all()
-    return [{"id": str(r.id), "name": r.name, "invite_code": r.invite_code} for r in own]
+    own = db.query(Room.id, Room.name, Room.invite_code).filter(Room.owner_id == u.id, Room.deleted_at.is_(None)).order_by(Room.created_at.desc())
+    return rows_response(own.all())
 
 
-@router.get("/me/rooms/joined")
-def my_joined_rooms(authorization: str | None = Header(default=None), db: Session = Depends(get_db)):
+@router.get("/me/rooms/joined", response_model=list[RoomSummary])
+def my_joined_rooms(authorization: str | None = Header(default=None), db: Session = Depends(get_read_db)):
     token = parse_token(authorization)
     u = get_current_user(token, db)
     from ..models import Room
-    q = db.query(Room).join(Participant, Participant.room_id == Room.id).filter(Participant.user_id == u.id)
-    rooms = q.order_by(Room.created_at.desc()).all()
-    return [{"id": str(r.id), "name": r.name, "invite_code": r.invite_code} for r in rooms]
+    q = db.query(Room.id, Room.name, Room.invite_code).join(Participant, Participant.room_id == Room.id).filter(Participant.user_id == u.id, Room.deleted_at.is_(None))
+    return rows_response(q.order_by(Room.created_at.desc()).all())
@@ -1,11 +1,35 @@
+from collections import Counter
+from datetime import datetime, timezone
 from typing import Dict, List
+import asyncio
+import json
+import logging
+import random
+import signal
+import threading
+import time
 import uuid
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
-from ..core.security import decode_token
+from sqlalchemy import update
+from ..core.config import settings
+from ..core.security import create_access_token, decode_token
 from ..db.session import SessionLocal
-from ..models import Participant, CallLog
+from ..lib.metrics import WS_ADMISSION, WS_FANOUT, WS_SEND_DROPPED
+from ..models import CallLog, Participant, Room
+from ..services.admission import WaitingRoom, overloaded
+from ..services.bus import MAX_PAYLOAD_BYTES, HubBus
+from ..services.calllog import CallLogWriter, take_over
+from ..services.invites import invite_cache
+from ..services.permissions import role_cache
+from ..services.placement import Placement
+from ..services.ratelimit import FrameLimiter
+from ..services.roster import Roster, FLAG_FIELDS, PERSISTED_FIELDS, RosterEntry, chunk_snapshot, role_value
+from ..services.sfu import Sfu
+from ..services.workers import WorkerRegistry
+from .auth import ensure_user, token_user
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 
 class Connection:
@@ -14,158 +38,1106 @@ class Connection:
         self.user_id = user_id
         self.display_name = display_name
         self.conn_id = str(uuid.uuid4())
+        self.room_key: str | None = None
+        # accepted early to wait for a seat
+        self.accepted = False
+        # room role, kept current by moderation events so in-socket checks need no query
+        self.role: str | None = None
+        # outgoing frames, already serialized; drained by the hub's writer task
+        self.queue: asyncio.Queue[str] = asyncio.Queue(maxsize=settings.ws_send_queue_size)
+        self.writer: asyncio.Task | None = None
+        self.dropped = 0
+        # incoming frames rejected by rate limits
+        self.rejected = 0
+        self.limiter = FrameLimiter(settings.ws_conn_limits)
+        # is_speaking debounce: last broadcast time, latest value, pending trailing flush
+        self.speaking_at = 0.0
+        self.speaking = False
+        self.speaking_timer: asyncio.TimerHandle | None = None
+        # heartbeat: last frame from the client; the endpoint task the reaper cancels
+        self.last_seen = time.monotonic()
+        self.task: asyncio.Task | None = None
+        self.reaped = False
+        self.finalized = False
+        # got a resume token; the session may continue on another worker
+        self.resume_offered = False
+
+    def send(self, message: dict):
+        frames_out[message.get("type")] += 1
+        self.send_text(dump(message))
+
+    def send_text(self, text: str):
+        try:
+            self.queue.put_nowait(text)
+        except asyncio.QueueFull:
+            # slow consumer: the frame is lost, the client notices the seq gap and resyncs
+            self.dropped += 1
+            WS_SEND_DROPPED.inc()
+
+
+# frame counters read by the metrics collector at scrape time
+SFU_FRAMES = frozenset({"sfu.publish", "sfu.subscribe", "sfu.answer", "sfu.unpublish"})
+FRAME_TYPES = frozenset({"signal", "state", "resync", "pong"}) | SFU_FRAMES
+frames_out: Counter[str] = Counter()
+
+
+def dump(message: dict) -> str:
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+
+
+def is_recorder_user(user_id) -> bool:
+    return isinstance(user_id, str) and user_id.startswith("recorder:")
+
+
+def event_id(message: dict) -> str | None:
+    """Resumable id for frames backed by a table; only chat messages have one."""
+    if message.get("type") == "chat":
+        msg = message["msg"]
+        return f"{msg['created_at']}_{msg['id']}"
+    return None
+
+
+def sse_frame(message: dict, text: str) -> tuple[str | None, str]:
+    eid = event_id(message)
+    head = f"event: {message.get('type')}\n" + (f"id: {eid}\n" if eid else "")
+    return eid, f"{head}data: {text}\n\n"
+
+
+class Subscriber:
+    """Read-only room listener (SSE) fed the frames sockets get, pre-formatted."""
+
+    def __init__(self, room_key: str):
+        self.room_key = room_key
+        # (event id, SSE frame)
+        self.queue: asyncio.Queue[tuple[str | None, str]] = asyncio.Queue(maxsize=settings.sse_queue_size)
+        # set when the queue overflowed; the stream ends and the client resumes by Last-Event-ID
+        self.lagged = False
+        # set when the room is gone; the stream ends for good
+        self.closed = False
 
 
 class RoomHub:
     def __init__(self):
         self.rooms: Dict[str, List[Connection]] = {}
-        # track active call log ids per (room_id, user_id)
-        self.active_logs: Dict[tuple[str, str], str] = {}
+        # indexes over `rooms` for addressed delivery
+        self.conns: Dict[str, Connection] = {}
+        self.users: Dict[str, Dict[str, List[Connection]]] = {}
+        # this worker's heartbeat, and which workers are alive
+        self.workers = WorkerRegistry()
+        # call logs of this worker's connections, written in batches
+        self.calllogs = CallLogWriter(self.workers.worker_id)
+        # rows loaded from the participants table go stale unless the bus keeps the roster current
+        self.roster = Roster(None if settings.hub_bus_enabled else settings.roster_sync_s)
+        # roster snapshots being received: origin worker -> (round, rooms seen, chunks seen)
+        self._sync_rounds: Dict[str, tuple[int, set[str], int]] = {}
+        self._sync_round = 0
+        # workers the roster still counts connections for while they're missing from hub_workers
+        self._missing_workers: Dict[str, float] = {}
+        self._roster_sync: asyncio.Task | None = None
+        # per-room version of the roster as seen by this worker's sockets
+        self.seq: Dict[str, int] = {}
+        # per-room incoming frame limits, dropped together with the room
+        self.room_limiters: Dict[str, FrameLimiter] = {}
+        # incoming frames rejected by rate limits, by frame type
+        self.dropped_frames: Counter[str] = Counter()
+        self.frames_in: Counter[str] = Counter()
+        self.frames_out = frames_out
+        self.bus = HubBus(self.workers.worker_id)
+        # which node owns which room, when placement is enabled
+        self.placement = Placement()
+        # media forwarding for rooms in sfu mode, and the mode of each live room
+        self.sfu = Sfu()
+        self.media_modes: Dict[str, str] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+        # SSE readers per room
+        self.subscribers: Dict[str, List[Subscriber]] = {}
+        # sockets waiting for a seat, and seats handed out whose member isn't in the roster yet
+        self.waiting = WaitingRoom()
+        self.admitting: Counter[str] = Counter()
+        # server-initiated closes and other background work in flight
+        self._closing: set[asyncio.Task] = set()
+        self._reaper: asyncio.Task | None = None
+        # connections closed for missing heartbeats
+        self.reaped = 0
+        # set once a drain started: no new sockets, existing ones are handed off
+        self.draining = False
+        self._drain_task: asyncio.Task | None = None
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        await self.workers.start(self._on_dead_workers)
+        await self.calllogs.start()
+        await self.bus.start(self._on_bus_event)
+        await self.placement.start(lambda: self.draining, self.rebalance)
+        self._reaper = asyncio.create_task(self._reap_loop())
+        if self.bus.enabled:
+            self._roster_sync = asyncio.create_task(self._roster_sync_loop())
+
+    async def stop(self):
+        for task in (self._reaper, self._roster_sync):
+            if task is not None:
+                task.cancel()
+        self._reaper = self._roster_sync = None
+        await self.placement.stop()
+        await self.sfu.close_all()
+        await self.bus.stop()
+        await self.calllogs.stop()
+        await self.workers.stop()
+
+    def dispatch(self, kind: str, room_key: str, data: dict):
+        """Apply a roster event on this worker and relay it to the others.
+
+        Safe to call from sync endpoints running in the threadpool: the event
+        is handed over to the loop so roster mutations stay single-threaded.
+        """
+        self._on_loop(self._apply, kind, room_key, data, self.workers.worker_id)
+        self.bus.publish(kind, room_key, data)
+
+    def _on_loop(self, fn, *args):
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if self._loop is None or running is self._loop:
+            fn(*args)
+        else:
+            self._loop.call_soon_threadsafe(fn, *args)
+
+    async def _on_bus_event(self, kind: str, room_key: str, data: dict, origin: str):
+        self._apply(kind, room_key, data, origin)
+
+    def _apply(self, kind: str, room_key: str, data: dict, origin: str):
+        # every roster change is fanned out once, as a delta stamped with the room seq;
+        # connections are counted per worker (`origin`)
+        if kind == "member.connect":
+            m = self.roster.connect(room_key, data, origin)
+            self.fanout(room_key, {"type": "join", "user_id": m.user_id, "display_name": m.display_name,
+                                   "conn_id": data.get("conn_id"), "state": m.to_dict()},
+                        skip_conn_id=data.get("conn_id"))
+        elif kind == "member.disconnect":
+            m = self.roster.disconnect(room_key, data["user_id"], origin)
+            self.fanout(room_key, {"type": "leave", "user_id": data["user_id"], "conn_id": data.get("conn_id"),
+                                   "connected": bool(m and m.connected)})
+            self.waiting.seat(room_key, self.take_seat)
+        elif kind == "member.state":
+            changed = self.roster.set_state(room_key, data["user_id"], data)
+            if changed:
+                self.fanout(room_key, {"type": "participant_state", "user_id": data["user_id"], **changed})
+        elif kind == "member.add":
+            self.roster.add_member(room_key, data["user_id"], data.get("display_name"), data.get("role", "guest"))
+        elif kind == "signal":
+            self.deliver_signal(room_key, data, relay=False)
+        elif kind == "invite.invalidate":
+            invite_cache.invalidate(*data["codes"])
+        elif kind == "room.deleted":
+            role_cache.drop_room(room_key)
+            self.close_room(room_key)
+        elif kind == "room.media_mode":
+            if room_key in self.media_modes:
+                self.media_modes[room_key] = data["media_mode"]
+            if data["media_mode"] != "sfu":
+                self._in_background(self.sfu.close_room(room_key))
+            self.fanout(room_key, {"type": "media_mode", "media_mode": data["media_mode"]})
+        elif kind == "chat":
+            self.emit(room_key, data)
+        elif kind == "keys.updated":
+            self.fanout(room_key, {"type": "keys_updated", "user_id": data["user_id"], "updated_at": data["updated_at"]})
+        elif kind == "moderation":
+            self._moderate(room_key, data)
+        elif kind == "roster.sync_request":
+            self.publish_roster()
+        elif kind == "roster.sync":
+            self._apply_roster_sync(origin, data)
+        elif kind == "roster.sync_done":
+            self._finish_roster_sync(origin, data)
+
+    def _presence_changed(self, room_key: str, m: RosterEntry):
+        """Join or leave frame for a member whose connected flag flipped
+        without a connect/disconnect event: a snapshot or a dead worker."""
+        if m.connected:
+            self.fanout(room_key, {"type": "join", "user_id": m.user_id, "display_name": m.display_name,
+                                   "conn_id": None, "state": m.to_dict()})
+        else:
+            self.fanout(room_key, {"type": "leave", "user_id": m.user_id, "conn_id": None, "connected": False})
+            self.waiting.seat(room_key, self.take_seat)
+
+    def publish_roster(self):
+        """Send this worker's connections to the others, in as many bus
+        events as the payload limit needs, closed by `roster.sync_done`."""
+        self._sync_round += 1
+        # room by room under the payload limit, leaving room for the envelope
+        chunks = chunk_snapshot(self.roster.local(self.workers.worker_id), MAX_PAYLOAD_BYTES - 200)
+        for chunk in chunks:
+            self.bus.publish("roster.sync", "", {"g": self._sync_round, "rooms": chunk})
+        self.bus.publish("roster.sync_done", "", {"g": self._sync_round, "chunks": len(chunks)})
+
+    def _apply_roster_sync(self, origin: str, data: dict):
+        g, seen, count = self._sync_rounds.get(origin, (None, set(), 0))
+        if g != data["g"]:
+            g, seen, count = data["g"], set(), 0
+        for room_key, reset, users in data["rooms"]:
+            seen.add(room_key)
+            for m, _ in self.roster.sync(room_key, origin, users, reset):
+                self._presence_changed(room_key, m)
+        self._sync_rounds[origin] = (g, seen, count + 1)
+
+    def _finish_roster_sync(self, origin: str, data: dict):
+        g, seen, count = self._sync_rounds.pop(origin, (None, set(), 0))
+        if data["chunks"] and (g != data["g"] or count != data["chunks"]):
+            # part of the snapshot was lost; the next round corrects it
+            logger.warning("roster.sync_incomplete worker_id=%s got=%s of=%s", origin, count, data["chunks"])
+            return
+        # rooms missing from a complete snapshot have no connections of that worker
+        for room_key, m in self.roster.drop_worker(origin, set(self.roster.rooms) - seen):
+            self._presence_changed(room_key, m)
+
+    async def _on_dead_workers(self, dead: set[str]):
+        for worker_id in dead:
+            self._drop_worker(worker_id)
+
+    def _drop_worker(self, worker_id: str):
+        self._sync_rounds.pop(worker_id, None)
+        self._missing_workers.pop(worker_id, None)
+        gone = self.roster.drop_worker(worker_id)
+        if gone:
+            logger.info("roster.worker_dropped worker_id=%s members=%s", worker_id, len(gone))
+        for room_key, m in gone:
+            self._presence_changed(room_key, m)
+
+    def _expire_workers(self):
+        """Drop connections of workers that never showed up in hub_workers,
+        or vanished from it while this one wasn't looking."""
+        now = time.monotonic()
+        counted = self.roster.workers() - self.workers.alive
+        for worker_id in list(self._missing_workers):
+            if worker_id not in counted:
+                del self._missing_workers[worker_id]
+        for worker_id in counted:
+            since = self._missing_workers.setdefault(worker_id, now)
+            if now - since >= settings.worker_ttl_s:
+                self._drop_worker(worker_id)
+
+    async def _roster_sync_loop(self):
+        """Ask the others for their connections once, then keep sending ours.
+
+        Bus events can be lost (a listener reconnecting) or dropped (over
+        the payload limit); the periodic snapshot bounds how long a worker's
+        view of another one's connections stays wrong.
+        """
+        self.bus.publish("roster.sync_request", "", {})
+        while True:
+            try:
+                self._expire_workers()
+                self.publish_roster()
+            except Exception:
+                logger.exception("roster.sync_failed")
+            await asyncio.sleep(settings.roster_sync_s)
+
+    def _moderate(self, room_key: str, data: dict):
+        """One frame per moderation batch; kicked users' sockets are closed."""
+        action, user_ids = data["action"], data["user_ids"]
+        if action == "kick":
+            role_cache.forget(room_key, user_ids)
+        elif action in ("promote", "demote"):
+            role_cache.set_roles(room_key, user_ids, "moderator" if action == "promote" else "guest")
+        for uid in user_ids:
+            if action in ("mute", "unmute"):
+                self.roster.set_state(room_key, uid, {"muted_by_moderator": action == "mute"})
+            elif action in ("promote", "demote"):
+                role = "moderator" if action == "promote" else "guest"
+                self.roster.set_role(room_key, uid, role)
+                for c in self.users.get(room_key, {}).get(uid, []):
+                    c.role = role
+            elif action == "kick":
+                self.roster.remove_member(room_key, uid)
+        self.fanout(room_key, {"type": "moderation", "action": action, "user_ids": user_ids, "by": data.get("by")})
+        if action == "kick":
+            for uid in user_ids:
+                for c in list(self.users.get(room_key, {}).get(uid, [])):
+                    self.close(c, 4403, "kicked")
+
+    async def _reap_loop(self):
+        """Ping quiet connections and run the disconnect path for dead ones.
+
+        Half-open sockets never raise on receive, so without this they
+        would stay in the room, take fan-out writes and keep the
+        participant marked connected.
+        """
+        interval = settings.ws_ping_interval_s
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            for c in list(self.conns.values()):
+                idle = now - c.last_seen
+                if idle >= settings.ws_idle_timeout_s:
+                    self.reap(c)
+                elif idle >= interval:
+                    c.send({"type": "ping", "ts": int(time.time() * 1000)})
+
+    def reap(self, conn: Connection):
+        if conn.reaped or conn.finalized:
+            return
+        conn.reaped = True
+        self.reaped += 1
+        logger.info("ws.reaped conn=%s user=%s room=%s", conn.conn_id, conn.user_id, conn.room_key)
+        # the endpoint's finally runs the full disconnect path
+        if conn.task is not None:
+            conn.task.cancel()
+        self.close(conn, 4408, "idle timeout")
+
+    def resume_token(self, conn: Connection) -> str | None:
+        """Short-lived token that lets another worker continue this session
+        without touching the participants or call_logs tables."""
+        log = self.calllogs.open_logs.get(conn.conn_id)
+        room = self.roster.get(conn.room_key)
+        m = room.members.get(str(conn.user_id)) if room else None
+        if log is None or m is None:
+            return None
+        log_id, joined_at = log
+        return create_access_token(
+            str(conn.user_id),
+            extra={
+                "typ": "resume",
+                "room": conn.room_key,
+                "display_name": conn.display_name,
+                "role": conn.role,
+                "log": str(log_id),
+                "joined_at": joined_at.isoformat(),
+                "state": {f: getattr(m, f) for f in FLAG_FIELDS if f != "is_speaking"},
+            },
+            expires_minutes=settings.resume_token_expire_minutes,
+        )
+
+    def start_drain(self):
+        if self._drain_task is None:
+            self._drain_task = asyncio.create_task(self.drain())
+
+    async def drain(self):
+        """Move every socket off this worker before it exits.
+
+        New sockets are refused, every client gets a `reconnect` frame with
+        a random delay (so a deploy doesn't turn into a reconnect stampede)
+        and a resume token. Sockets still open after DRAIN_TIMEOUT_S are
+        closed; pending call logs and bus events are flushed.
+        """
+        self.draining = True
+        logger.info("ws.drain_started connections=%s", len(self.conns))
+        # waiters retry elsewhere
+        self.waiting.wake_all()
+        # so the reconnect frames already point at the rooms' next owners
+        try:
+            await self.placement.mark_draining()
+        except Exception:
+            logger.exception("ws.drain_placement_failed")
+        await self.hand_off(list(self.conns.values()))
+        deadline = time.monotonic() + settings.drain_timeout_s
+        while self.conns and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        for c in list(self.conns.values()):
+            self.close(c, 1012, "restarting")
+        if self._closing:
+            await asyncio.wait(list(self._closing), timeout=2)
+        await self.calllogs.flush()
+        await self.bus.flush()
+        logger.info("ws.drain_finished left=%s", len(self.conns))
+
+    async def hand_off(self, conns: List[Connection]):
+        """Ask sockets to reconnect, with a resume token and their room's node."""
+        # every log a resume token points at must exist before anyone resumes
+        await self.calllogs.flush()
+        for c in conns:
+            frame = {"type": "reconnect", "delay_ms": random.randint(0, settings.drain_jitter_ms)}
+            if self.placement.enabled:
+                frame["ws_url"] = self.placement.ws_url(c.room_key)
+            token = self.resume_token(c)
+            if token is not None:
+                frame["resume_token"] = token
+                c.resume_offered = True
+            c.send(frame)
+
+    async def rebalance(self):
+        """Move rooms this node no longer owns (ring changed, or a client
+        connected to the wrong node) to their owner."""
+        if self.draining:
+            return
+        # the recorder can't follow a reconnect; it stays and is reached over the bus
+        moving = [
+            c
+            for room_key, conns in self.rooms.items()
+            if not self.placement.is_local(room_key)
+            for c in conns
+            if not c.resume_offered and not is_recorder_user(c.user_id)
+        ]
+        if moving:
+            logger.info("ws.rebalance connections=%s", len(moving))
+            await self.hand_off(moving)
+            # a client that doesn't follow the reconnect frame is moved anyway
+            asyncio.get_running_loop().call_later(settings.drain_timeout_s, self._close_moved, moving)
+
+    def _close_moved(self, conns: List[Connection]):
+        for c in conns:
+            if self.conns.get(c.conn_id) is c:
+                self.close(c, 1012, "moved")
+
+    def install_drain_handler(self, sig: int = signal.SIGTERM):
+        """Drain on SIGTERM before uvicorn's own shutdown runs.
+
+        uvicorn closes every socket as soon as it sees the signal, so its
+        handler is deferred until the drain finished. A second signal
+        skips the wait.
+        """
+        if threading.current_thread() is not threading.main_thread():
+            return
+        previous = signal.getsignal(sig)
+        loop = asyncio.get_running_loop()
+
+        async def drain_then_exit(signum):
+            try:
+                self.start_drain()
+                await self._drain_task
+            finally:
+                if callable(previous):
+                    previous(signum, None)
+
+        def handler(signum, frame):
+            if self.draining and callable(previous):
+                previous(signum, frame)
+                return
+            loop.call_soon_threadsafe(lambda: asyncio.ensure_future(drain_then_exit(signum)))
+
+        signal.signal(sig, handler)
+
+    def close_room(self, room_key: str):
+        """Tell everyone in a deleted room, then close its sockets and SSE streams."""
+        self.emit(room_key, {"type": "room_deleted"})
+        for c in list(self.rooms.get(room_key, [])):
+            self.close(c, 4404, "room deleted")
+        for s in list(self.subscribers.get(room_key, [])):
+            s.closed = True
+        self.waiting.close_room(room_key)
+        self._in_background(self.sfu.close_room(room_key))
+
+    def close(self, conn: Connection, code: int, reason: str = ""):
+        """Close a socket from the server side after its queued frames went out."""
+        self._in_background(self._close(conn, code, reason))
+
+    def _in_background(self, coro):
+        task = asyncio.create_task(coro)
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def _close(self, conn: Connection, code: int, reason: str):
+        for _ in range(20):
+            if conn.queue.empty():
+                break
+            await asyncio.sleep(0.05)
+        try:
+            await conn.ws.close(code=code, reason=reason)
+        except Exception:
+            pass
+
+    def route_signal(self, room_key: str, conn: Connection, data: dict) -> bool:
+        """Deliver a signal frame to its addressee only, never to the whole room.
+
+        The target is `to_conn`, else every connection of `to_user`, else the
+        single other peer when there is exactly one. Returns False when no
+        target can be determined. A frame too large to relay to another
+        worker is answered with a `signal_too_large` error.
+        """
+        msg = dict(data)
+        msg["from"] = conn.user_id
+        msg["from_conn"] = conn.conn_id
+        if not msg.get("to_conn") and not msg.get("to_user"):
+            others = [c for c in self.rooms.get(room_key, []) if c is not conn]
+            if len(others) != 1 or self._has_remote_members(room_key):
+                return False
+            msg["to_conn"] = others[0].conn_id
+        if not self.deliver_signal(room_key, msg):
+            conn.send({"type": "error", "code": "signal_too_large"})
+        return True
+
+    def deliver_signal(self, room_key: str, msg: dict, relay: bool = True) -> bool:
+        """False when the frame had to go to another worker and was too large for the bus."""
+        to_conn_id = msg.get("to_conn")
+        if to_conn_id:
+            target = self.conns.get(to_conn_id)
+            if target is not None and target.room_key == room_key:
+                target.send(msg)
+            elif relay:
+                # the addressee lives on another worker
+                return self.bus.publish("signal", room_key, msg)
+            return True
+        to_user = str(msg["to_user"])
+        local = self.users.get(room_key, {}).get(to_user, [])
+        if local:
+            text = dump(msg)
+            for c in local:
+                if c.conn_id != msg["from_conn"]:
+                    c.send_text(text)
+        if relay:
+            room = self.roster.get(room_key)
+            m = room.members.get(to_user) if room else None
+            if m is not None and m.elsewhere(self.workers.worker_id):
+                return self.bus.publish("signal", room_key, msg)
+        return True
+
+    def _has_remote_members(self, room_key: str) -> bool:
+        room = self.roster.get(room_key)
+        if room is None:
+            return False
+        me = self.workers.worker_id
+        return any(m.elsewhere(me) for m in list(room.members.values()))
+
+    async def media_mode(self, room_key: str, room_id: str) -> str:
+        mode = self.media_modes.get(room_key)
+        if mode is None:
+            mode = self.media_modes[room_key] = await asyncio.to_thread(load_media_mode, room_id)
+        return mode
+
+    async def handle_sfu(self, room_key: str, conn: Connection, kind: str, data: dict):
+        """Publish/subscribe negotiation with the in-process SFU."""
+        if self.media_modes.get(room_key) != "sfu":
+            conn.send({"type": "error", "code": "sfu_disabled"})
+            return
+        try:
+            if kind == "sfu.publish":
+                if self.sfu.is_full(room_key, conn.conn_id):
+                    conn.send({"type": "error", "code": "sfu_full"})
+                    return
+                answer, info = await self.sfu.publish(room_key, conn.conn_id, conn.user_id, data["sdp"])
+                conn.send({"type": "sfu.answer", "sdp": answer})
+                self.emit(room_key, {"type": "sfu.publisher", **info}, skip_conn=conn)
+            elif kind == "sfu.subscribe":
+                publisher = str(data.get("publisher"))
+                offer = await self.sfu.subscribe(room_key, conn.conn_id, publisher)
+                if offer is None:
+                    conn.send({"type": "error", "code": "sfu_unknown_publisher"})
+                else:
+                    conn.send({"type": "sfu.offer", "publisher": publisher, "sdp": offer})
+            elif kind == "sfu.answer":
+                if not await self.sfu.answer(room_key, conn.conn_id, str(data.get("publisher")), data["sdp"]):
+                    conn.send({"type": "error", "code": "sfu_unknown_publisher"})
+            elif kind == "sfu.unpublish":
+                if await self.sfu.unpublish(room_key, conn.conn_id):
+                    self.emit(room_key, {"type": "sfu.unpublished", "conn_id": conn.conn_id})
+        except Exception:
+            # malformed or unsupported SDP
+            logger.warning("ws.sfu_failed room_id=%s conn=%s frame=%s", room_key, conn.conn_id, kind, exc_info=True)
+            conn.send({"type": "error", "code": "sfu_negotiation_failed"})
+
+    def allow(self, room_key: str, conn: Connection, kind: str) -> bool:
+        """Check the connection's and the room's budget for one incoming frame."""
+        now = time.monotonic()
+        if conn.limiter.allow(kind, now):
+            limiter = self.room_limiters.get(room_key)
+            if limiter is None:
+                limiter = self.room_limiters[room_key] = FrameLimiter(settings.ws_room_limits)
+            if limiter.allow(kind, now):
+                return True
+        self.dropped_frames[kind] += 1
+        conn.rejected += 1
+        if conn.rejected == 1:
+            # log once per connection, a flooding client would flood the log too
+            logger.warning("ws.rate_limited room_id=%s user_id=%s frame=%s", room_key, conn.user_id, kind)
+        return False
+
+    def set_speaking(self, room_key: str, conn: Connection, value: bool):
+        """Broadcast is_speaking at most once per debounce window, trailing edge wins."""
+        conn.speaking = value
+        if conn.speaking_timer is not None:
+            return
+        loop = asyncio.get_running_loop()
+        wait = conn.speaking_at + settings.ws_speaking_debounce_ms / 1000 - loop.time()
+        if wait <= 0:
+            self._flush_speaking(room_key, conn)
+        else:
+            conn.speaking_timer = loop.call_later(wait, self._flush_speaking, room_key, conn)
+
+    def _flush_speaking(self, room_key: str, conn: Connection):
+        conn.speaking_timer = None
+        if conn not in self.rooms.get(room_key, []):
+            return
+        data = {"user_id": conn.user_id, "is_speaking": conn.speaking}
+        if self.roster.diff(room_key, conn.user_id, data, ("is_speaking",)):
+            conn.speaking_at = asyncio.get_running_loop().time()
+            self.dispatch("member.state", room_key, data)
+
+    def fanout(self, room_key: str, message: dict, skip_conn_id: str | None = None):
+        if room_key not in self.rooms and room_key not in self.subscribers:
+            return
+        t0 = time.perf_counter()
+        seq = self.seq.get(room_key, 0) + 1
+        self.seq[room_key] = seq
+        message["seq"] = seq
+        text = dump(message)
+        n = 0
+        for c in list(self.rooms.get(room_key, [])):
+            if c.conn_id != skip_conn_id:
+                c.send_text(text)
+                n += 1
+        frames_out[message["type"]] += n
+        self._feed(room_key, message, text)
+        WS_FANOUT.observe(time.perf_counter() - t0)
+
+    def subscribe(self, room_key: str) -> Subscriber:
+        sub = Subscriber(room_key)
+        self.subscribers.setdefault(room_key, []).append(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber):
+        subs = self.subscribers.get(sub.room_key, [])
+        if sub in subs:
+            subs.remove(sub)
+        if not subs:
+            self.subscribers.pop(sub.room_key, None)
+            if sub.room_key not in self.rooms:
+                self.seq.pop(sub.room_key, None)
+
+    def _feed(self, room_key: str, message: dict, text: str):
+        subs = self.subscribers.get(room_key)
+        if not subs:
+            return
+        # formatted once for every reader
+        item = sse_frame(message, text)
+        for s in list(subs):
+            try:
+                s.queue.put_nowait(item)
+            except asyncio.QueueFull:
+                s.lagged = True
+                self.unsubscribe(s)
+
+    def roster_frame(self, room_key: str) -> dict:
+        room = self.roster.get(room_key)
+        items = [m.to_dict() for m in list(room.members.values())] if room else []
+        return {"type": "roster", "seq": self.seq.get(room_key, 0), "items": items}
+
+    def hydrate_roster(self, room_key: str, rows: list[dict]):
+        self._on_loop(self.roster.hydrate, room_key, rows)
+
+    def in_call(self, room_key: str, user_id: str) -> bool:
+        room = self.roster.get(room_key)
+        m = room.members.get(user_id) if room else None
+        return m is not None and m.connected
+
+    def room_has_seat(self, room_key: str, user_id: str) -> bool:
+        """Room capacity counts distinct connected users on every worker (the
+        roster); a second tab of someone already in the call needs no seat."""
+        if not settings.room_max_connections or self.in_call(room_key, user_id):
+            return True
+        room = self.roster.get(room_key)
+        live = room.live_count() if room else 0
+        return live + self.admitting[room_key] < settings.room_max_connections
+
+    def _worker_has_seat(self, room_key: str) -> bool:
+        if settings.worker_max_connections and len(self.conns) + sum(self.admitting.values()) >= settings.worker_max_connections:
+            return False
+        if settings.worker_max_rooms and room_key not in self.rooms and room_key not in self.admitting:
+            return len(self.rooms.keys() | self.admitting.keys()) < settings.worker_max_rooms
+        return True
+
+    def take_seat(self, room_key: str, user_id: str) -> bool:
+        """Reserve a seat for a new socket if the room and this worker have one."""
+        if not (self.room_has_seat(room_key, str(user_id)) and self._worker_has_seat(room_key)):
+            return False
+        self.admitting[room_key] += 1
+        return True
+
+    def release_seat(self, room_key: str):
+        """Drop a reservation: the member is counted by the roster now, or never made it."""
+        self.admitting[room_key] -= 1
+        if self.admitting[room_key] <= 0:
+            del self.admitting[room_key]
+        self.waiting.seat(room_key, self.take_seat)
+
+    def seat_waiting(self):
+        for room_key in list(self.waiting.queues):
+            self.waiting.seat(room_key, self.take_seat)
+
+    async def admit(self, room_key: str, conn: Connection) -> bool:
+        """Reserve a seat for a new socket, queueing it while the room or worker is full.
+
+        A queued socket is accepted and gets a `waiting` frame with its
+        position whenever it changes (and every WS_PING_INTERVAL_S as a
+        keepalive). Returns False once the socket was closed instead: queue
+        full, waited too long, room deleted, worker draining, client gone.
+        On True the caller holds a reservation and gives it back with
+        release_seat once the member is in the roster.
+        """
+        queued = room_key in self.waiting.queues and not self.in_call(room_key, str(conn.user_id))
+        if not queued and self.take_seat(room_key, conn.user_id):
+            WS_ADMISSION.labels("admitted").inc()
+            return True
+        w = self.waiting.enqueue(room_key, str(conn.user_id))
+        if w is None:
+            WS_ADMISSION.labels("refused").inc()
+            await conn.ws.close(code=1013, reason="room full")
+            return False
+        WS_ADMISSION.labels("queued").inc()
+        admitted = False
+        receiver: asyncio.Future | None = None
+        try:
+            await conn.ws.accept()
+            conn.accepted = True
+            # seats may have freed up while nobody was queued
+            self.waiting.seat(room_key, self.take_seat)
+            receiver = asyncio.ensure_future(conn.ws.receive())
+            deadline = time.monotonic() + settings.ws_waiting_timeout_s
+            while not w.seated:
+                if w.closed:
+                    await conn.ws.close(code=4404, reason="room deleted")
+                    return False
+                if self.draining:
+                    await conn.ws.close(code=1012, reason="restarting")
+                    return False
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    WS_ADMISSION.labels("timed_out").inc()
+                    await conn.ws.close(code=1013, reason="waiting room timeout")
+                    return False
+                w.changed.clear()
+                position, queued = self.waiting.position(room_key, w)
+                await conn.ws.send_text(dump({"type": "waiting", "position": position, "queue": queued}))
+                changed = asyncio.ensure_future(w.changed.wait())
+                done, _ = await asyncio.wait(
+                    {changed, receiver}, timeout=min(remaining, settings.ws_ping_interval_s),
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                changed.cancel()
+                if receiver in done:
+                    # frames sent while waiting are ignored; a disconnect ends the wait
+                    if receiver.exception() is not None or receiver.result()["type"] == "websocket.disconnect":
+                        return False
+                    receiver = asyncio.ensure_future(conn.ws.receive())
+            WS_ADMISSION.labels("admitted").inc()
+            admitted = True
+            return True
+        finally:
+            if not admitted:
+                if w.seated:
+                    self.release_seat(room_key)
+                else:
+                    self.waiting.remove(room_key, w)
+            if receiver is not None and not receiver.done():
+                # the endpoint reads next; the pending receive must be gone by then
+                receiver.cancel()
+                await asyncio.wait({receiver})
 
     async def connect(self, room_key: str, conn: Connection):
-        await conn.ws.accept()
+        if not conn.accepted:
+            await conn.ws.accept()
+            conn.accepted = True
+        conn.room_key = room_key
         self.rooms.setdefault(room_key, []).append(conn)
+        self.conns[conn.conn_id] = conn
+        self.users.setdefault(room_key, {}).setdefault(str(conn.user_id), []).append(conn)
+        conn.writer = asyncio.create_task(self._write(room_key, conn))
 
     async def disconnect(self, room_key: str, conn: Connection):
+        self._drop(room_key, conn)
+        if settings.worker_max_connections or settings.worker_max_rooms:
+            self.seat_waiting()
+        if conn.speaking_timer is not None:
+            conn.speaking_timer.cancel()
+        if conn.writer is not None and conn.writer is not asyncio.current_task():
+            conn.writer.cancel()
+
+    def _drop(self, room_key: str, conn: Connection):
         conns = self.rooms.get(room_key, [])
         if conn in conns:
             conns.remove(conn)
+        self.conns.pop(conn.conn_id, None)
+        by_user = self.users.get(room_key, {})
+        mine = by_user.get(str(conn.user_id), [])
+        if conn in mine:
+            mine.remove(conn)
+        if not mine:
+            by_user.pop(str(conn.user_id), None)
         if not conns:
             self.rooms.pop(room_key, None)
+            self.users.pop(room_key, None)
+            self.seq.pop(room_key, None)
+            self.room_limiters.pop(room_key, None)
+            self.media_modes.pop(room_key, None)
+
+    async def _write(self, room_key: str, conn: Connection):
+        try:
+            while True:
+                text = await conn.queue.get()
+                await conn.ws.send_text(text)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # drop dead connections silently
+            self._drop(room_key, conn)
 
     async def broadcast(self, room_key: str, message: dict, skip_conn: Connection | None = None):
+        self.emit(room_key, message, skip_conn)
+
+    def emit(self, room_key: str, message: dict, skip_conn: Connection | None = None):
+        """Send an unversioned frame to this worker's sockets and readers."""
+        # serialize once, every socket gets the same text
+        t0 = time.perf_counter()
+        text = dump(message)
+        n = 0
         for c in list(self.rooms.get(room_key, [])):
             if skip_conn is not None and c is skip_conn:
                 continue
-            try:
-                await c.ws.send_json(message)
-            except Exception:
-                # drop dead connections silently
-                conns = self.rooms.get(room_key, [])
-                if c in conns:
-                    conns.remove(c)
-                if not conns:
-                    self.rooms.pop(room_key, None)
+            c.send_text(text)
+            n += 1
+        frames_out[message.get("type")] += n
+        self._feed(room_key, message, text)
+        WS_FANOUT.observe(time.perf_counter() - t0)
 
     def find_by_conn_id(self, room_key: str, conn_id: str) -> Connection | None:
-        for c in self.rooms.get(room_key, []):
-            if c.conn_id == conn_id:
-                return c
-        return None
+        c = self.conns.get(conn_id)
+        return c if c is not None and c.room_key == room_key else None
 
 
 hub = RoomHub()
 
 
+def parse_resume(resume: str | None, user_id: str, room_key: str) -> dict | None:
+    if not resume:
+        return None
+    try:
+        claims = decode_token(resume)
+    except Exception:
+        return None
+    if claims.get("typ") != "resume" or claims.get("sub") != user_id or claims.get("room") != room_key:
+        return None
+    return claims
+
+
 @router.websocket("/{room_id}")
-async def websocket_endpoint(websocket: WebSocket, room_id: str, token: str = Query(...)):
+async def websocket_endpoint(websocket: WebSocket, room_id: str, token: str = Query(...), resume: str | None = Query(default=None)):
+    if hub.draining:
+        # refused before accept; the client retries and lands on another worker
+        await websocket.close(code=1013)
+        return
     try:
         payload = decode_token(token)
         user_id = payload.get("sub")
         display_name = payload.get("display_name")
-        is_recorder = bool(payload.get("recorder")) or (isinstance(user_id, str) and user_id.startswith("recorder:"))
+        is_recorder = bool(payload.get("recorder")) or is_recorder_user(user_id)
     except Exception:
         await websocket.close(code=4401)
         return
 
     room_key = str(room_id)
+    resumed = None if is_recorder else parse_resume(resume, user_id, room_key)
+    # recorders and sessions handed off by a draining worker were admitted before
+    seat_held = not is_recorder and resumed is None
+    if seat_held and overloaded():
+        WS_ADMISSION.labels("shed").inc()
+        await websocket.close(code=1013, reason="overloaded")
+        return
     conn = Connection(websocket, user_id, display_name)
-    await hub.connect(room_key, conn)
-
-    # Mark participant as connected in DB (skip for recorder)
-    if not is_recorder:
-        db = SessionLocal()
-        try:
-            # ensure participant row exists
-            p = db.query(Participant).filter(Participant.room_id == room_id, Participant.user_id == user_id).first()
-            if not p:
-                p = Participant(room_id=room_id, user_id=user_id)
-                db.add(p)
-            p.connected = True
-            db.commit()
-            # start call log
-            cl = CallLog(room_id=room_id, user_id=user_id)
-            db.add(cl)
-            db.commit()
-            db.refresh(cl)
-            hub.active_logs[(room_id, user_id)] = str(cl.id)
-        finally:
-            db.close()
-
-    # send welcome with own conn_id
-    await conn.ws.send_json({"type": "welcome", "conn_id": conn.conn_id})
-    # send current peers to newcomer
-    current = [
-        {"user_id": c.user_id, "conn_id": c.conn_id, "display_name": c.display_name}
-        for c in hub.rooms.get(room_key, []) if c is not conn and not (isinstance(c.user_id, str) and c.user_id.startswith("recorder:"))
-    ]
-    if current:
-        await conn.ws.send_json({"type": "peers", "items": current})
-    # notify others (skip for recorder)
-    if not is_recorder:
-        await hub.broadcast(room_key, {"type": "join", "user_id": user_id, "display_name": display_name, "conn_id": conn.conn_id}, skip_conn=conn)
-        await hub.broadcast(room_key, {"type": "participant_state", "user_id": user_id, "connected": True})
+    conn.task = asyncio.current_task()
+    if seat_held and not await hub.admit(room_key, conn):
+        return
+    joined = False
 
     try:
+        await hub.connect(room_key, conn)
+        if resumed is not None:
+            # handed off by a draining worker: the call log already exists, the
+            # room and the participant row are checked again since the token was issued
+            log_id, log_joined_at = uuid.UUID(resumed["log"]), datetime.fromisoformat(resumed["joined_at"])
+            hub.calllogs.adopt(conn.conn_id, log_id, log_joined_at)
+            checked = await asyncio.to_thread(check_resumed, room_id, user_id, log_id, log_joined_at)
+            if isinstance(checked, tuple):
+                hub.calllogs.close(conn.conn_id)
+                await websocket.close(code=checked[0], reason=checked[1])
+                return
+            conn.role = checked
+            role_cache.put(room_id, user_id, conn.role)
+            member = {"user_id": user_id, "display_name": display_name, "role": conn.role, "conn_id": conn.conn_id}
+            member.update(resumed["state"])
+            member["is_speaking"] = False
+            hub.dispatch("member.connect", room_key, member)
+            joined = True
+        # Mark participant as connected in DB (skip for recorder)
+        elif not is_recorder:
+            db = SessionLocal()
+            try:
+                if not db.query(Room.id).filter(Room.id == room_id, Room.deleted_at.is_(None)).first():
+                    await websocket.close(code=4404, reason="room not found")
+                    return
+                # ensure participant row exists
+                p = db.query(Participant).filter(Participant.room_id == room_id, Participant.user_id == user_id).first()
+                if not p:
+                    if payload.get("anon"):
+                        ensure_user(db, token_user(payload))
+                    p = Participant(room_id=room_id, user_id=user_id)
+                    db.add(p)
+                p.connected = True
+                db.commit()
+                conn.role = role_value(p.role)
+                role_cache.put(room_id, user_id, conn.role)
+                member = {"user_id": user_id, "display_name": display_name, "role": conn.role, "conn_id": conn.conn_id}
+                member.update({f: bool(getattr(p, f)) for f in FLAG_FIELDS})
+                # is_speaking is not persisted, nobody speaks on arrival
+                member["is_speaking"] = False
+            finally:
+                db.close()
+            hub.calllogs.open(conn.conn_id, room_id, user_id)
+            # notify others with a single join frame carrying the member's state
+            hub.dispatch("member.connect", room_key, member)
+            joined = True
+            # the roster counts the member from here on
+            hub.release_seat(room_key)
+            seat_held = False
+
+        mode = await hub.media_mode(room_key, room_id)
+        # send welcome with own conn_id
+        conn.send({"type": "welcome", "conn_id": conn.conn_id, "media_mode": mode})
+        if mode == "sfu":
+            conn.send({"type": "sfu.publishers", "items": hub.sfu.publishers(room_key)})
+        # send current peers to newcomer
+        current = [
+            {"user_id": c.user_id, "conn_id": c.conn_id, "display_name": c.display_name}
+            for c in hub.rooms.get(room_key, []) if c is not conn and not is_recorder_user(c.user_id)
+        ]
+        if current:
+            conn.send({"type": "peers", "items": current})
+        # roster snapshot at the current seq; deltas follow from seq + 1
+        conn.send(hub.roster_frame(room_key))
+
         while True:
             data = await websocket.receive_json()
+            # any frame proves the client is alive, `pong` exists only for that
+            conn.last_seen = time.monotonic()
             t = data.get("type")
+            hub.frames_in[t if t in FRAME_TYPES else "other"] += 1
             if t == "signal":
-                # expected: {type:"signal", to_conn:"...", sdp|ice:...}
-                msg = {"type": "signal", "from": user_id, "from_conn": conn.conn_id}
-                msg.update(data)
-                # optionally direct delivery if to_conn provided
-                to_conn_id = data.get("to_conn")
-                if to_conn_id:
-                    target = hub.find_by_conn_id(room_key, to_conn_id)
-                    if target:
-                        try:
-                            await target.ws.send_json(msg)
-                        except Exception:
-                            # if target is dead, drop it
-                            await hub.disconnect(room_key, target)
+                # expected: {type:"signal", to_conn|to_user:"...", sdp|ice:...}
+                if not hub.allow(room_key, conn, "signal"):
                     continue
-                # else broadcast to room (clients filter)
-                await hub.broadcast(room_key, msg, skip_conn=conn)
+                if not hub.route_signal(room_key, conn, data):
+                    conn.send({"type": "error", "code": "signal_target_required"})
             elif t == "state":
-                # update participant state and broadcast
+                # update participant state; only fields that actually changed are stored and broadcast
                 if not is_recorder:
+                    if not hub.allow(room_key, conn, "state"):
+                        continue
+                    if "is_speaking" in data:
+                        hub.set_speaking(room_key, conn, bool(data["is_speaking"]))
+                    changed = hub.roster.diff(room_key, user_id, data, PERSISTED_FIELDS)
+                    if not changed:
+                        continue
                     db2 = SessionLocal()
                     try:
                         p = db2.query(Participant).filter(Participant.room_id == room_id, Participant.user_id == user_id).first()
                         if p:
-                            for f in ("mic_on", "cam_on", "screen_sharing", "is_speaking", "raised_hand"):
-                                if f in data:
-                                    setattr(p, f, bool(data[f]))
+                            for f, v in changed.items():
+                                setattr(p, f, v)
                             db2.commit()
-                        await hub.broadcast(room_key, {"type": "participant_state", "user_id": user_id, **{k: data[k] for k in data if k != 'type'}})
                     finally:
                         db2.close()
+                    hub.dispatch("member.state", room_key, {"user_id": user_id, **changed})
+            elif t in SFU_FRAMES:
+                if hub.allow(room_key, conn, "sfu"):
+                    await hub.handle_sfu(room_key, conn, t, data)
+            elif t == "resync":
+                # client saw a seq gap
+                if hub.allow(room_key, conn, "resync"):
+                    conn.send(hub.roster_frame(room_key))
     except WebSocketDisconnect:
-        await hub.disconnect(room_key, conn)
-        # mark disconnected in DB (skip for recorder)
-        if not is_recorder:
-            db = SessionLocal()
-            try:
-                p = db.query(Participant).filter(Participant.room_id == room_id, Participant.user_id == user_id).first()
-                if p:
-                    p.connected = False
-                    db.commit()
-                # finish call log
-                key = (room_id, user_id)
-                log_id = hub.active_logs.pop(key, None)
-                if log_id:
-                    cl = db.get(CallLog, log_id)
-                    if cl and not cl.left_at:
-                        from datetime import datetime, timezone
-                        cl.left_at = datetime.now(timezone.utc)
-                        joined = cl.joined_at
-                        if joined is not None and joined.tzinfo is None:
-                            joined = joined.replace(tzinfo=timezone.utc)
-                        if joined is not None:
-                            cl.duration_seconds = int((cl.left_at - joined).total_seconds())
-                        db.commit()
-            finally:
-                db.close()
-            await hub.broadcast(room_key, {"type": "leave", "user_id": user_id, "conn_id": conn.conn_id})
-            await hub.broadcast(room_key, {"type": "participant_state", "user_id": user_id, "connected": False})
+        pass
+    except asyncio.CancelledError:
+        # the reaper cancels idle connections; any other cancellation propagates
+        if not conn.reaped:
+            raise
+    finally:
+        if seat_held:
+            hub.release_seat(room_key)
+        await finalize(room_key, conn, room_id, user_id, joined)
+
+
+def load_media_mode(room_id: str) -> str:
+    db = SessionLocal()
+    try:
+        return db.query(Room.media_mode).filter(Room.id == room_id).scalar() or "mesh"
+    finally:
+        db.close()
+
+
+def check_resumed(room_id: str, user_id: str, log_id: uuid.UUID, joined_at: datetime) -> str | tuple[int, str]:
+    """Role of a resuming participant, whose call log now belongs to this
+    worker; or the close code and reason when the room was deleted or the
+    participant removed after the token was issued."""
+    db = SessionLocal()
+    try:
+        if not db.query(Room.id).filter(Room.id == room_id, Room.deleted_at.is_(None)).first():
+            return 4404, "room not found"
+        p = db.query(Participant).filter(Participant.room_id == room_id, Participant.user_id == user_id).first()
+        if p is None:
+            return 4403, "removed from room"
+        p.connected = True
+        take_over(db, log_id, joined_at, hub.workers.worker_id)
+        db.commit()
+        return role_value(p.role)
+    finally:
+        db.close()
+
+
+def end_unless_resumed(log: tuple[uuid.UUID, datetime], room_id: str, user_id: str, worker_id: str) -> bool:
+    """Close the call log of a session offered to other workers and mark the
+    participant disconnected, unless another worker took the log over.
+    Returns True when it did.
+
+    A resume takes the log over in the same transaction that marks the
+    participant connected, so the two can't interleave: whichever commits
+    second sees the other's write.
+    """
+    log_id, joined_at = log
+    left_at = datetime.now(timezone.utc)
+    db = SessionLocal()
+    try:
+        closed = db.execute(
+            update(CallLog.__table__)
+            .where(
+                CallLog.id == log_id,
+                CallLog.joined_at == joined_at,
+                CallLog.worker_id == worker_id,
+                CallLog.left_at.is_(None),
+            )
+            .values(left_at=left_at, duration_seconds=max(0, int((left_at - joined_at).total_seconds())))
+        ).rowcount
+        if closed:
+            db.query(Participant).filter(Participant.room_id == room_id, Participant.user_id == user_id).update({"connected": False})
+        db.commit()
+        return bool(closed)
+    finally:
+        db.close()
+
+
+def mark_disconnected(room_id: str, user_id: str):
+    db = SessionLocal()
+    try:
+        p = db.query(Participant).filter(Participant.room_id == room_id, Participant.user_id == user_id).first()
+        if p:
+            p.connected = False
+            db.commit()
+    finally:
+        db.close()
+
+
+async def finalize(room_key: str, conn: Connection, room_id: str, user_id: str, joined: bool):
+    """Tear a connection down once, however it ended: close, error or reaped."""
+    if conn.finalized:
+        return
+    conn.finalized = True
+    await hub.disconnect(room_key, conn)
+    if await hub.sfu.leave(room_key, conn.conn_id):
+        hub.emit(room_key, {"type": "sfu.unpublished", "conn_id": conn.conn_id})
+    if joined:
+        # leave frame carries the connected flag, no separate participant_state
+        hub.dispatch("member.disconnect", room_key, {"user_id": user_id, "conn_id": conn.conn_id})
+        log = hub.calllogs.release(conn.conn_id) if conn.resume_offered else None
+        if log is not None:
+            # the session may have resumed elsewhere; if no worker took the log over it ends here
+            await asyncio.to_thread(end_unless_resumed, log, room_id, user_id, hub.workers.worker_id)
+        else:
+            hub.calllogs.close(conn.conn_id)
+            await asyncio.to_thread(mark_disconnected, room_id, user_id)
@@ -0,0 +1,14 @@
+from datetime import datetime
+from uuid import UUID
+
+from pydantic import BaseModel
+
+
+class MessageOut(BaseModel):
+    id: UUID
+    user_id: UUID
+    ciphertext: str
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,14 @@
+from datetime import datetime
+from uuid import UUID
+
+from pydantic import BaseModel
+
+
+class KeyBundleOut(BaseModel):
+    user_id: UUID
+    identity_key: str
+    pre_key: str | None = None
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,18 @@
+from datetime import datetime
+from uuid import UUID
+
+from pydantic import BaseModel
+
+
+class RecordingOut(BaseModel):
+    id: UUID
+    status: str
+    url: str | None = None
+    manifest_url: str | None = None
+    thumbnail_url: str | None = None
+    started_at: datetime
+    stopped_at: datetime | None = None
+    duration_seconds: int | None = None
+
+    class Config:
+        from_attributes = True
@@ -1,13 +1,48 @@
+from typing import Literal
 from pydantic import BaseModel
 from uuid import UUID
 
+MediaMode = Literal["mesh", "sfu"]
+
 class RoomCreate(BaseModel):
     name: str
+    media_mode: MediaMode = "mesh"
+
+
+class MediaModeUpdate(BaseModel):
+    media_mode: MediaMode
 
 class RoomOut(BaseModel):
     id: UUID
     name: str
     invite_code: str
+    media_mode: str = "mesh"
 
     class Config:
         from_attributes = True
+
+
+class RoomSummary(BaseModel):
+    id: UUID
+    name: str
+    invite_code: str
+
+    class Config:
+        from_attributes = True
+
+
+class ParticipantOut(BaseModel):
+    user_id: UUID
+    display_name: str
+    role: str
+    connected: bool
+    mic_on: bool
+    cam_on: bool
+    screen_sharing: bool
+    is_speaking: bool
+    raised_hand: bool
+    muted_by_moderator: bool
+
+
+class ParticipantList(BaseModel):
+    items: list[ParticipantOut]
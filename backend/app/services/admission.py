@@ -0,0 +1,124 @@
+import asyncio
+from collections import deque
+from typing import Callable, Deque, Dict
+
+import orjson
+
+from ..core.config import settings
+from ..lib.diagnostics import loop_monitor
+from ..lib.metrics import HTTP_SHED
+
+# never shed: load balancer probes, scrapes and the operator's own tools
+SHED_EXEMPT = ("/health", "/metrics", "/admin")
+
+
+def overloaded() -> bool:
+    """Event-loop lag, smoothed over about a second, is above SHED_LOOP_LAG_S."""
+    return settings.shed_loop_lag_s > 0 and loop_monitor.lag_avg > settings.shed_loop_lag_s
+
+
+class Waiter:
+    __slots__ = ("user_id", "changed", "seated", "closed")
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        # set whenever the waiter's position or fate changed
+        self.changed = asyncio.Event()
+        self.seated = False
+        # the room went away while waiting
+        self.closed = False
+
+
+class WaitingRoom:
+    """FIFO queues of accepted sockets waiting for a seat, per room.
+
+    Seats are handed out from the front only, so a newcomer never
+    overtakes someone already waiting. Runs on the event loop only.
+    """
+
+    def __init__(self):
+        self.queues: Dict[str, Deque[Waiter]] = {}
+
+    def __len__(self) -> int:
+        return sum(len(q) for q in self.queues.values())
+
+    def enqueue(self, room_key: str, user_id: str) -> Waiter | None:
+        """None when the room's queue is full."""
+        q = self.queues.setdefault(room_key, deque())
+        if len(q) >= settings.ws_waiting_room_max:
+            if not q:
+                self.queues.pop(room_key, None)
+            return None
+        w = Waiter(user_id)
+        q.append(w)
+        return w
+
+    def position(self, room_key: str, w: Waiter) -> tuple[int, int]:
+        """1-based position and queue length."""
+        q = self.queues.get(room_key)
+        if not q or w not in q:
+            return 0, len(q or ())
+        return q.index(w) + 1, len(q)
+
+    def remove(self, room_key: str, w: Waiter):
+        q = self.queues.get(room_key)
+        if q is None or w not in q:
+            return
+        behind = list(q)[q.index(w) + 1:]
+        q.remove(w)
+        for other in behind:
+            other.changed.set()
+        if not q:
+            self.queues.pop(room_key, None)
+
+    def seat(self, room_key: str, take_seat: Callable[[str, str], bool]):
+        """Seat waiters from the front while `take_seat` reserves one for them."""
+        q = self.queues.get(room_key)
+        moved = False
+        while q and take_seat(room_key, q[0].user_id):
+            w = q.popleft()
+            w.seated = True
+            w.changed.set()
+            moved = True
+        if moved:
+            for w in q:
+                w.changed.set()
+        if not q:
+            self.queues.pop(room_key, None)
+
+    def close_room(self, room_key: str):
+        for w in self.queues.pop(room_key, ()):
+            w.closed = True
+            w.changed.set()
+
+    def wake_all(self):
+        for q in self.queues.values():
+            for w in q:
+                w.changed.set()
+
+
+class LoadShedMiddleware:
+    """Answers 503 while the worker is overloaded, before any route runs.
+
+    Only installed when SHED_LOOP_LAG_S is set. Open WebSockets are left
+    alone; new ones are refused in the WS endpoint.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not overloaded() or scope["path"].startswith(SHED_EXEMPT):
+            return await self.app(scope, receive, send)
+        HTTP_SHED.inc()
+        body = orjson.dumps({"detail": "Server overloaded, retry shortly"})
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", b"1"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
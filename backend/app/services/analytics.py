@@ -0,0 +1,179 @@
+import asyncio
+import logging
+import uuid
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta, timezone
+
+from sqlalchemy import or_, select, text, tuple_, update
+
+from ..core.config import settings
+from ..db.session import SessionLocal
+from ..models import CallLog, RollupState, RoomDailyPeak, UsageDaily
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_NAME = "call_logs_usage"
+# pg advisory lock id, so only one worker rolls up at a time
+LOCK_KEY = 0x68726F6C
+
+
+def _utc(dt: datetime) -> datetime:
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt
+
+
+def day_bounds(day: date) -> tuple[datetime, datetime]:
+    start = datetime.combine(day, time.min, tzinfo=timezone.utc)
+    return start, start + timedelta(days=1)
+
+
+def split_by_day(joined_at: datetime, left_at: datetime, duration: int | None) -> list[tuple[date, int]]:
+    """Spread a call over the UTC days it spans; the parts sum to `duration`."""
+    joined_at, left_at = _utc(joined_at), _utc(left_at)
+    total = duration if duration is not None else max(0, int((left_at - joined_at).total_seconds()))
+    parts = []
+    day = joined_at.date()
+    while True:
+        _, end = day_bounds(day)
+        if left_at <= end:
+            break
+        parts.append((day, int((end - max(joined_at, day_bounds(day)[0])).total_seconds())))
+        day += timedelta(days=1)
+    # the last day takes the remainder so billing totals match call_logs exactly
+    parts.append((day, max(0, total - sum(s for _, s in parts))))
+    return parts
+
+
+def room_peak(db, room_id: uuid.UUID, day: date, now: datetime) -> int:
+    """Max simultaneous connections in a room on one day, by sweep line."""
+    start, end = day_bounds(day)
+    rows = db.execute(
+        select(CallLog.joined_at, CallLog.left_at)
+        .where(CallLog.room_id == room_id, CallLog.joined_at < end, or_(CallLog.left_at.is_(None), CallLog.left_at >= start))
+    ).all()
+    events = []
+    for joined_at, left_at in rows:
+        events.append((max(_utc(joined_at), start), 1))
+        events.append((min(_utc(left_at) if left_at else now, end), -1))
+    # leaving before joining at the same instant
+    events.sort()
+    peak = cur = 0
+    for _, delta in events:
+        cur += delta
+        peak = max(peak, cur)
+    return peak
+
+
+def rollup_once(batch_size: int | None = None) -> int:
+    """Fold the next batch of closed calls into the summary tables.
+
+    Calls are taken in (left_at, id) order past the stored high-water mark,
+    and the mark moves in the same transaction as the aggregates. A call's
+    left_at can still move past the mark after it was counted (a sweep
+    closed it, then its worker closed it for real), so counted calls are
+    also marked rolled_up and never taken again. Calls closed within the last
+    ANALYTICS_ROLLUP_LAG_S are left for later because the call-log writer
+    commits them with a delay. Returns the number of calls processed.
+    """
+    batch_size = batch_size or settings.analytics_rollup_batch_size
+    now = datetime.now(timezone.utc)
+    db = SessionLocal()
+    try:
+        if db.get_bind().dialect.name == "postgresql":
+            if not db.execute(text("SELECT pg_try_advisory_xact_lock(:k)"), {"k": LOCK_KEY}).scalar():
+                return 0
+        state = db.get(RollupState, ROLLUP_NAME)
+        if state is None:
+            state = RollupState(name=ROLLUP_NAME)
+            db.add(state)
+
+        q = select(CallLog.id, CallLog.room_id, CallLog.user_id, CallLog.joined_at, CallLog.left_at, CallLog.duration_seconds).where(
+            CallLog.left_at.is_not(None),
+            CallLog.left_at <= now - timedelta(seconds=settings.analytics_rollup_lag_s),
+            CallLog.rolled_up.is_(False),
+        )
+        if state.last_left_at is not None:
+            q = q.where(tuple_(CallLog.left_at, CallLog.id) > tuple_(state.last_left_at, state.last_id))
+        rows = db.execute(q.order_by(CallLog.left_at, CallLog.id).limit(batch_size)).all()
+        if not rows:
+            db.rollback()
+            return 0
+
+        usage: dict[tuple, list[int]] = defaultdict(lambda: [0, 0])
+        touched: set[tuple[uuid.UUID, date]] = set()
+        for r in rows:
+            for day, secs in split_by_day(r.joined_at, r.left_at, r.duration_seconds):
+                usage[(r.room_id, day, r.user_id)][0] += secs
+                touched.add((r.room_id, day))
+            usage[(r.room_id, _utc(r.joined_at).date(), r.user_id)][1] += 1
+
+        rooms = {k[0] for k in usage}
+        days = {k[1] for k in usage}
+        existing = {
+            (u.room_id, u.day, u.user_id): u
+            for u in db.query(UsageDaily).filter(UsageDaily.room_id.in_(rooms), UsageDaily.day.in_(days))
+        }
+        for (room_id, day, user_id), (secs, sessions) in usage.items():
+            u = existing.get((room_id, day, user_id))
+            if u is None:
+                db.add(UsageDaily(room_id=room_id, day=day, user_id=user_id, seconds=secs, sessions=sessions))
+            else:
+                u.seconds += secs
+                u.sessions += sessions
+
+        peaks = {
+            (p.room_id, p.day): p
+            for p in db.query(RoomDailyPeak).filter(RoomDailyPeak.room_id.in_(rooms), RoomDailyPeak.day.in_(days))
+        }
+        for room_id, day in touched:
+            peak = room_peak(db, room_id, day, now)
+            p = peaks.get((room_id, day))
+            if p is None:
+                db.add(RoomDailyPeak(room_id=room_id, day=day, peak_concurrency=peak))
+            elif peak > p.peak_concurrency:
+                p.peak_concurrency = peak
+
+        table = CallLog.__table__
+        db.execute(
+            update(table)
+            .where(tuple_(table.c.id, table.c.joined_at).in_([(r.id, r.joined_at) for r in rows]))
+            .values(rolled_up=True)
+        )
+        state.last_left_at, state.last_id = rows[-1].left_at, rows[-1].id
+        state.updated_at = now
+        db.commit()
+        return len(rows)
+    finally:
+        db.close()
+
+
+class AnalyticsRollup:
+    """Runs rollup_once periodically, draining backlogs without sleeping."""
+
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+
+    async def start(self):
+        if settings.analytics_rollup_enabled:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                n = await asyncio.to_thread(rollup_once)
+                if n >= settings.analytics_rollup_batch_size:
+                    continue
+            except Exception:
+                logger.exception("analytics.rollup_failed")
+            await asyncio.sleep(settings.analytics_rollup_interval_s)
+
+
+rollup = AnalyticsRollup()
@@ -0,0 +1,133 @@
+import asyncio
+import json
+import logging
+from typing import Awaitable, Callable
+
+import psycopg
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "hackrtc_hub"
+# Postgres rejects NOTIFY payloads of 8000 bytes or more
+MAX_PAYLOAD_BYTES = 7900
+
+# (kind, room, data, origin worker)
+Handler = Callable[[str, str, dict, str], Awaitable[None]]
+
+
+def _dsn() -> str:
+    # SQLAlchemy urls carry the driver name, libpq does not understand it
+    return settings.database_url.replace("postgresql+psycopg://", "postgresql://", 1)
+
+
+class HubBus:
+    """Relays RoomHub events between workers over Postgres LISTEN/NOTIFY.
+
+    Disabled unless HUB_BUS_ENABLED is set; publish() is then a no-op and every
+    worker only sees its own events, which is the single-worker behaviour.
+    Publishing never blocks the caller: events are queued and sent by a
+    background task, so it is safe on the signaling path and from threads.
+    """
+
+    def __init__(self, worker_id: str):
+        self.worker_id = worker_id
+        self.enabled = False
+        self._handler: Handler | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._queue: asyncio.Queue[str] | None = None
+        self._tasks: list[asyncio.Task] = []
+
+    async def start(self, handler: Handler):
+        if not settings.hub_bus_enabled:
+            return
+        self._handler = handler
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._tasks = [
+            asyncio.create_task(self._listen()),
+            asyncio.create_task(self._publish_loop()),
+        ]
+        self.enabled = True
+        logger.info("bus.started worker_id=%s", self.worker_id)
+
+    async def stop(self):
+        self.enabled = False
+        for t in self._tasks:
+            t.cancel()
+        for t in self._tasks:
+            try:
+                await t
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._tasks = []
+
+    async def flush(self, timeout: float = 2.0):
+        """Wait for queued events to be sent, e.g. before the worker exits."""
+        if not self.enabled:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("bus.flush_timeout pending=%s", self._queue.qsize())
+
+    def publish(self, kind: str, room_key: str, data: dict) -> bool:
+        """Queue an event for the other workers. False when it was dropped for
+        exceeding NOTIFY's payload limit; True otherwise, also with the bus off."""
+        if not self.enabled:
+            return True
+        payload = json.dumps({"o": self.worker_id, "k": kind, "r": room_key, "d": data}, separators=(",", ":"))
+        if len(payload.encode("utf-8")) > MAX_PAYLOAD_BYTES:
+            logger.warning("bus.payload_too_large kind=%s room=%s bytes=%s", kind, room_key, len(payload))
+            return False
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._queue.put_nowait(payload)
+        else:
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, payload)
+        return True
+
+    async def _publish_loop(self):
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(_dsn(), autocommit=True) as conn:
+                    while True:
+                        payload = await self._queue.get()
+                        try:
+                            await conn.execute("SELECT pg_notify(%s, %s)", (CHANNEL, payload))
+                        finally:
+                            self._queue.task_done()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("bus.publish_failed worker_id=%s", self.worker_id)
+                await asyncio.sleep(1.0)
+
+    async def _listen(self):
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(_dsn(), autocommit=True) as conn:
+                    await conn.execute(f"LISTEN {CHANNEL}")
+                    async for n in conn.notifies():
+                        await self._deliver(n.payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("bus.listen_failed worker_id=%s", self.worker_id)
+                await asyncio.sleep(1.0)
+
+    async def _deliver(self, payload: str):
+        try:
+            msg = json.loads(payload)
+        except ValueError:
+            return
+        if msg.get("o") == self.worker_id:
+            return
+        try:
+            await self._handler(msg["k"], msg["r"], msg["d"], msg["o"])
+        except Exception:
+            logger.exception("bus.handler_failed kind=%s room=%s", msg.get("k"), msg.get("r"))
@@ -0,0 +1,219 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable
+
+from sqlalchemy import bindparam, insert, or_, select, update
+from sqlalchemy.exc import OperationalError
+
+from ..core.config import settings
+from ..db.session import SessionLocal
+from ..models import CallLog, HubWorker
+
+logger = logging.getLogger(__name__)
+
+
+def _duration(joined_at: datetime, left_at: datetime) -> int:
+    if joined_at.tzinfo is None:
+        joined_at = joined_at.replace(tzinfo=timezone.utc)
+    return max(0, int((left_at - joined_at).total_seconds()))
+
+
+class CallLogWriter:
+    """Buffers call-log opens and closes and writes them in batches.
+
+    Log ids and join times are assigned in memory, so connect/disconnect only
+    append to a buffer; a background task flushes it in a worker thread with
+    one bulk INSERT and one bulk UPDATE per batch. Every log carries the id
+    of the worker that writes it, so sweeps only ever close the logs of
+    workers that are gone. Closing is an UPDATE by primary key that always
+    wins, so a log swept while its worker was merely unreachable still ends
+    up with the real leave time.
+    """
+
+    def __init__(self, worker_id: str):
+        self.worker_id = worker_id
+        # conn_id -> (log_id, joined_at) for logs opened on this worker
+        self.open_logs: Dict[str, tuple[uuid.UUID, datetime]] = {}
+        self._inserts: Dict[uuid.UUID, dict] = {}
+        self._closes: Dict[uuid.UUID, dict] = {}
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+    async def start(self):
+        if settings.calllog_sweep_on_startup:
+            await asyncio.to_thread(sweep_open_logs)
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Close every log still open on this worker and flush everything."""
+        self.close_all()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def open(self, conn_id: str, room_id, user_id) -> uuid.UUID:
+        log_id = uuid.uuid4()
+        joined_at = datetime.now(timezone.utc)
+        self.open_logs[conn_id] = (log_id, joined_at)
+        self._inserts[log_id] = {
+            "id": log_id, "room_id": uuid.UUID(str(room_id)), "user_id": uuid.UUID(str(user_id)), "joined_at": joined_at,
+            "worker_id": self.worker_id,
+        }
+        self._kick()
+        return log_id
+
+    def adopt(self, conn_id: str, log_id: uuid.UUID, joined_at: datetime):
+        """Continue a log opened on another worker (session resume); the row
+        changes owner with take_over."""
+        self.open_logs[conn_id] = (log_id, joined_at)
+
+    def release(self, conn_id: str) -> tuple[uuid.UUID, datetime] | None:
+        """Stop tracking a log without closing it; its session may have moved to another worker."""
+        return self.open_logs.pop(conn_id, None)
+
+    def close(self, conn_id: str, left_at: datetime | None = None):
+        entry = self.open_logs.pop(conn_id, None)
+        if entry is None:
+            return
+        log_id, joined_at = entry
+        left_at = left_at or datetime.now(timezone.utc)
+        values = {"left_at": left_at, "duration_seconds": _duration(joined_at, left_at)}
+        if log_id in self._inserts:
+            # never written yet: insert it closed
+            self._inserts[log_id].update(values)
+        else:
+            # joined_at is part of the key and lets the UPDATE hit one partition
+            self._closes[log_id] = {"id": log_id, "joined_at": joined_at, **values}
+        self._kick()
+
+    def close_all(self):
+        now = datetime.now(timezone.utc)
+        for conn_id in list(self.open_logs):
+            self.close(conn_id, now)
+
+    def _kick(self):
+        if self._wakeup is not None and len(self._inserts) + len(self._closes) >= settings.calllog_batch_size:
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.calllog_flush_interval_ms / 1000)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        if not self._inserts and not self._closes:
+            return
+        inserts, self._inserts = list(self._inserts.values()), {}
+        closes, self._closes = list(self._closes.values()), {}
+        try:
+            await asyncio.to_thread(_write, inserts, closes)
+        except OperationalError:
+            # database unreachable: keep everything for the next round
+            logger.exception("calllog.flush_failed inserts=%s closes=%s", len(inserts), len(closes))
+            for row in inserts:
+                # a close that arrived meanwhile must land on the insert
+                row.update(self._closes.pop(row["id"], {}))
+                self._inserts.setdefault(row["id"], row)
+            for row in closes:
+                self._closes.setdefault(row["id"], row)
+
+
+def _write(inserts: list[dict], closes: list[dict]):
+    db = SessionLocal()
+    try:
+        try:
+            if inserts:
+                db.execute(insert(CallLog), inserts)
+            if closes:
+                db.execute(update(CallLog), closes)
+            db.commit()
+            return
+        except OperationalError:
+            raise
+        except Exception:
+            db.rollback()
+        # a bad row (room deleted mid-call) fails the batch; retry one by one and drop the offenders
+        for stmt, row in [(insert(CallLog), r) for r in inserts] + [(update(CallLog), r) for r in closes]:
+            try:
+                db.execute(stmt, [row])
+                db.commit()
+            except OperationalError:
+                raise
+            except Exception:
+                db.rollback()
+                logger.warning("calllog.row_dropped id=%s", row["id"], exc_info=True)
+    finally:
+        db.close()
+
+
+def take_over(db, log_id: uuid.UUID, joined_at: datetime, worker_id: str):
+    """Make `worker_id` the owner of a log, in the caller's transaction.
+
+    Reopens it as well: the previous worker closes it when the old socket
+    went away before the client resumed.
+    """
+    db.execute(
+        update(CallLog.__table__)
+        .where(CallLog.id == log_id, CallLog.joined_at == joined_at)
+        .values(worker_id=worker_id, left_at=None, duration_seconds=None)
+    )
+
+
+def sweep_open_logs(owners: Iterable[str] | None = None, batch_size: int = 1000) -> int:
+    """Close logs left open by workers that died, in batches.
+
+    With `owners`, the open logs of those workers. Without, every open log
+    whose worker is not alive in hub_workers, including logs written before
+    logs had owners. A log that changed owner meanwhile is left alone.
+    """
+    now = datetime.now(timezone.utc)
+    if owners is not None:
+        owned = CallLog.worker_id.in_(list(owners))
+    else:
+        live = select(HubWorker.worker_id).where(HubWorker.last_seen >= now - timedelta(seconds=settings.worker_ttl_s))
+        owned = or_(CallLog.worker_id.is_(None), CallLog.worker_id.not_in(live))
+    table = CallLog.__table__
+    close = (
+        update(table)
+        .where(
+            table.c.id == bindparam("log_id"),
+            table.c.joined_at == bindparam("log_joined_at"),
+            table.c.left_at.is_(None),
+            or_(table.c.worker_id.is_(None), table.c.worker_id == bindparam("owner")),
+        )
+        .values(left_at=now, duration_seconds=bindparam("duration"))
+    )
+    closed = 0
+    db = SessionLocal()
+    try:
+        while True:
+            rows = db.execute(
+                select(CallLog.id, CallLog.joined_at, CallLog.worker_id)
+                .where(CallLog.left_at.is_(None), CallLog.joined_at < now, owned)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            db.execute(close, [
+                {"log_id": r.id, "log_joined_at": r.joined_at, "owner": r.worker_id, "duration": _duration(r.joined_at, now)}
+                for r in rows
+            ])
+            db.commit()
+            closed += len(rows)
+    finally:
+        db.close()
+    if closed:
+        logger.info("calllog.swept count=%s owners=%s", closed, sorted(owners) if owners is not None else "dead")
+    return closed
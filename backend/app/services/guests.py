@@ -0,0 +1,88 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, exists, select
+
+from ..core.config import settings
+from ..db.session import SessionLocal
+from ..models import CallLog, KeyBundle, Message, Participant, Room, UsageDaily, User
+
+logger = logging.getLogger(__name__)
+
+# anything that would lose data (or an owner) if the user row went away
+REFERENCES = [
+    Participant.user_id,
+    Message.user_id,
+    CallLog.user_id,
+    KeyBundle.user_id,
+    UsageDaily.user_id,
+    Room.owner_id,
+]
+
+
+def gc_anonymous_users(batch_size: int | None = None) -> int:
+    """Delete guest rows nothing references any more, in batches.
+
+    Guests are users without email or password. Only rows older than the
+    access-token lifetime are considered, so the token that wrote a row has
+    normally expired; a guest still holding a valid one simply gets the row
+    written again by ensure_user. Returns the number of rows deleted.
+    """
+    batch_size = batch_size or settings.anon_gc_batch_size
+    # created_at is written with datetime.utcnow
+    cutoff = datetime.utcnow() - timedelta(minutes=settings.access_token_expire_minutes)
+    orphaned = select(User.id).where(
+        User.email.is_(None),
+        User.password_hash.is_(None),
+        User.created_at < cutoff,
+        *[~exists().where(col == User.id) for col in REFERENCES],
+    )
+    deleted = 0
+    db = SessionLocal()
+    try:
+        while True:
+            ids = db.execute(orphaned.limit(batch_size).with_for_update(skip_locked=True)).scalars().all()
+            if not ids:
+                break
+            db.execute(delete(User).where(User.id.in_(ids)))
+            db.commit()
+            deleted += len(ids)
+            if len(ids) < batch_size:
+                break
+    finally:
+        db.close()
+    if deleted:
+        logger.info("guests.gc_deleted count=%s", deleted)
+    return deleted
+
+
+class GuestCleanup:
+    """Runs gc_anonymous_users periodically."""
+
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+
+    async def start(self):
+        if settings.anon_gc_enabled:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(settings.anon_gc_interval_s)
+            try:
+                await asyncio.to_thread(gc_anonymous_users)
+            except Exception:
+                logger.exception("guests.gc_failed")
+
+
+guest_cleanup = GuestCleanup()
@@ -0,0 +1,66 @@
+import threading
+import time
+from collections import OrderedDict
+
+from ..core.config import settings
+
+
+class InviteCache:
+    """Invite code -> room summary, with short-lived entries for unknown codes.
+
+    Read from threadpool endpoints, so every access takes the lock. Entries
+    are evicted LRU once `max_size` is reached; hot codes stay because hits
+    move them to the end. `generation()` guards against a lookup that raced
+    with an invalidation writing back a stale row.
+    """
+
+    def __init__(self, ttl: float, negative_ttl: float, max_size: int):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self._items: OrderedDict[str, tuple[float, dict | None]] = OrderedDict()
+        self._gen = 0
+        self._lock = threading.Lock()
+
+    def generation(self) -> int:
+        return self._gen
+
+    def get(self, code: str) -> tuple[bool, dict | None]:
+        """Return (hit, room); room is None for a cached miss."""
+        now = time.monotonic()
+        with self._lock:
+            item = self._items.get(code)
+            if item is None:
+                return False, None
+            expires, room = item
+            if expires <= now:
+                del self._items[code]
+                return False, None
+            self._items.move_to_end(code)
+            return True, room
+
+    def put(self, code: str, room: dict | None, generation: int):
+        ttl = self.ttl if room is not None else self.negative_ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            if generation != self._gen:
+                return
+            self._items[code] = (time.monotonic() + ttl, room)
+            self._items.move_to_end(code)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def invalidate(self, *codes: str):
+        with self._lock:
+            self._gen += 1
+            for code in codes:
+                self._items.pop(code, None)
+
+
+_ttl = settings.invite_cache_ttl_s if settings.hub_bus_enabled else settings.invite_cache_local_ttl_s
+invite_cache = InviteCache(
+    _ttl,
+    min(settings.invite_cache_negative_ttl_s, _ttl),
+    settings.invite_cache_max_size,
+)
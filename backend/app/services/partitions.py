@@ -0,0 +1,152 @@
+import asyncio
+import logging
+import re
+from datetime import date, datetime, time, timedelta, timezone
+
+from sqlalchemy import text
+
+from ..core.config import settings
+from ..db.session import SessionLocal
+from ..models import RollupState
+from .analytics import ROLLUP_NAME
+
+logger = logging.getLogger(__name__)
+
+# partitioned table -> partition key; both are RANGE partitioned by calendar month (UTC)
+PARTITIONED = {"messages": "created_at", "call_logs": "joined_at"}
+RETENTION = {"messages": "messages_retention_days", "call_logs": "call_logs_retention_days"}
+# pg advisory lock id, so workers don't run partition DDL concurrently
+LOCK_KEY = 0x68727074
+NAME_RE = re.compile(r"_p(\d{4})_(\d{2})$")
+
+
+def month_start(dt: datetime | date) -> date:
+    return date(dt.year, dt.month, 1)
+
+
+def add_months(month: date, n: int) -> date:
+    m = month.month - 1 + n
+    return date(month.year + m // 12, m % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month:%Y_%m}"
+
+
+def is_partitioned(db, table: str) -> bool:
+    return db.execute(text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:t)"), {"t": table}).scalar() == "p"
+
+
+def list_partitions(db, table: str) -> dict[date, str]:
+    """Month -> partition name, for partitions that follow our naming."""
+    names = db.execute(
+        text("SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = to_regclass(:t)"),
+        {"t": table},
+    ).scalars()
+    out = {}
+    for name in names:
+        m = NAME_RE.search(name)
+        if m:
+            month = date(int(m[1]), int(m[2]), 1)
+            if name == partition_name(table, month):
+                out[month] = name
+    return out
+
+
+def create_partition(db, table: str, month: date):
+    # names and bounds are generated here, never user input
+    db.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {partition_name(table, month)} PARTITION OF {table} "
+        f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') TO ('{add_months(month, 1).isoformat()} 00:00:00+00')"
+    ))
+
+
+def rolled_up(db, name: str) -> bool:
+    """Whether every call in a call_logs partition is closed and counted in usage_daily."""
+    if not settings.analytics_rollup_enabled:
+        return True
+    state = db.get(RollupState, ROLLUP_NAME)
+    if state is None or state.last_left_at is None:
+        return db.execute(text(f"SELECT 1 FROM {name} LIMIT 1")).first() is None
+    pending = db.execute(
+        text(f"SELECT 1 FROM {name} WHERE left_at IS NULL OR (left_at, id) > (:left_at, :id) LIMIT 1"),
+        {"left_at": state.last_left_at, "id": state.last_id},
+    ).first()
+    return pending is None
+
+
+def maintain_once(now: datetime | None = None, drop: bool = True) -> tuple[int, int]:
+    """Create the current and upcoming monthly partitions, then drop expired ones.
+
+    A partition is dropped once its whole month is older than the table's
+    retention; call_logs partitions also wait until the analytics rollup
+    has counted them. Tables that haven't been migrated to partitioning yet
+    are left alone. Returns (created, dropped).
+    """
+    now = now or datetime.now(timezone.utc)
+    created = dropped = 0
+    db = SessionLocal()
+    try:
+        if db.get_bind().dialect.name != "postgresql":
+            return 0, 0
+        db.execute(text("SELECT pg_advisory_xact_lock(:k)"), {"k": LOCK_KEY})
+        # DDL on the parent queues behind running queries and blocks new ones; give up instead
+        db.execute(text("SET LOCAL lock_timeout = '5s'"))
+        for table in PARTITIONED:
+            if not is_partitioned(db, table):
+                continue
+            existing = list_partitions(db, table)
+            for i in range(settings.partition_premake_months + 1):
+                month = add_months(month_start(now), i)
+                if month not in existing:
+                    create_partition(db, table, month)
+                    created += 1
+
+            days = getattr(settings, RETENTION[table])
+            if not drop or days <= 0:
+                continue
+            cutoff = now - timedelta(days=days)
+            for month, name in sorted(existing.items()):
+                if datetime.combine(add_months(month, 1), time.min, tzinfo=timezone.utc) > cutoff:
+                    break
+                if table == "call_logs" and not rolled_up(db, name):
+                    logger.info("partitions.drop_deferred partition=%s", name)
+                    continue
+                db.execute(text(f"DROP TABLE {name}"))
+                dropped += 1
+        db.commit()
+        return created, dropped
+    finally:
+        db.close()
+
+
+class PartitionMaintenance:
+    """Runs maintain_once periodically."""
+
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(settings.partition_maintenance_interval_s)
+            try:
+                created, dropped = await asyncio.to_thread(maintain_once)
+                if created or dropped:
+                    logger.info("partitions.maintained created=%s dropped=%s", created, dropped)
+            except Exception:
+                logger.exception("partitions.maintenance_failed")
+
+
+partition_maintenance = PartitionMaintenance()
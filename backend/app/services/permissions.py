@@ -0,0 +1,102 @@
+import threading
+import time
+import uuid
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..models import Participant
+from .roster import role_value
+
+
+def _key(room_id, user_id) -> tuple[str, str] | None:
+    # path params arrive as strings in any case; normalize so write-through hits the same entry
+    try:
+        return str(uuid.UUID(str(room_id))), str(uuid.UUID(str(user_id)))
+    except ValueError:
+        return None
+
+
+class RoleCache:
+    """(room, user) -> role for members, kept current by the code that changes roles.
+
+    Only members are cached, so a join never has to invalidate anything.
+    Promote/demote/kick write through on the worker that handles them and
+    on the others via the hub; the TTL bounds staleness if a relay is lost,
+    and is all there is when the hub bus is off.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._items: dict[tuple[str, str], tuple[float, str]] = {}
+        self._gen = 0
+        self._lock = threading.Lock()
+
+    def generation(self) -> int:
+        return self._gen
+
+    def get(self, room_id, user_id) -> str | None:
+        key = _key(room_id, user_id)
+        item = self._items.get(key) if key else None
+        if item is None or item[0] <= time.monotonic():
+            return None
+        return item[1]
+
+    def put(self, room_id, user_id, role, generation: int | None = None):
+        key = _key(room_id, user_id)
+        if key is None:
+            return
+        with self._lock:
+            if generation is not None and generation != self._gen:
+                return
+            self._items[key] = (time.monotonic() + self.ttl, role_value(role))
+
+    def set_roles(self, room_id, user_ids, role):
+        with self._lock:
+            self._gen += 1
+        for uid in user_ids:
+            self.put(room_id, uid, role)
+
+    def forget(self, room_id, user_ids):
+        with self._lock:
+            self._gen += 1
+            for uid in user_ids:
+                key = _key(room_id, uid)
+                if key:
+                    self._items.pop(key, None)
+
+    def drop_room(self, room_id):
+        key = _key(room_id, room_id)
+        if key is None:
+            return
+        with self._lock:
+            self._gen += 1
+            for k in [k for k in self._items if k[0] == key[0]]:
+                del self._items[k]
+
+
+role_cache = RoleCache(settings.role_cache_ttl_s if settings.hub_bus_enabled else settings.role_cache_local_ttl_s)
+
+
+def get_role(db: Session, room_id, user_id) -> str | None:
+    role = role_cache.get(room_id, user_id)
+    if role is not None:
+        return role
+    if _key(room_id, user_id) is None:
+        return None
+    gen = role_cache.generation()
+    row = db.query(Participant.role).filter(Participant.room_id == room_id, Participant.user_id == user_id).first()
+    if row is None:
+        return None
+    role_cache.put(room_id, user_id, row.role, gen)
+    return role_value(row.role)
+
+
+def require_role(db: Session, room_id, user_id, allowed=("host", "moderator")) -> str:
+    role = get_role(db, room_id, user_id)
+    if role is None:
+        raise HTTPException(status_code=403, detail="Not in room")
+    if role not in allowed:
+        raise HTTPException(status_code=403, detail="Insufficient role")
+    return role
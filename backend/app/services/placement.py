@@ -0,0 +1,168 @@
+import asyncio
+import bisect
+import hashlib
+import logging
+import socket
+import uuid
+from datetime import timedelta
+from typing import Awaitable, Callable
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert
+
+from ..core.config import settings
+from ..db.session import SessionLocal
+from ..models import HubNode
+
+logger = logging.getLogger(__name__)
+
+# rows of nodes gone for longer than this are deleted
+FORGET_AFTER = timedelta(hours=1)
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def _room_key(room_id) -> str:
+    # the same room must hash the same whether it came from a path or a UUID column
+    try:
+        return str(uuid.UUID(str(room_id)))
+    except ValueError:
+        return str(room_id)
+
+
+class HashRing:
+    """Consistent hash ring with virtual nodes.
+
+    A node joining or leaving only moves the rooms next to its points,
+    about 1/N of them, instead of reshuffling every room.
+    """
+
+    def __init__(self, nodes=(), vnodes: int = 160):
+        self.nodes = frozenset(nodes)
+        points = sorted((_hash(f"{node}#{i}"), node) for node in self.nodes for i in range(vnodes))
+        self._keys = [p[0] for p in points]
+        self._owners = [p[1] for p in points]
+
+    def owner(self, key: str) -> str | None:
+        if not self._keys:
+            return None
+        i = bisect.bisect(self._keys, _hash(key)) % len(self._keys)
+        return self._owners[i]
+
+
+class Placement:
+    """Which node serves a room.
+
+    Disabled unless PLACEMENT_ENABLED is set; every room is then local. When
+    enabled the node heartbeats into hub_nodes and rebuilds the ring from
+    the nodes seen within NODE_TTL_S that are not draining. After every
+    heartbeat `rebalance` runs so the hub can move rooms it does not own.
+    """
+
+    def __init__(self):
+        self.node_id = settings.node_id or socket.gethostname()
+        self.enabled = False
+        # node id -> public ws base url, for the nodes in the ring
+        self.urls: dict[str, str] = {}
+        self.ring = HashRing()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def own_url(self) -> str:
+        return settings.node_ws_url or settings.ws_base_url
+
+    async def start(self, draining: Callable[[], bool], rebalance: Callable[[], Awaitable[None]]):
+        if not settings.placement_enabled:
+            return
+        self.enabled = True
+        await asyncio.to_thread(self.heartbeat, False)
+        self._task = asyncio.create_task(self._run(draining, rebalance))
+        logger.info("placement.started node=%s nodes=%s", self.node_id, sorted(self.ring.nodes))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.enabled:
+            # leave the ring now rather than after NODE_TTL_S
+            try:
+                await asyncio.to_thread(self.leave)
+            except Exception:
+                logger.exception("placement.leave_failed")
+            self.enabled = False
+
+    async def mark_draining(self):
+        """Take this node out of the ring right away, e.g. when a drain starts."""
+        if self.enabled:
+            await asyncio.to_thread(self.heartbeat, True)
+
+    async def _run(self, draining: Callable[[], bool], rebalance: Callable[[], Awaitable[None]]):
+        while True:
+            await asyncio.sleep(settings.node_heartbeat_s)
+            try:
+                await asyncio.to_thread(self.heartbeat, draining())
+            except Exception:
+                logger.exception("placement.heartbeat_failed")
+                continue
+            # every tick, not only on ring changes: a socket that reached the wrong node moves too
+            try:
+                await rebalance()
+            except Exception:
+                logger.exception("placement.rebalance_failed")
+
+    def heartbeat(self, draining: bool) -> bool:
+        """Refresh this node's row and the ring. Returns True if the ring changed."""
+        db = SessionLocal()
+        try:
+            # the database clock, so skew between nodes doesn't matter
+            values = {"ws_url": self.own_url, "last_seen": func.now(), "draining": draining}
+            db.execute(
+                insert(HubNode)
+                .values(node_id=self.node_id, **values)
+                .on_conflict_do_update(index_elements=[HubNode.node_id], set_=values)
+            )
+            db.execute(delete(HubNode).where(HubNode.last_seen < func.now() - FORGET_AFTER))
+            rows = db.execute(
+                select(HubNode.node_id, HubNode.ws_url).where(
+                    HubNode.last_seen >= func.now() - timedelta(seconds=settings.node_ttl_s),
+                    HubNode.draining.is_(False),
+                )
+            ).all()
+            db.commit()
+        finally:
+            db.close()
+        self.urls = {r.node_id: r.ws_url for r in rows}
+        if self.ring.nodes == set(self.urls):
+            return False
+        self.ring = HashRing(self.urls, settings.placement_vnodes)
+        logger.info("placement.ring_changed nodes=%s", sorted(self.ring.nodes))
+        return True
+
+    def leave(self):
+        db = SessionLocal()
+        try:
+            db.execute(delete(HubNode).where(HubNode.node_id == self.node_id))
+            db.commit()
+        finally:
+            db.close()
+
+    def owner(self, room_id) -> str | None:
+        if not self.enabled:
+            return None
+        return self.ring.owner(_room_key(room_id))
+
+    def is_local(self, room_id) -> bool:
+        owner = self.owner(room_id)
+        return owner is None or owner == self.node_id
+
+    def ws_url(self, room_id) -> str:
+        """The room's WebSocket URL on its owner (this node when there is none)."""
+        owner = self.owner(room_id)
+        base = self.urls.get(owner) if owner else None
+        return f"{(base or self.own_url).rstrip('/')}/ws/{room_id}"
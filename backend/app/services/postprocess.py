@@ -0,0 +1,206 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import av
+
+from ..core.config import settings
+from ..lib.s3 import get_s3_client, s3_configured, upload_fileobj
+
+logger = logging.getLogger(__name__)
+
+# codecs fMP4 carries as they are; anything else is re-encoded
+COPY_CODECS = {"h264", "hevc", "aac", "mp3", "opus"}
+CONTENT_TYPES = {
+    ".mkv": "video/x-matroska",
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".mp4": "video/mp4",
+    ".m4s": "video/iso.segment",
+    ".jpg": "image/jpeg",
+}
+THUMBNAIL_WIDTH = 320
+
+
+def probe_duration(source: str) -> float | None:
+    with av.open(source) as inp:
+        if inp.duration is not None:
+            return inp.duration / av.time_base
+        durations = [float(s.duration * s.time_base) for s in inp.streams if s.duration is not None]
+    return max(durations) if durations else None
+
+
+def _media_streams(inp) -> list:
+    # one video and one audio track is what a player expects from an HLS rendition
+    return inp.streams.video[:1] + inp.streams.audio[:1]
+
+
+def remux_hls(source: str, out_dir: str) -> str:
+    """Write a VOD playlist with fMP4 segments; returns the playlist path.
+
+    Streams are copied packet by packet when the codec fits in MP4 (what
+    the recorder writes: H.264 + AAC), otherwise decoded and re-encoded.
+    Segments are cut on keyframes, so with copied video their length
+    follows the source's GOP rather than RECORDING_HLS_SEGMENT_S exactly.
+    """
+    playlist = os.path.join(out_dir, "index.m3u8")
+    with av.open(source) as inp:
+        streams = _media_streams(inp)
+        if not streams:
+            raise ValueError("no audio or video streams")
+        with av.open(playlist, "w", format="hls", options={
+            "hls_time": str(settings.recording_hls_segment_s),
+            "hls_playlist_type": "vod",
+            "hls_segment_type": "fmp4",
+            "hls_fmp4_init_filename": "init.mp4",
+            "hls_segment_filename": os.path.join(out_dir, "seg_%05d.m4s"),
+        }) as out:
+            copied, encoders = {}, {}
+            for s in streams:
+                if s.codec_context.name in COPY_CODECS:
+                    copied[s.index] = out.add_stream(template=s)
+                elif s.type == "video":
+                    enc = encoders[s.index] = out.add_stream("libx264", rate=s.average_rate or 30)
+                    enc.width, enc.height, enc.pix_fmt = s.codec_context.width, s.codec_context.height, "yuv420p"
+                else:
+                    encoders[s.index] = out.add_stream("aac", rate=s.codec_context.sample_rate or 48000)
+            for packet in inp.demux(streams):
+                idx = packet.stream.index
+                if idx in copied:
+                    # the flush packet at the end of each stream has no timestamps
+                    if packet.dts is None:
+                        continue
+                    packet.stream = copied[idx]
+                    out.mux(packet)
+                else:
+                    for frame in packet.decode():
+                        out.mux(encoders[idx].encode(frame))
+            for enc in encoders.values():
+                out.mux(enc.encode(None))
+    return playlist
+
+
+def make_thumbnail(source: str, path: str, at: float = 1.0) -> bool:
+    """JPEG of the first video frame at or after `at` seconds (or the last one before the end)."""
+    with av.open(source) as inp:
+        if not inp.streams.video:
+            return False
+        frame = None
+        for frame in inp.decode(inp.streams.video[0]):
+            if frame.time is not None and frame.time >= at:
+                break
+        if frame is None:
+            return False
+        height = max(2, round(frame.height * THUMBNAIL_WIDTH / frame.width / 2) * 2)
+        with av.open(path, "w", format="image2") as out:
+            enc = out.add_stream("mjpeg")
+            enc.width, enc.height, enc.pix_fmt = THUMBNAIL_WIDTH, height, "yuvj420p"
+            out.mux(enc.encode(frame.reformat(width=THUMBNAIL_WIDTH, height=height, format="yuvj420p")))
+            out.mux(enc.encode(None))
+    return True
+
+
+def upload_all(files: list[tuple[str, str]]) -> tuple[dict[str, str], int]:
+    """Upload (path, key) pairs concurrently; returns {key: url} and the bytes sent."""
+    client = get_s3_client()
+
+    def put(item):
+        path, key = item
+        with open(path, "rb") as f:
+            return key, upload_fileobj(f, key, CONTENT_TYPES.get(os.path.splitext(path)[1], "application/octet-stream"), client=client)
+
+    with ThreadPoolExecutor(max_workers=settings.recording_upload_concurrency) as pool:
+        urls = dict(pool.map(put, files))
+    return urls, sum(os.path.getsize(path) for path, _ in files)
+
+
+def process_recording(source: str, prefix: str) -> dict:
+    """Post-process one finished recording. Runs in a pool process.
+
+    Everything lands under `prefix`: the source as source.mkv, the HLS
+    rendition under hls/ and thumb.jpg. A failed remux or thumbnail only
+    drops that output; the source is uploaded regardless.
+    """
+    result = {
+        "duration_seconds": None, "source_key": None, "source_url": None,
+        "manifest_key": None, "manifest_url": None, "thumbnail_url": None,
+        "process_seconds": 0.0, "upload_seconds": 0.0, "upload_bytes": 0,
+    }
+    workdir = tempfile.mkdtemp(prefix="recording_")
+    try:
+        t0 = time.perf_counter()
+        files = [(source, f"{prefix}/source.mkv")]
+        manifest_key = None
+        try:
+            duration = probe_duration(source)
+            result["duration_seconds"] = round(duration) if duration is not None else None
+        except Exception:
+            logger.exception("postprocess.probe_failed source=%s", source)
+        if settings.recording_hls_enabled:
+            hls_dir = os.path.join(workdir, "hls")
+            os.makedirs(hls_dir)
+            try:
+                remux_hls(source, hls_dir)
+                files += [(os.path.join(hls_dir, name), f"{prefix}/hls/{name}") for name in sorted(os.listdir(hls_dir))]
+                manifest_key = f"{prefix}/hls/index.m3u8"
+            except Exception:
+                logger.exception("postprocess.hls_failed source=%s", source)
+            thumb = os.path.join(workdir, "thumb.jpg")
+            try:
+                if make_thumbnail(source, thumb):
+                    files.append((thumb, f"{prefix}/thumb.jpg"))
+            except Exception:
+                logger.exception("postprocess.thumbnail_failed source=%s", source)
+        result["process_seconds"] = time.perf_counter() - t0
+        if not s3_configured():
+            logger.warning("postprocess.s3_not_configured source=%s", source)
+            return result
+        t0 = time.perf_counter()
+        try:
+            urls, result["upload_bytes"] = upload_all(files)
+        except Exception:
+            logger.exception("postprocess.upload_failed source=%s", source)
+            return result
+        result["upload_seconds"] = time.perf_counter() - t0
+        result["source_key"] = f"{prefix}/source.mkv"
+        result["source_url"] = urls[result["source_key"]]
+        if manifest_key:
+            result["manifest_key"] = manifest_key
+            result["manifest_url"] = urls[manifest_key]
+        result["thumbnail_url"] = urls.get(f"{prefix}/thumb.jpg")
+        return result
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+class PostProcessor:
+    """Bounded process pool for recording post-processing.
+
+    Remuxing and JPEG encoding hold the GIL, so they run in separate
+    processes and the API worker's event loop only awaits the result.
+    Started lazily; uses spawn since forking a process with running
+    threads and an event loop is unsafe.
+    """
+
+    def __init__(self):
+        self._pool: ProcessPoolExecutor | None = None
+
+    async def run(self, source: str, prefix: str) -> dict:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=settings.recording_postprocess_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return await asyncio.get_running_loop().run_in_executor(self._pool, process_recording, source, prefix)
+
+    async def stop(self):
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            await asyncio.to_thread(pool.shutdown, wait=True, cancel_futures=True)
+
+
+postprocessor = PostProcessor()
@@ -0,0 +1,139 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, exists, select, text, tuple_, update
+
+from ..core.config import settings
+from ..db.session import SessionLocal, engine
+from ..lib.metrics import ROOM_PURGE_OBJECTS, ROOM_PURGE_ROWS
+from ..lib.s3 import delete_prefix, s3_configured
+from ..models import CallLog, KeyBundle, Message, Participant, Recording, Room, RoomDailyPeak, UsageDaily
+
+logger = logging.getLogger(__name__)
+
+# everything that hangs off a room, purged in this order before the room row
+CHILDREN = [Recording, KeyBundle, Participant, Message, CallLog, UsageDaily, RoomDailyPeak]
+
+
+def recordings_prefix(room_id) -> str:
+    # every object a recording writes lives under it, see routers/recordings.py
+    return f"recordings/{room_id}/"
+
+
+def _lock_key(room_id: uuid.UUID) -> int:
+    return int.from_bytes(room_id.bytes[:8], "big", signed=True)
+
+
+def remaining(db, room_id) -> list[str]:
+    """Child tables that still hold rows of the room."""
+    return [m.__tablename__ for m in CHILDREN if db.query(exists().where(m.room_id == room_id)).scalar()]
+
+
+def _purge_table(db, room_id, model, batch_size: int) -> int:
+    pk = list(model.__table__.primary_key.columns)
+    total = 0
+    while True:
+        # one statement per batch: the subquery picks the rows through the room_id index
+        batch = select(*pk).where(model.room_id == room_id).limit(batch_size)
+        n = db.execute(delete(model).where(tuple_(*pk).in_(batch))).rowcount
+        if n:
+            db.execute(update(Room).where(Room.id == room_id).values(purged_rows=Room.purged_rows + n))
+        db.commit()
+        total += n
+        ROOM_PURGE_ROWS.labels(model.__tablename__).inc(n)
+        if n < batch_size:
+            return total
+
+
+def purge_room(db, room_id: uuid.UUID, batch_size: int) -> dict[str, int]:
+    """Delete one soft-deleted room: S3 objects first, then child rows in batches, then the room.
+
+    Every batch commits on its own, so nothing holds locks on the big
+    tables for long and an interrupted purge resumes where it stopped.
+    Messages and call_logs are partitioned by month, not by room, so
+    their rows are deleted like any other table's.
+    """
+    counts = {}
+    if s3_configured():
+        counts["s3_objects"] = delete_prefix(recordings_prefix(room_id))
+        ROOM_PURGE_OBJECTS.inc(counts["s3_objects"])
+    for model in CHILDREN:
+        counts[model.__tablename__] = _purge_table(db, room_id, model, batch_size)
+        logger.info("purge.progress room_id=%s table=%s rows=%s", room_id, model.__tablename__, counts[model.__tablename__])
+    db.execute(delete(Room).where(Room.id == room_id, Room.deleted_at.is_not(None)))
+    db.commit()
+    return counts
+
+
+def purge_deleted_rooms(batch_size: int | None = None) -> int:
+    """Purge rooms deleted longer ago than ROOM_PURGE_GRACE_S. Returns the number purged.
+
+    A session advisory lock per room keeps two workers off the same room.
+    The session is bound to one connection for the whole run, so the lock
+    is held by the connection that runs every batch and is released on it;
+    it goes away with the connection if the worker dies.
+    """
+    batch_size = batch_size or settings.room_purge_batch_size
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=settings.room_purge_grace_s)
+    purged = 0
+    with engine.connect() as conn:
+        db = SessionLocal(bind=conn)
+        try:
+            locking = conn.dialect.name == "postgresql"
+            ids = db.execute(
+                select(Room.id).where(Room.deleted_at.is_not(None), Room.deleted_at < cutoff).order_by(Room.deleted_at).limit(100)
+            ).scalars().all()
+            db.commit()
+            for room_id in ids:
+                key = _lock_key(room_id)
+                if locking and not db.execute(text("SELECT pg_try_advisory_lock(:k)"), {"k": key}).scalar():
+                    db.commit()
+                    continue
+                try:
+                    counts = purge_room(db, room_id, batch_size)
+                    purged += 1
+                    logger.info("purge.room_done room_id=%s counts=%s", room_id, counts)
+                except Exception:
+                    db.rollback()
+                    logger.exception("purge.room_failed room_id=%s", room_id)
+                finally:
+                    if locking:
+                        released = db.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": key}).scalar()
+                        db.commit()
+                        if not released:
+                            logger.warning("purge.unlock_failed room_id=%s", room_id)
+        finally:
+            db.close()
+    return purged
+
+
+class RoomPurge:
+    """Runs purge_deleted_rooms periodically."""
+
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(settings.room_purge_interval_s)
+            try:
+                await asyncio.to_thread(purge_deleted_rooms)
+            except Exception:
+                logger.exception("purge.failed")
+
+
+room_purge = RoomPurge()
@@ -0,0 +1,45 @@
+import time
+from typing import Dict
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "stamp")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.stamp = time.monotonic()
+
+    def take(self, now: float | None = None) -> bool:
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if self.tokens < 1.0:
+            return False
+        self.tokens -= 1.0
+        return True
+
+
+class FrameLimiter:
+    """Token buckets keyed by frame type, created on first use.
+
+    `limits` maps a frame type to (rate per second, burst). Types without an
+    entry are never limited. One limiter belongs to exactly one connection or
+    one room, so nothing is shared or locked across rooms.
+    """
+
+    __slots__ = ("limits", "buckets")
+
+    def __init__(self, limits: Dict[str, tuple[float, float]]):
+        self.limits = limits
+        self.buckets: Dict[str, TokenBucket] = {}
+
+    def allow(self, kind: str, now: float | None = None) -> bool:
+        b = self.buckets.get(kind)
+        if b is None:
+            spec = self.limits.get(kind)
+            if spec is None:
+                return True
+            b = self.buckets[kind] = TokenBucket(*spec)
+        return b.take(now)
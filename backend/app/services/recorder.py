@@ -2,6 +2,7 @@ import asyncio
 import json
 import os
 import tempfile
+import time
 from datetime import datetime
 from typing import Dict
 
@@ -10,23 +11,32 @@ from aiortc import RTCPeerConnection, RTCSessionDescription
 from aiortc.contrib.media import MediaRecorder
 
 from ..core.config import settings
+from ..lib.metrics import RECORDER_CPU, RECORDER_TRACKS
 
 
 class RoomRecorder:
-    def __init__(self, room_id: str, token: str):
+    def __init__(self, room_id: str, token: str, ws_url: str | None = None):
         self.room_id = room_id
         self.token = token
+        # the room's URL on the node that owns it; defaults to WS_BASE_URL
+        self.ws_url = ws_url or f"{settings.ws_base_url.rstrip('/')}/ws/{room_id}"
         self.ws = None  # type: aiohttp.ClientWebSocketResponse | None
         self.conn_id = None  # recorder's own conn id from welcome
+        # sfu rooms: subscribe to each publisher instead of meshing with peers
+        self.sfu = False
+        self.peers: set[str] = set()
         self.pcs: Dict[str, RTCPeerConnection] = {}
         self.recorders: Dict[str, MediaRecorder] = {}
         self.started_at: datetime | None = None
         self.output_path = os.path.join(tempfile.gettempdir(), f"recording_{room_id}_{int(datetime.utcnow().timestamp())}.mkv")
         self._stop = asyncio.Event()
+        self._tracks = 0
+        self._cpu_start = 0.0
 
     async def start(self):
         self.started_at = datetime.utcnow()
-        url = f"{settings.ws_base_url.rstrip('/')}/ws/{self.room_id}?token={self.token}"
+        self._cpu_start = time.process_time()
+        url = f"{self.ws_url}?token={self.token}"
         async with aiohttp.ClientSession() as session:
             async with session.ws_connect(url) as ws:
                 self.ws = ws
@@ -37,15 +47,37 @@ class RoomRecorder:
                         t = data.get("type")
                         if t == "welcome":
                             self.conn_id = data.get("conn_id")
+                            self.sfu = data.get("media_mode") == "sfu"
+                        elif t == "media_mode":
+                            # the room switched: drop every connection and start over in the new mode
+                            self.sfu = data.get("media_mode") == "sfu"
+                            for cid in list(self.pcs):
+                                await self.close_pc(cid)
+                            if not self.sfu:
+                                for cid in self.peers:
+                                    await self.make_offer(cid)
+                        elif t == "sfu.publishers":
+                            for p in data.get("items", []):
+                                await self.sfu_subscribe(p.get("conn_id"))
+                        elif t == "sfu.publisher":
+                            await self.sfu_subscribe(data.get("conn_id"))
+                        elif t == "sfu.offer":
+                            await self.sfu_answer(data.get("publisher"), data.get("sdp"))
+                        elif t == "sfu.unpublished":
+                            await self.close_pc(data.get("conn_id"))
                         elif t == "peers":
                             for p in data.get("items", []):
-                                await self.ensure_pc(p.get("conn_id"))
-                                await self.make_offer(p.get("conn_id"))
+                                self.peers.add(p.get("conn_id"))
+                                if not self.sfu:
+                                    await self.ensure_pc(p.get("conn_id"))
+                                    await self.make_offer(p.get("conn_id"))
                         elif t == "join":
                             if data.get("conn_id") and data.get("conn_id") != self.conn_id:
-                                await self.ensure_pc(data.get("conn_id"))
-                                await self.make_offer(data.get("conn_id"))
-                        elif t == "signal":
+                                self.peers.add(data.get("conn_id"))
+                                if not self.sfu:
+                                    await self.ensure_pc(data.get("conn_id"))
+                                    await self.make_offer(data.get("conn_id"))
+                        elif t == "signal" and not self.sfu:
                             to = data.get("to_conn")
                             # ignore messages we sent
                             if to and to != self.conn_id:
@@ -72,6 +104,7 @@ class RoomRecorder:
                                     pass
                         elif t == "leave":
                             cid = data.get("conn_id")
+                            self.peers.discard(cid)
                             await self.close_pc(cid)
                     if self._stop.is_set():
                         break
@@ -92,22 +125,14 @@ class RoomRecorder:
             except Exception:
                 pass
         self.recorders.clear()
+        RECORDER_TRACKS.dec(self._tracks)
+        self._tracks = 0
+        RECORDER_CPU.inc(max(0.0, time.process_time() - self._cpu_start))
 
     async def ensure_pc(self, remote_conn_id: str) -> RTCPeerConnection:
         if remote_conn_id in self.pcs:
             return self.pcs[remote_conn_id]
-        pc = RTCPeerConnection()
-        # media sink per peer to allow incremental add
-        recorder = MediaRecorder(self.output_path)
-        self.recorders[remote_conn_id] = recorder
-
-        @pc.on("track")
-        async def on_track(track):
-            try:
-                recorder.addTrack(track)
-                await recorder.start()
-            except Exception:
-                pass
+        pc = self._new_pc(remote_conn_id)
 
         @pc.on("icecandidate")
         async def on_ice(ev):
@@ -123,10 +148,56 @@ class RoomRecorder:
                 pc.createDataChannel('rec')
             except Exception:
                 pass
+        return pc
+
+    def _new_pc(self, remote_conn_id: str) -> RTCPeerConnection:
+        pc = RTCPeerConnection()
+        # media sink per peer to allow incremental add
+        recorder = MediaRecorder(self.output_path)
+        self.recorders[remote_conn_id] = recorder
+
+        @pc.on("track")
+        async def on_track(track):
+            try:
+                recorder.addTrack(track)
+                self._tracks += 1
+                RECORDER_TRACKS.inc()
+                await recorder.start()
+            except Exception:
+                pass
 
         self.pcs[remote_conn_id] = pc
         return pc
 
+    async def close_pc(self, remote_conn_id: str | None):
+        pc = self.pcs.pop(remote_conn_id, None)
+        rec = self.recorders.pop(remote_conn_id, None)
+        if rec is not None:
+            try:
+                await rec.stop()
+            except Exception:
+                pass
+        if pc is not None:
+            await pc.close()
+
+    async def sfu_subscribe(self, publisher: str | None):
+        if publisher and publisher != self.conn_id and self.ws:
+            await self.ws.send_str(json.dumps({"type": "sfu.subscribe", "publisher": publisher}))
+
+    async def sfu_answer(self, publisher: str | None, sdp: dict | None):
+        """Answer the SFU's offer for one publisher; the tracks land in the recording."""
+        if not publisher or not sdp or not self.ws:
+            return
+        # a new offer replaces the previous subscription to that publisher
+        await self.close_pc(publisher)
+        pc = self._new_pc(publisher)
+        await pc.setRemoteDescription(RTCSessionDescription(sdp["sdp"], sdp["type"]))
+        await pc.setLocalDescription(await pc.createAnswer())
+        await self.ws.send_str(json.dumps({"type": "sfu.answer", "publisher": publisher, "sdp": {
+            "type": pc.localDescription.type,
+            "sdp": pc.localDescription.sdp,
+        }}))
+
     async def make_offer(self, remote_conn_id: str):
         pc = await self.ensure_pc(remote_conn_id)
         # Ensure we request media even before any remote SDP arrives
@@ -0,0 +1,318 @@
+import json
+import time
+from typing import Dict, Iterable
+
+# participant flags clients may change through `state` frames
+MEDIA_FIELDS = ("mic_on", "cam_on", "screen_sharing", "is_speaking", "raised_hand")
+FLAG_FIELDS = MEDIA_FIELDS + ("muted_by_moderator",)
+# is_speaking flips several times a second and only matters while connected,
+# so it lives in the roster only
+PERSISTED_FIELDS = tuple(f for f in MEDIA_FIELDS if f != "is_speaking")
+
+_DEFAULTS = {
+    "mic_on": True,
+    "cam_on": True,
+    "screen_sharing": False,
+    "is_speaking": False,
+    "raised_hand": False,
+    "muted_by_moderator": False,
+}
+
+
+# stands in for the workers of members the participants table says are
+# connected, when no bus tells this worker where they are
+DB_WORKER = "db"
+
+
+def role_value(role) -> str:
+    return role.value if hasattr(role, "value") else str(role)
+
+
+class RosterEntry:
+    __slots__ = ("user_id", "display_name", "role", "conns") + FLAG_FIELDS
+
+    def __init__(self, user_id: str, display_name: str | None = None, role: str = "guest"):
+        self.user_id = user_id
+        self.display_name = display_name
+        self.role = role
+        # live connections for this user, per worker id
+        self.conns: Dict[str, int] = {}
+        for f, v in _DEFAULTS.items():
+            setattr(self, f, v)
+
+    @property
+    def connected(self) -> bool:
+        return bool(self.conns)
+
+    def elsewhere(self, worker_id: str) -> int:
+        """Sockets on workers other than `worker_id` (database stand-ins aside)."""
+        return sum(n for w, n in self.conns.items() if w not in (worker_id, DB_WORKER))
+
+    def set_conns(self, worker_id: str, n: int):
+        if n > 0:
+            self.conns[worker_id] = n
+        else:
+            self.conns.pop(worker_id, None)
+
+    def update(self, data: dict, fields: Iterable[str] = FLAG_FIELDS) -> dict:
+        """Apply the given flags and return only the ones that changed."""
+        changed = {}
+        for f in fields:
+            if f in data:
+                v = bool(data[f])
+                if getattr(self, f) != v:
+                    setattr(self, f, v)
+                    changed[f] = v
+        return changed
+
+    def to_dict(self) -> dict:
+        d = {
+            "user_id": self.user_id,
+            "display_name": self.display_name,
+            "role": self.role,
+            "connected": self.connected,
+        }
+        for f in FLAG_FIELDS:
+            d[f] = getattr(self, f)
+        return d
+
+
+class RoomRoster:
+    def __init__(self):
+        self.members: Dict[str, RosterEntry] = {}
+        # monotonic time offline members were loaded from the database, None before
+        self.hydrated_at: float | None = None
+
+    def live_count(self) -> int:
+        # copied first: join_room reads it from the threadpool
+        return sum(1 for m in list(self.members.values()) if m.conns)
+
+    def has_sockets(self) -> bool:
+        """Some worker holds a socket of the room (database stand-ins don't count)."""
+        return any(w != DB_WORKER for m in self.members.values() for w in m.conns)
+
+
+class Roster:
+    """Authoritative in-memory participant list for rooms with live members.
+
+    A room is tracked from its first connect until its last member leaves;
+    afterwards callers fall back to the participants table. Connections are
+    counted per worker, so the ones of a worker that died can be dropped
+    and a worker's periodic snapshot can replace what others believe about
+    it. Mutations must run on the event loop (RoomHub routes them there);
+    reads are safe anywhere.
+
+    Without the hub bus the roster only sees this worker's sockets; members
+    the participants table marks connected then count as connected on
+    DB_WORKER, and the loaded rows expire after `hydrate_ttl` seconds.
+    """
+
+    def __init__(self, hydrate_ttl: float | None = None):
+        self.rooms: Dict[str, RoomRoster] = {}
+        self.hydrate_ttl = hydrate_ttl
+
+    def get(self, room_key: str) -> RoomRoster | None:
+        return self.rooms.get(room_key)
+
+    def _fresh(self, room: RoomRoster) -> bool:
+        if room.hydrated_at is None:
+            return False
+        return self.hydrate_ttl is None or time.monotonic() - room.hydrated_at < self.hydrate_ttl
+
+    def snapshot(self, room_key: str) -> list[dict] | None:
+        room = self.rooms.get(room_key)
+        if room is None or not self._fresh(room):
+            return None
+        return [m.to_dict() for m in list(room.members.values())]
+
+    def merge(self, room_key: str, rows: list[dict]) -> list[dict]:
+        """Overlay live entries onto rows loaded from the database."""
+        room = self.rooms.get(room_key)
+        live = dict(room.members) if room else {}
+        items = []
+        for row in rows:
+            m = live.pop(row["user_id"], None)
+            items.append(m.to_dict() if m is not None else row)
+        items.extend(m.to_dict() for m in live.values())
+        return items
+
+    def hydrate(self, room_key: str, rows: list[dict]):
+        room = self.rooms.get(room_key)
+        if room is None or self._fresh(room):
+            return
+        # only when nothing else tells this worker about the others' sockets
+        from_db = self.hydrate_ttl is not None
+        for row in rows:
+            m = room.members.get(row["user_id"])
+            if m is None:
+                m = RosterEntry(row["user_id"], row.get("display_name"), row.get("role", "guest"))
+                m.update(row)
+                room.members[m.user_id] = m
+            elif from_db and not m.elsewhere(DB_WORKER):
+                # nobody here sees this member's events, the row is newer
+                m.role = row.get("role", m.role)
+                m.update(row)
+            if from_db:
+                m.set_conns(DB_WORKER, 1 if row.get("connected") and not m.elsewhere(DB_WORKER) else 0)
+        room.hydrated_at = time.monotonic()
+
+    def connect(self, room_key: str, data: dict, worker_id: str) -> RosterEntry:
+        room = self.rooms.setdefault(room_key, RoomRoster())
+        m = room.members.get(data["user_id"])
+        if m is None:
+            m = RosterEntry(data["user_id"])
+            room.members[m.user_id] = m
+        if data.get("display_name"):
+            m.display_name = data["display_name"]
+        if data.get("role"):
+            m.role = data["role"]
+        m.update(data)
+        m.set_conns(worker_id, m.conns.get(worker_id, 0) + 1)
+        # a real socket replaces the database's word for it
+        m.set_conns(DB_WORKER, 0)
+        return m
+
+    def disconnect(self, room_key: str, user_id: str, worker_id: str) -> RosterEntry | None:
+        room = self.rooms.get(room_key)
+        m = room.members.get(user_id) if room else None
+        if m is None:
+            return None
+        m.set_conns(worker_id, m.conns.get(worker_id, 0) - 1)
+        m.set_conns(DB_WORKER, 0)
+        self._drop_if_idle(room_key)
+        return m
+
+    def _drop_if_idle(self, room_key: str):
+        room = self.rooms.get(room_key)
+        if room is not None and not room.has_sockets():
+            self.rooms.pop(room_key, None)
+
+    def local(self, worker_id: str) -> Dict[str, Dict[str, dict]]:
+        """room -> user -> connection count and state, for the members
+        connected to `worker_id`: the worker's roster snapshot."""
+        out: Dict[str, Dict[str, dict]] = {}
+        for room_key, room in list(self.rooms.items()):
+            for m in list(room.members.values()):
+                n = m.conns.get(worker_id)
+                if n:
+                    out.setdefault(room_key, {})[m.user_id] = {**m.to_dict(), "n": n}
+        return out
+
+    def sync(self, room_key: str, worker_id: str, users: Dict[str, dict], reset: bool) -> list[tuple[RosterEntry, bool]]:
+        """Apply part of `worker_id`'s snapshot of one room: its connection
+        counts replace the ones stored for it (all of them when `reset`,
+        else only those of `users`). State is taken for unknown members only;
+        known ones are kept current by events. Returns (entry, was_connected)
+        for the members whose connected flag changed."""
+        room = self.rooms.get(room_key)
+        if room is None:
+            if not users:
+                return []
+            room = self.rooms[room_key] = RoomRoster()
+        before = {uid: m.connected for uid, m in room.members.items()}
+        if reset:
+            for m in room.members.values():
+                m.set_conns(worker_id, 0)
+        for uid, data in users.items():
+            m = room.members.get(uid)
+            if m is None:
+                m = RosterEntry(uid, data.get("display_name"), data.get("role", "guest"))
+                m.update(data)
+                room.members[uid] = m
+            m.set_conns(worker_id, int(data["n"]))
+        changed = [(m, before.get(uid, False)) for uid, m in room.members.items() if m.connected != before.get(uid, False)]
+        self._drop_if_idle(room_key)
+        return changed
+
+    def drop_worker(self, worker_id: str, room_keys: Iterable[str] | None = None) -> list[tuple[str, RosterEntry]]:
+        """Forget a worker's connections (every room, or `room_keys`).
+        Returns the members that went offline with it."""
+        gone = []
+        for room_key in list(self.rooms if room_keys is None else room_keys):
+            room = self.rooms.get(room_key)
+            if room is None:
+                continue
+            for m in room.members.values():
+                if worker_id in m.conns:
+                    m.set_conns(worker_id, 0)
+                    if not m.connected:
+                        gone.append((room_key, m))
+            self._drop_if_idle(room_key)
+        return gone
+
+    def workers(self) -> set[str]:
+        """Workers that hold connections according to this roster."""
+        return {w for room in list(self.rooms.values()) for m in list(room.members.values()) for w in m.conns} - {DB_WORKER}
+
+    def diff(self, room_key: str, user_id: str, data: dict, fields: Iterable[str] = FLAG_FIELDS) -> dict:
+        """Fields of `data` that differ from the stored entry, without applying them."""
+        room = self.rooms.get(room_key)
+        m = room.members.get(user_id) if room else None
+        changed = {}
+        for f in fields:
+            if f in data:
+                v = bool(data[f])
+                if m is None or getattr(m, f) != v:
+                    changed[f] = v
+        return changed
+
+    def set_state(self, room_key: str, user_id: str, data: dict) -> dict:
+        room = self.rooms.get(room_key)
+        m = room.members.get(user_id) if room else None
+        if m is None:
+            return {}
+        return m.update(data)
+
+    def set_role(self, room_key: str, user_id: str, role: str) -> bool:
+        room = self.rooms.get(room_key)
+        m = room.members.get(user_id) if room else None
+        if m is None or m.role == role:
+            return False
+        m.role = role
+        return True
+
+    def remove_member(self, room_key: str, user_id: str):
+        room = self.rooms.get(room_key)
+        if room is None:
+            return
+        room.members.pop(user_id, None)
+        self._drop_if_idle(room_key)
+
+    def add_member(self, room_key: str, user_id: str, display_name: str | None, role: str = "guest"):
+        room = self.rooms.get(room_key)
+        if room is None or user_id in room.members:
+            return
+        room.members[user_id] = RosterEntry(user_id, display_name, role)
+
+
+def chunk_snapshot(snapshot: Dict[str, Dict[str, dict]], limit: int) -> list[list]:
+    """Split a worker's snapshot (see Roster.local) into chunks of
+    [room, reset, users] parts whose JSON stays under `limit` bytes. A room
+    spread over several parts has `reset` set on its first one only."""
+    chunks, chunk, size = [], [], 2
+    for room_key, users in snapshot.items():
+        part, reset = None, True
+        for uid, entry in users.items():
+            cost = len(_dump(uid)) + len(_dump(entry)) + 2
+            if part is not None and size + cost > limit:
+                chunks.append(chunk)
+                chunk, size, part = [], 2, None
+            if part is None:
+                overhead = len(_dump([room_key, reset, {}])) + 1
+                if chunk and size + overhead + cost > limit:
+                    chunks.append(chunk)
+                    chunk, size = [], 2
+                part = {}
+                chunk.append([room_key, reset, part])
+                size += overhead
+                reset = False
+            part[uid] = entry
+            size += cost
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def _dump(value) -> str:
+    # the bus serializes the same way
+    return json.dumps(value, separators=(",", ":"))
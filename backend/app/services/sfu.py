@@ -0,0 +1,277 @@
+import asyncio
+import logging
+import queue
+import time
+from fractions import Fraction
+from typing import Dict
+
+import av
+from aiortc import MediaStreamTrack, RTCConfiguration, RTCIceServer, RTCPeerConnection, RTCRtpReceiver, RTCSessionDescription
+from aiortc.mediastreams import MediaStreamError
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# the only codecs negotiated on either side, so what a publisher sends can go
+# to every subscriber as is
+FORWARDED_CODECS = {"audio": ("audio/opus",), "video": ("video/VP8", "video/rtx")}
+# encoded frames queued per subscriber track before it starts losing them
+SUBSCRIBER_QUEUE_SIZE = 64
+# keyframe requests to a publisher, at most one per this many seconds
+KEYFRAME_INTERVAL_S = 0.5
+
+
+def rtc_configuration() -> RTCConfiguration:
+    return RTCConfiguration(iceServers=[RTCIceServer(urls=url) for url in settings.sfu_stun_urls])
+
+
+def description(pc: RTCPeerConnection) -> dict:
+    return {"type": pc.localDescription.type, "sdp": pc.localDescription.sdp}
+
+
+def codec_preferences(kind: str) -> list:
+    return [c for c in RTCRtpReceiver.getCapabilities(kind).codecs if c.mimeType in FORWARDED_CODECS[kind]]
+
+
+class ForwardedTrack:
+    """Encoded frames of one published track, handed to its subscribers.
+
+    aiortc reassembles frames from the publisher's RTP and queues them for a
+    decoder thread. That queue is swapped for one that passes them on as
+    av.Packet instead, so nothing is decoded; subscriber senders only
+    packetize them again, with their own SSRC, sequence numbers and
+    timestamps. Hooks into RTCRtpReceiver internals of the pinned aiortc.
+    """
+
+    def __init__(self, receiver: RTCRtpReceiver):
+        self.kind = receiver.track.kind
+        self.receiver = receiver
+        self.subscribers: set[SubscriberTrack] = set()
+        self.ended = False
+        self._keyframe_at = 0.0
+        # set before receive() hands the queue to the (now idle) decoder thread
+        receiver._RTCRtpReceiver__decoder_queue = _ForwardingQueue(self)
+
+    def forward(self, codec, frame):
+        packet = av.Packet(frame.data)
+        packet.pts = frame.timestamp
+        packet.time_base = Fraction(1, codec.clockRate)
+        for sub in list(self.subscribers):
+            sub.push(packet)
+
+    def end(self):
+        self.ended = True
+        for sub in list(self.subscribers):
+            sub.push(None)
+
+    def subscribe(self) -> "SubscriberTrack":
+        sub = SubscriberTrack(self)
+        if self.ended:
+            sub.push(None)
+        else:
+            self.subscribers.add(sub)
+            # a new decoder downstream can only start from a keyframe
+            self.request_keyframe()
+        return sub
+
+    def request_keyframe(self):
+        if self.kind != "video" or self.ended:
+            return
+        now = time.monotonic()
+        if now - self._keyframe_at < KEYFRAME_INTERVAL_S:
+            return
+        self._keyframe_at = now
+        for source in self.receiver.getSynchronizationSources():
+            asyncio.ensure_future(self.receiver._send_rtcp_pli(source.source))
+
+
+class _ForwardingQueue(queue.Queue):
+    # RTCRtpReceiver puts (codec, encoded frame) here on the event loop, and
+    # None when it stops; only None reaches the decoder thread, to end it
+    def __init__(self, track: ForwardedTrack):
+        super().__init__()
+        self.track = track
+
+    def put(self, item, block=True, timeout=None):
+        if item is None:
+            self.track.end()
+            super().put(item, block, timeout)
+        else:
+            self.track.forward(*item)
+
+
+class SubscriberTrack(MediaStreamTrack):
+    """One subscriber's copy of a forwarded track; yields av.Packet."""
+
+    def __init__(self, source: ForwardedTrack):
+        super().__init__()
+        self.kind = source.kind
+        self.source = source
+        self.queue: asyncio.Queue[av.Packet | None] = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def push(self, packet: av.Packet | None):
+        if self.queue.full():
+            # slow subscriber: drop what it hasn't sent and pick up at the next keyframe
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.source.request_keyframe()
+        self.queue.put_nowait(packet)
+
+    async def recv(self) -> av.Packet:
+        if self.readyState != "live":
+            raise MediaStreamError
+        packet = await self.queue.get()
+        if packet is None:
+            self.stop()
+            raise MediaStreamError
+        return packet
+
+    def stop(self):
+        super().stop()
+        self.source.subscribers.discard(self)
+
+
+class Publisher:
+    def __init__(self, conn_id: str, user_id: str, pc: RTCPeerConnection):
+        self.conn_id = conn_id
+        self.user_id = user_id
+        self.pc = pc
+        self.tracks: list[ForwardedTrack] = []
+
+    def info(self) -> dict:
+        return {"conn_id": self.conn_id, "user_id": self.user_id, "kinds": sorted(t.kind for t in self.tracks)}
+
+
+class SfuRoom:
+    def __init__(self):
+        self.publishers: Dict[str, Publisher] = {}
+        # (subscriber conn, publisher conn) -> peer connection sending the publisher's tracks
+        self.subscriptions: Dict[tuple[str, str], RTCPeerConnection] = {}
+
+    def empty(self) -> bool:
+        return not self.publishers and not self.subscriptions
+
+
+class Sfu:
+    """Selective forwarding for rooms in `sfu` media mode.
+
+    A client publishes once, over one peer connection to this process. A
+    subscriber gets one peer connection per publisher, and the publisher's
+    encoded frames are forwarded to it without decoding or re-encoding
+    (see ForwardedTrack), so neither a publisher's upload nor the server's
+    CPU per subscriber grows with codec work. Both sides are held to Opus
+    and VP8 for that.
+
+    Offers and answers carry complete SDP (no trickle ICE). Media lives in
+    this process, so all of a room's sockets must be on one worker.
+    """
+
+    def __init__(self):
+        self.rooms: Dict[str, SfuRoom] = {}
+
+    def publishers(self, room_key: str) -> list[dict]:
+        room = self.rooms.get(room_key)
+        return [p.info() for p in room.publishers.values()] if room else []
+
+    def is_full(self, room_key: str, conn_id: str) -> bool:
+        room = self.rooms.get(room_key)
+        if room is None or conn_id in room.publishers:
+            return False
+        return len(room.publishers) >= settings.sfu_max_publishers
+
+    async def publish(self, room_key: str, conn_id: str, user_id: str, offer: dict) -> tuple[dict, dict]:
+        """Take a client's offer; returns the answer and the publisher info to announce."""
+        await self.unpublish(room_key, conn_id)
+        room = self.rooms.setdefault(room_key, SfuRoom())
+        pc = RTCPeerConnection(rtc_configuration())
+        pub = Publisher(conn_id, user_id, pc)
+        # one track per kind, matched to the offer's m-lines by kind
+        ours = [pc.addTransceiver(kind, direction="recvonly") for kind in FORWARDED_CODECS]
+        for t in ours:
+            t.setCodecPreferences(codec_preferences(t.kind))
+
+        try:
+            await pc.setRemoteDescription(RTCSessionDescription(sdp=offer["sdp"], type=offer["type"]))
+            if any(t not in ours for t in pc.getTransceivers()):
+                raise ValueError("one audio and one video track at most")
+            for t in ours:
+                if t.receiver.track is not None:
+                    pub.tracks.append(ForwardedTrack(t.receiver))
+            await pc.setLocalDescription(await pc.createAnswer())
+        except Exception:
+            await pc.close()
+            raise
+        room.publishers[conn_id] = pub
+        return description(pc), pub.info()
+
+    async def subscribe(self, room_key: str, conn_id: str, publisher_id: str) -> dict | None:
+        """Offer the publisher's tracks to a subscriber; None if there is no such publisher."""
+        room = self.rooms.get(room_key)
+        pub = room.publishers.get(publisher_id) if room else None
+        if pub is None or publisher_id == conn_id:
+            return None
+        old = room.subscriptions.pop((conn_id, publisher_id), None)
+        if old is not None:
+            await old.close()
+        pc = RTCPeerConnection(rtc_configuration())
+        for track in pub.tracks:
+            t = pc.addTransceiver(track.subscribe(), direction="sendonly")
+            t.setCodecPreferences(codec_preferences(track.kind))
+            # the subscriber's keyframe requests go to the publisher; the sender has no encoder to ask
+            t.sender._send_keyframe = track.request_keyframe
+        room.subscriptions[(conn_id, publisher_id)] = pc
+        await pc.setLocalDescription(await pc.createOffer())
+        return description(pc)
+
+    async def answer(self, room_key: str, conn_id: str, publisher_id: str, answer: dict) -> bool:
+        room = self.rooms.get(room_key)
+        pc = room.subscriptions.get((conn_id, publisher_id)) if room else None
+        if pc is None:
+            return False
+        await pc.setRemoteDescription(RTCSessionDescription(sdp=answer["sdp"], type=answer["type"]))
+        return True
+
+    async def unpublish(self, room_key: str, conn_id: str) -> bool:
+        """Stop forwarding a publisher; its subscribers' connections are closed too."""
+        room = self.rooms.get(room_key)
+        pub = room.publishers.pop(conn_id, None) if room else None
+        if pub is None:
+            return False
+        pcs = [pc for (sub, p), pc in list(room.subscriptions.items()) if p == conn_id]
+        room.subscriptions = {k: pc for k, pc in room.subscriptions.items() if k[1] != conn_id}
+        await self._close(pcs + [pub.pc])
+        return True
+
+    async def leave(self, room_key: str, conn_id: str) -> bool:
+        """Drop everything a connection had; returns True if it was publishing."""
+        room = self.rooms.get(room_key)
+        if room is None:
+            return False
+        was_publishing = await self.unpublish(room_key, conn_id)
+        pcs = [pc for (sub, _), pc in room.subscriptions.items() if sub == conn_id]
+        room.subscriptions = {k: pc for k, pc in room.subscriptions.items() if k[0] != conn_id}
+        await self._close(pcs)
+        if room.empty():
+            self.rooms.pop(room_key, None)
+        return was_publishing
+
+    async def close_room(self, room_key: str):
+        room = self.rooms.pop(room_key, None)
+        if room is not None:
+            await self._close(list(room.subscriptions.values()) + [p.pc for p in room.publishers.values()])
+
+    async def close_all(self):
+        for room_key in list(self.rooms):
+            await self.close_room(room_key)
+
+    async def _close(self, pcs: list[RTCPeerConnection]):
+        for pc in pcs:
+            for sender in pc.getSenders():
+                # detaches the subscriber from the publisher's track
+                if sender.track is not None:
+                    sender.track.stop()
+        results = await asyncio.gather(*(pc.close() for pc in pcs), return_exceptions=True)
+        for r in results:
+            if isinstance(r, Exception):
+                logger.warning("sfu.close_failed", exc_info=r)
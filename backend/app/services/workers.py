@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Iterable
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert
+
+from ..core.config import settings
+from ..db.session import SessionLocal
+from ..models import HubWorker
+from .calllog import sweep_open_logs
+
+logger = logging.getLogger(__name__)
+
+DeadHandler = Callable[[set[str]], Awaitable[None]]
+
+
+class WorkerRegistry:
+    """Heartbeat of this worker process in hub_workers, and who else is alive.
+
+    Every WORKER_HEARTBEAT_S the worker refreshes its row and reads the rows
+    seen within WORKER_TTL_S. A worker that stopped heartbeating is dead:
+    whichever worker notices first closes its open call logs and deletes its
+    row, and every worker passes it to `on_dead`. Timestamps come from the workers' clocks; the TTL
+    is far above any skew between NTP-synced hosts.
+    """
+
+    def __init__(self):
+        # this process: owner of the call logs it opens, origin of its bus events
+        self.worker_id = uuid.uuid4().hex
+        self.node_id = settings.node_id or socket.gethostname()
+        self.alive: set[str] = {self.worker_id}
+        self._task: asyncio.Task | None = None
+
+    async def start(self, on_dead: DeadHandler | None = None):
+        # registered before this worker opens any call log
+        await asyncio.to_thread(self.heartbeat)
+        self._task = asyncio.create_task(self._run(on_dead))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            # the worker closed its logs on the way out, nothing is left to sweep
+            await asyncio.to_thread(self.leave)
+        except Exception:
+            logger.exception("workers.leave_failed")
+
+    async def _run(self, on_dead: DeadHandler):
+        while True:
+            await asyncio.sleep(settings.worker_heartbeat_s)
+            try:
+                dead = await asyncio.to_thread(self.heartbeat)
+            except Exception:
+                logger.exception("workers.heartbeat_failed")
+                continue
+            if dead and on_dead is not None:
+                try:
+                    await on_dead(dead)
+                except Exception:
+                    logger.exception("workers.on_dead_failed")
+
+    def heartbeat(self) -> set[str]:
+        """Refresh this worker's row, sweep dead workers. Returns the workers
+        that were alive at the previous heartbeat and are not anymore."""
+        now = datetime.now(timezone.utc)
+        cutoff = now - timedelta(seconds=settings.worker_ttl_s)
+        db = SessionLocal()
+        try:
+            db.execute(
+                insert(HubWorker)
+                .values(worker_id=self.worker_id, node_id=self.node_id, last_seen=now)
+                .on_conflict_do_update(index_elements=[HubWorker.worker_id], set_={"last_seen": now})
+            )
+            rows = db.execute(select(HubWorker.worker_id, HubWorker.last_seen)).all()
+            db.commit()
+        finally:
+            db.close()
+        lapsed = {r.worker_id for r in rows if _aware(r.last_seen) < cutoff}
+        if lapsed:
+            sweep_open_logs(owners=lapsed)
+            self.forget(lapsed, cutoff)
+            logger.info("workers.dead ids=%s", sorted(lapsed))
+        alive = {r.worker_id for r in rows} - lapsed
+        dead, self.alive = self.alive - alive, alive
+        return dead
+
+    def forget(self, worker_ids: Iterable[str], cutoff: datetime):
+        db = SessionLocal()
+        try:
+            # unless it came back meanwhile
+            db.execute(delete(HubWorker).where(HubWorker.worker_id.in_(list(worker_ids)), HubWorker.last_seen < cutoff))
+            db.commit()
+        finally:
+            db.close()
+
+    def leave(self):
+        db = SessionLocal()
+        try:
+            db.execute(delete(HubWorker).where(HubWorker.worker_id == self.worker_id))
+            db.commit()
+        finally:
+            db.close()
+
+
+def _aware(value: datetime) -> datetime:
+    # SQLite hands timestamps back without their zone
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
@@ -0,0 +1,27 @@
+import os
+import tempfile
+
+# before the app is imported: settings are read once, and a local .env must
+# not point the tests at a real database or bucket
+_tmp = tempfile.mkdtemp(prefix="hackrtc-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp}/test.db"
+for _key in ("S3_ENDPOINT", "S3_BUCKET", "S3_ACCESS_KEY", "S3_SECRET_KEY"):
+    os.environ[_key] = ""
+os.environ["HUB_BUS_ENABLED"] = "false"
+os.environ["JWT_SECRET"] = "test-secret"
+
+import pytest  # noqa: E402
+
+from backend.app.db.session import Base, SessionLocal, engine  # noqa: E402
+from backend.app import models  # noqa: E402,F401
+
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        Base.metadata.drop_all(engine)
@@ -0,0 +1,79 @@
+import pytest
+
+from backend.app.core.config import settings
+from backend.app.routers.ws import RoomHub
+from backend.app.services.admission import WaitingRoom
+
+ROOM = "room-1"
+
+
+@pytest.fixture
+def waiting(monkeypatch):
+    monkeypatch.setattr(settings, "ws_waiting_room_max", 3)
+    return WaitingRoom()
+
+
+def test_positions_follow_arrival(waiting):
+    a, b, c = (waiting.enqueue(ROOM, u) for u in "abc")
+    assert [waiting.position(ROOM, w) for w in (a, b, c)] == [(1, 3), (2, 3), (3, 3)]
+    # a full queue refuses
+    assert waiting.enqueue(ROOM, "d") is None
+    assert len(waiting) == 3
+
+
+def test_leaving_moves_up_only_those_behind(waiting):
+    a, b, c = (waiting.enqueue(ROOM, u) for u in "abc")
+    waiting.remove(ROOM, b)
+
+    assert not a.changed.is_set()
+    assert c.changed.is_set()
+    assert waiting.position(ROOM, c) == (2, 2)
+    assert waiting.position(ROOM, b) == (0, 2)
+
+
+def test_seats_go_to_the_front_first(waiting):
+    a, b, c = (waiting.enqueue(ROOM, u) for u in "abc")
+    seats = ["a", "b"]
+
+    def take_seat(room_key, user_id):
+        if seats and seats[0] == user_id:
+            seats.pop(0)
+            return True
+        return False
+
+    waiting.seat(ROOM, take_seat)
+    assert a.seated and b.seated and not c.seated
+    assert waiting.position(ROOM, c) == (1, 1)
+    assert c.changed.is_set()
+
+    # nobody overtakes the front even if a seat would fit them
+    d = waiting.enqueue(ROOM, "d")
+    waiting.seat(ROOM, lambda room_key, user_id: user_id == "d")
+    assert not d.seated
+    assert waiting.position(ROOM, d) == (2, 2)
+
+
+def test_closed_room_releases_everyone(waiting):
+    a, b = waiting.enqueue(ROOM, "a"), waiting.enqueue(ROOM, "b")
+    waiting.close_room(ROOM)
+    assert a.closed and b.closed and a.changed.is_set()
+    assert ROOM not in waiting.queues
+
+
+def test_room_seats_count_distinct_users(monkeypatch):
+    monkeypatch.setattr(settings, "room_max_connections", 2)
+    hub = RoomHub()
+    me = hub.workers.worker_id
+    hub.roster.connect(ROOM, {"user_id": "a"}, me)
+    hub.roster.connect(ROOM, {"user_id": "a"}, "peer")
+    assert hub.take_seat(ROOM, "b")
+    # b's reservation holds the last seat until b is in the roster
+    assert not hub.room_has_seat(ROOM, "c")
+    # another tab of someone in the call needs no seat
+    assert hub.room_has_seat(ROOM, "a")
+
+    hub.roster.connect(ROOM, {"user_id": "b"}, me)
+    hub.release_seat(ROOM)
+    assert not hub.room_has_seat(ROOM, "c")
+    hub.roster.disconnect(ROOM, "b", me)
+    assert hub.room_has_seat(ROOM, "c")
@@ -0,0 +1,59 @@
+import uuid
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select
+
+from backend.app.models import CallLog, RollupState, Room, UsageDaily, User
+from backend.app.services.analytics import ROLLUP_NAME, rollup_once, split_by_day
+
+DAY = datetime(2026, 3, 2, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def ids(db):
+    user, room = User(display_name="u"), Room(name="r", invite_code="abc")
+    db.add_all([user, room])
+    db.flush()
+    ids = room.id, user.id
+    db.commit()
+    return ids
+
+
+def _call(db, ids, start: datetime, seconds: int) -> uuid.UUID:
+    log_id = uuid.uuid4()
+    db.add(CallLog(id=log_id, room_id=ids[0], user_id=ids[1], joined_at=start, left_at=start + timedelta(seconds=seconds), duration_seconds=seconds))
+    db.commit()
+    return log_id
+
+
+def _usage(db) -> tuple[int, int]:
+    rows = db.execute(select(UsageDaily.seconds, UsageDaily.sessions)).all()
+    return sum(r.seconds for r in rows), sum(r.sessions for r in rows)
+
+
+def test_split_by_day_sums_to_duration():
+    parts = split_by_day(datetime(2026, 1, 1, 23, 30, tzinfo=timezone.utc), datetime(2026, 1, 3, 0, 10, tzinfo=timezone.utc), None)
+    assert parts == [(date(2026, 1, 1), 1800), (date(2026, 1, 2), 86400), (date(2026, 1, 3), 600)]
+
+
+def test_watermark_moves_batch_by_batch(db, ids):
+    for i in range(5):
+        _call(db, ids, DAY + timedelta(minutes=i), 60)
+
+    assert [rollup_once(batch_size=2) for _ in range(4)] == [2, 2, 1, 0]
+    assert _usage(db) == (300, 5)
+    state = db.get(RollupState, ROLLUP_NAME)
+    assert state.last_left_at.replace(tzinfo=timezone.utc) == DAY + timedelta(minutes=4, seconds=60)
+
+
+def test_call_closed_again_is_counted_once(db, ids):
+    log_id = _call(db, ids, DAY, 60)
+    assert rollup_once() == 1
+    # the worker that really owned the call closes it later than the sweep did
+    log = db.get(CallLog, (log_id, DAY))
+    log.left_at, log.duration_seconds = DAY + timedelta(seconds=600), 600
+    db.commit()
+
+    assert rollup_once() == 0
+    assert _usage(db) == (60, 1)
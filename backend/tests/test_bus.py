@@ -0,0 +1,47 @@
+import asyncio
+import json
+
+import orjson
+
+from backend.app.routers.ws import Connection, RoomHub
+from backend.app.services.bus import MAX_PAYLOAD_BYTES, HubBus
+
+
+def _started(bus: HubBus) -> HubBus:
+    # what start() sets up, without the Postgres connections
+    bus.enabled = True
+    bus._loop = asyncio.get_running_loop()
+    bus._queue = asyncio.Queue()
+    return bus
+
+
+def test_publish_reports_dropped_events():
+    async def run():
+        bus = _started(HubBus("w1"))
+        assert bus.publish("signal", "room", {"sdp": "v=0"}) is True
+        assert bus.publish("signal", "room", {"sdp": "x" * MAX_PAYLOAD_BYTES}) is False
+        assert bus._queue.qsize() == 1
+        assert json.loads(bus._queue.get_nowait())["d"] == {"sdp": "v=0"}
+
+    asyncio.run(run())
+
+
+def test_publish_is_a_noop_when_disabled():
+    bus = HubBus("w1")
+    assert bus.publish("signal", "room", {"sdp": "x" * MAX_PAYLOAD_BYTES}) is True
+
+
+def test_oversized_relay_is_reported_to_the_sender():
+    async def run():
+        hub = RoomHub()
+        _started(hub.bus)
+        sender = Connection(None, "u1", "a")
+        # the addressee is on another worker
+        assert hub.route_signal("room", sender, {"type": "signal", "to_conn": "elsewhere", "sdp": "x" * MAX_PAYLOAD_BYTES})
+        assert orjson.loads(sender.queue.get_nowait()) == {"type": "error", "code": "signal_too_large"}
+
+        assert hub.route_signal("room", sender, {"type": "signal", "to_conn": "elsewhere", "sdp": "v=0"})
+        assert sender.queue.empty()
+        assert hub.bus._queue.qsize() == 1
+
+    asyncio.run(run())
@@ -0,0 +1,87 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from backend.app.core.config import settings
+from backend.app.models import CallLog, HubWorker, Participant, Room, User
+from backend.app.routers.ws import check_resumed, hub
+from backend.app.services.calllog import sweep_open_logs
+from backend.app.services.workers import WorkerRegistry
+
+NOW = datetime.now(timezone.utc)
+
+
+@pytest.fixture
+def room(db):
+    user, room = User(display_name="u"), Room(name="r", invite_code="abc")
+    db.add_all([user, room])
+    db.flush()
+    db.add(Participant(room_id=room.id, user_id=user.id))
+    db.commit()
+    return room, user
+
+
+def _worker(db, worker_id, seen_ago: float):
+    db.add(HubWorker(worker_id=worker_id, node_id="n", last_seen=NOW - timedelta(seconds=seen_ago)))
+    db.commit()
+
+
+def _log(db, room, owner) -> CallLog:
+    log = CallLog(id=uuid.uuid4(), room_id=room[0].id, user_id=room[1].id, joined_at=NOW - timedelta(minutes=5), worker_id=owner)
+    db.add(log)
+    db.commit()
+    return log
+
+
+def _is_open(db, log) -> bool:
+    db.refresh(log)
+    return log.left_at is None
+
+
+def test_startup_sweep_spares_live_workers(db, room):
+    _worker(db, "live", 1)
+    _worker(db, "gone", settings.worker_ttl_s + 5)
+    live, gone, legacy = _log(db, room, "live"), _log(db, room, "gone"), _log(db, room, None)
+
+    assert sweep_open_logs() == 2
+
+    assert _is_open(db, live)
+    assert not _is_open(db, gone)
+    assert not _is_open(db, legacy)
+    assert gone.duration_seconds >= 300
+
+
+def test_sweep_by_owner(db, room):
+    a, b = _log(db, room, "a"), _log(db, room, "b")
+    assert sweep_open_logs(owners={"a"}) == 1
+    assert not _is_open(db, a)
+    assert _is_open(db, b)
+
+
+def test_heartbeat_sweeps_lapsed_workers(db, room):
+    registry = WorkerRegistry()
+    _worker(db, "peer", 1)
+    registry.heartbeat()
+    assert registry.alive == {registry.worker_id, "peer"}
+    mine, theirs = _log(db, room, registry.worker_id), _log(db, room, "peer")
+
+    db.get(HubWorker, "peer").last_seen = NOW - timedelta(seconds=settings.worker_ttl_s + 5)
+    db.commit()
+    assert registry.heartbeat() == {"peer"}
+
+    assert _is_open(db, mine)
+    assert not _is_open(db, theirs)
+    db.expire_all()
+    assert db.get(HubWorker, "peer") is None
+    assert registry.alive == {registry.worker_id}
+
+
+def test_resume_takes_over_the_log(db, room):
+    log = _log(db, room, "draining-worker")
+    assert check_resumed(room[0].id, room[1].id, log.id, log.joined_at) == "guest"
+    db.refresh(log)
+    assert log.worker_id == hub.workers.worker_id
+    # the old worker going away no longer touches it
+    assert sweep_open_logs(owners={"draining-worker"}) == 0
+    assert _is_open(db, log)
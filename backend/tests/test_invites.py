@@ -0,0 +1,52 @@
+import pytest
+from fastapi import HTTPException
+
+from backend.app.core.config import settings
+from backend.app.models import Room
+from backend.app.routers.rooms import resolve_invite
+from backend.app.services import invites
+from backend.app.services.invites import InviteCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(invites.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_short_ttl_without_hub_bus():
+    assert settings.hub_bus_enabled is False
+    assert invites.invite_cache.ttl == settings.invite_cache_local_ttl_s
+    assert invites.invite_cache.negative_ttl <= settings.invite_cache_local_ttl_s
+
+
+def test_zero_ttl_caches_nothing(clock):
+    cache = InviteCache(ttl=0, negative_ttl=0, max_size=10)
+    cache.put("abc", {"id": 1}, cache.generation())
+    cache.put("zzz", None, cache.generation())
+    assert cache.get("abc") == (False, None)
+    assert cache.get("zzz") == (False, None)
+
+
+def test_regenerated_code_stops_resolving_without_bus(db, clock, monkeypatch):
+    monkeypatch.setattr(invites, "invite_cache", InviteCache(settings.invite_cache_local_ttl_s, settings.invite_cache_local_ttl_s, 10))
+    monkeypatch.setattr("backend.app.routers.rooms.invite_cache", invites.invite_cache)
+    room = Room(name="r", invite_code="old")
+    db.add(room)
+    db.commit()
+    assert resolve_invite(db, "old")["invite_code"] == "old"
+    # this worker cached the new code as unknown before the regenerate
+    with pytest.raises(HTTPException):
+        resolve_invite(db, "new")
+
+    # regenerated on another worker: nothing reaches this worker's cache
+    room.invite_code = "new"
+    db.commit()
+    assert resolve_invite(db, "old")["invite_code"] == "old"
+
+    clock[0] += settings.invite_cache_local_ttl_s
+    with pytest.raises(HTTPException) as e:
+        resolve_invite(db, "old")
+    assert e.value.status_code == 404
+    assert resolve_invite(db, "new")["invite_code"] == "new"
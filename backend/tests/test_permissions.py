@@ -0,0 +1,82 @@
+import uuid
+
+import pytest
+from fastapi import HTTPException
+
+from backend.app.core.config import settings
+from backend.app.models import Participant, Room, User
+from backend.app.models.participant import Role
+from backend.app.services import permissions
+from backend.app.services.permissions import RoleCache, get_role, require_role
+
+ROOM, USER, OTHER = (str(uuid.uuid4()) for _ in range(3))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(permissions.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = RoleCache(ttl=10)
+    cache.put(ROOM, USER, Role.moderator)
+    assert cache.get(ROOM, USER) == "moderator"
+    # the same key however the ids were spelled
+    assert cache.get(uuid.UUID(ROOM), USER.upper()) == "moderator"
+    clock[0] += 10
+    assert cache.get(ROOM, USER) is None
+
+
+def test_zero_ttl_caches_nothing(clock):
+    cache = RoleCache(ttl=0)
+    cache.put(ROOM, USER, "host")
+    assert cache.get(ROOM, USER) is None
+
+
+def test_invalidation(clock):
+    cache = RoleCache(ttl=10)
+    cache.put(ROOM, USER, "guest")
+    cache.put(ROOM, OTHER, "guest")
+    cache.set_roles(ROOM, [USER], "moderator")
+    assert cache.get(ROOM, USER) == "moderator"
+    cache.forget(ROOM, [USER])
+    assert cache.get(ROOM, USER) is None
+    assert cache.get(ROOM, OTHER) == "guest"
+    cache.drop_room(ROOM)
+    assert cache.get(ROOM, OTHER) is None
+
+
+def test_read_started_before_a_change_is_not_cached(clock):
+    cache = RoleCache(ttl=10)
+    gen = cache.generation()
+    # a promote lands while get_role is reading the old row
+    cache.set_roles(ROOM, [USER], "moderator")
+    cache.forget(ROOM, [USER])
+    cache.put(ROOM, USER, "guest", gen)
+    assert cache.get(ROOM, USER) is None
+
+
+def test_short_ttl_without_hub_bus():
+    assert settings.hub_bus_enabled is False
+    assert permissions.role_cache.ttl == settings.role_cache_local_ttl_s
+
+
+def test_get_role_reads_through(db, monkeypatch):
+    monkeypatch.setattr(permissions, "role_cache", RoleCache(ttl=60))
+    user, room = User(display_name="u"), Room(name="r", invite_code="abc")
+    db.add_all([user, room])
+    db.flush()
+    db.add(Participant(room_id=room.id, user_id=user.id, role=Role.moderator))
+    db.commit()
+
+    assert get_role(db, room.id, user.id) == "moderator"
+    assert permissions.role_cache.get(room.id, user.id) == "moderator"
+    assert require_role(db, room.id, user.id) == "moderator"
+    with pytest.raises(HTTPException) as e:
+        require_role(db, room.id, uuid.uuid4())
+    assert e.value.detail == "Not in room"
+    with pytest.raises(HTTPException) as e:
+        require_role(db, room.id, user.id, allowed=("host",))
+    assert e.value.detail == "Insufficient role"
@@ -0,0 +1,108 @@
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import event, func, select
+
+from backend.app.core.config import settings
+from backend.app.db.session import engine
+from backend.app.models import Message, Participant, Room, User
+from backend.app.services import purge
+
+
+def _deleted_room(db, owner_id, ago: timedelta) -> uuid.UUID:
+    room = Room(name="r", invite_code=uuid.uuid4().hex[:16], owner_id=owner_id, deleted_at=datetime.now(timezone.utc) - ago)
+    db.add(room)
+    db.flush()
+    room_id = room.id
+    db.add(Participant(room_id=room_id, user_id=owner_id))
+    for i in range(5):
+        db.add(Message(id=uuid.uuid4(), room_id=room_id, user_id=owner_id, content_ciphertext=f"m{i}", created_at=datetime.now(timezone.utc)))
+    db.commit()
+    return room_id
+
+
+@pytest.fixture
+def owner(db):
+    # ids are read before committing, so the session holds no connection afterwards
+    user = User(display_name="owner")
+    db.add(user)
+    db.flush()
+    user_id = user.id
+    db.commit()
+    return user_id
+
+
+@pytest.fixture
+def advisory_locks(monkeypatch):
+    """Session-level advisory locks on SQLite, held per DBAPI connection like Postgres does."""
+    held: dict[int, int] = {}
+
+    def on_connect(dbapi_conn, record):
+        def try_lock(key):
+            if held.get(key, id(dbapi_conn)) != id(dbapi_conn):
+                return 0
+            held[key] = id(dbapi_conn)
+            return 1
+
+        def unlock(key):
+            if held.get(key) != id(dbapi_conn):
+                return 0
+            del held[key]
+            return 1
+
+        dbapi_conn.create_function("pg_try_advisory_lock", 1, try_lock)
+        dbapi_conn.create_function("pg_advisory_unlock", 1, unlock)
+
+    engine.dispose()
+    event.listen(engine, "connect", on_connect)
+    monkeypatch.setattr(engine.dialect, "name", "postgresql")
+    # more than one idle connection, as on a busy worker
+    with engine.connect(), engine.connect():
+        pass
+    yield held
+    event.remove(engine, "connect", on_connect)
+    engine.dispose()
+
+
+def test_purges_rooms_past_grace_only(db, owner, monkeypatch):
+    monkeypatch.setattr(settings, "room_purge_grace_s", 3600)
+    old = _deleted_room(db, owner, timedelta(hours=2))
+    fresh = _deleted_room(db, owner, timedelta(minutes=5))
+
+    assert purge.purge_deleted_rooms(batch_size=2) == 1
+
+    db.expire_all()
+    assert db.get(Room, old) is None
+    assert db.get(Room, fresh) is not None
+    assert db.scalar(select(func.count()).select_from(Message).where(Message.room_id == old)) == 0
+    assert db.scalar(select(func.count()).select_from(Message).where(Message.room_id == fresh)) == 5
+
+
+def test_skips_room_locked_elsewhere_and_releases_its_own_locks(db, owner, monkeypatch, advisory_locks, caplog):
+    monkeypatch.setattr(settings, "room_purge_grace_s", 0)
+    busy = _deleted_room(db, owner, timedelta(minutes=1))
+    free = _deleted_room(db, owner, timedelta(minutes=1))
+    # another worker is purging `busy`
+    advisory_locks[purge._lock_key(busy)] = -1
+
+    used = set()
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        used.add(id(conn.connection.driver_connection))
+
+    event.listen(engine, "before_cursor_execute", on_execute)
+    try:
+        with caplog.at_level(logging.WARNING, logger=purge.__name__):
+            assert purge.purge_deleted_rooms(batch_size=2) == 1
+    finally:
+        event.remove(engine, "before_cursor_execute", on_execute)
+
+    db.expire_all()
+    assert db.get(Room, busy) is not None
+    assert db.get(Room, free) is None
+    # locks, batches and unlocks all ran on one connection, and every lock was released
+    assert len(used) == 1
+    assert advisory_locks == {purge._lock_key(busy): -1}
+    assert "purge.unlock_failed" not in caplog.text
@@ -0,0 +1,58 @@
+import threading
+
+import pytest
+
+from backend.app.core.config import settings
+from backend.app.db import replica
+
+
+@pytest.fixture
+def writes(monkeypatch):
+    # any engine will do, note_write only checks that one is configured
+    monkeypatch.setattr(replica, "replica_engine", object())
+    monkeypatch.setattr(replica, "_recent_writes", {})
+    monkeypatch.setattr(replica, "_pruned_at", {"t": 0.0})
+    monkeypatch.setattr(replica, "MAX_RECENT_WRITES", 10)
+    return replica._recent_writes
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(replica.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_prunes_at_most_once_per_window(writes, clock):
+    for i in range(10):
+        replica.note_write(f"old-{i}")
+    clock[0] += settings.read_your_writes_s
+    replica.note_write("new")
+    # the expired ones went in a single scan
+    assert list(writes) == ["new"]
+
+    for i in range(20):
+        replica.note_write(f"fresh-{i}")
+    clock[0] += 1
+    replica.note_write("later")
+    # over the cap again, but the last scan was less than a window ago
+    assert len(writes) == 22
+
+
+def test_concurrent_writes_while_pruning(writes, monkeypatch):
+    monkeypatch.setattr(settings, "read_your_writes_s", 0)
+    errors = []
+
+    def commits(prefix):
+        try:
+            for i in range(2000):
+                replica.note_write(f"{prefix}-{i}")
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=commits, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
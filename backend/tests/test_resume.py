@@ -0,0 +1,111 @@
+import uuid
+from datetime import datetime, timezone
+
+import jwt
+import pytest
+
+from backend.app.core.security import create_access_token
+from backend.app.models import CallLog, Participant, Room, User
+from backend.app.routers.ws import check_resumed, end_unless_resumed, parse_resume
+
+USER, ROOM = str(uuid.uuid4()), str(uuid.uuid4())
+
+
+def _token(sub=USER, room=ROOM, typ="resume", expires_minutes=5, **extra):
+    return create_access_token(sub, extra={"typ": typ, "room": room, **extra}, expires_minutes=expires_minutes)
+
+
+def test_accepts_own_resume_token():
+    claims = parse_resume(_token(role="guest"), USER, ROOM)
+    assert claims["role"] == "guest"
+
+
+@pytest.mark.parametrize(
+    "token",
+    [
+        None,
+        "",
+        "not-a-jwt",
+        _token(typ="access"),
+        _token(sub=str(uuid.uuid4())),
+        _token(room=str(uuid.uuid4())),
+        _token(expires_minutes=-1),
+        jwt.encode({"sub": USER, "typ": "resume", "room": ROOM}, "another-secret", algorithm="HS256"),
+    ],
+    ids=["missing", "empty", "garbage", "access-token", "other-user", "other-room", "expired", "foreign-signature"],
+)
+def test_rejects(token):
+    assert parse_resume(token, USER, ROOM) is None
+
+
+@pytest.fixture
+def member(db):
+    user, room = User(display_name="u"), Room(name="r", invite_code="abc")
+    db.add_all([user, room])
+    db.flush()
+    p = Participant(room_id=room.id, user_id=user.id, role="moderator")
+    db.add(p)
+    db.commit()
+    return room, user, p
+
+
+def test_check_resumed_marks_connected(db, member):
+    room, user, p = member
+    assert check_resumed(room.id, user.id, uuid.uuid4(), datetime.now(timezone.utc)) == "moderator"
+    db.refresh(p)
+    assert p.connected is True
+
+
+def test_check_resumed_rejects_removed_participant(db, member):
+    room, user, p = member
+    db.delete(p)
+    db.commit()
+    assert check_resumed(room.id, user.id, uuid.uuid4(), datetime.now(timezone.utc)) == (4403, "removed from room")
+
+
+def test_check_resumed_rejects_deleted_room(db, member):
+    room, user, _ = member
+    room.deleted_at = datetime.now(timezone.utc)
+    db.commit()
+    assert check_resumed(room.id, user.id, uuid.uuid4(), datetime.now(timezone.utc)) == (4404, "room not found")
+
+
+@pytest.fixture
+def offered(db, member):
+    # a session a draining worker offered to the others, its log still open
+    room, user, p = member
+    p.connected = True
+    log = CallLog(id=uuid.uuid4(), room_id=room.id, user_id=user.id, joined_at=datetime.now(timezone.utc), worker_id="old")
+    db.add(log)
+    db.commit()
+    # what the old worker kept in memory
+    return room, user, p, log, (log.id, log.joined_at.replace(tzinfo=timezone.utc))
+
+
+def test_unclaimed_session_ends_on_the_old_worker(db, offered):
+    room, user, p, log, entry = offered
+    assert end_unless_resumed(entry, room.id, user.id, "old") is True
+    db.refresh(log)
+    db.refresh(p)
+    assert log.left_at is not None
+    assert p.connected is False
+
+
+def test_resumed_session_is_left_alone(db, offered):
+    room, user, p, log, entry = offered
+    assert check_resumed(room.id, user.id, log.id, log.joined_at) == "moderator"
+    assert end_unless_resumed(entry, room.id, user.id, "old") is False
+    db.refresh(log)
+    db.refresh(p)
+    assert log.left_at is None
+    assert p.connected is True
+
+
+def test_resume_after_the_old_socket_closed_reopens_the_log(db, offered):
+    room, user, p, log, entry = offered
+    end_unless_resumed(entry, room.id, user.id, "old")
+    check_resumed(room.id, user.id, log.id, log.joined_at)
+    db.refresh(log)
+    db.refresh(p)
+    assert log.left_at is None and log.duration_seconds is None
+    assert p.connected is True
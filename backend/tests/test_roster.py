@@ -0,0 +1,154 @@
+import json
+
+import pytest
+
+from backend.app.routers.ws import RoomHub
+from backend.app.services import roster as roster_mod
+from backend.app.services.roster import DB_WORKER, Roster, chunk_snapshot
+
+ROOM = "room-1"
+
+
+def _row(user_id: str, connected: bool) -> dict:
+    return {"user_id": user_id, "display_name": user_id, "role": "guest", "connected": connected}
+
+
+def test_connections_are_counted_per_worker():
+    r = Roster()
+    r.connect(ROOM, {"user_id": "u"}, "a")
+    r.connect(ROOM, {"user_id": "u"}, "a")
+    m = r.connect(ROOM, {"user_id": "u"}, "b")
+    assert m.conns == {"a": 2, "b": 1}
+    assert m.elsewhere("a") == 1
+
+    r.disconnect(ROOM, "u", "a")
+    r.disconnect(ROOM, "u", "a")
+    assert m.connected and r.get(ROOM).live_count() == 1
+    # a disconnect of a worker that holds nothing doesn't go negative
+    r.disconnect(ROOM, "u", "a")
+    assert m.conns == {"b": 1}
+    r.disconnect(ROOM, "u", "b")
+    assert not m.connected
+    assert r.get(ROOM) is None
+
+
+def test_dead_worker_takes_its_members_offline():
+    r = Roster()
+    r.connect(ROOM, {"user_id": "u"}, "a")
+    r.connect(ROOM, {"user_id": "v"}, "a")
+    r.connect(ROOM, {"user_id": "v"}, "b")
+
+    gone = r.drop_worker("a")
+
+    assert [(room, m.user_id) for room, m in gone] == [(ROOM, "u")]
+    assert r.get(ROOM).members["v"].conns == {"b": 1}
+    assert r.workers() == {"b"}
+
+
+def test_sync_replaces_the_workers_counts():
+    r = Roster()
+    r.connect(ROOM, {"user_id": "u"}, "a")
+    r.connect(ROOM, {"user_id": "v"}, "b")
+    # b missed u's connect and v's disconnect
+    changed = r.sync(ROOM, "b", {"u": {"n": 2, "display_name": "U"}}, reset=True)
+
+    assert [(m.user_id, was) for m, was in changed] == [("v", True)]
+    assert r.get(ROOM).members["u"].conns == {"a": 1, "b": 2}
+    # a later part of the same room adds to it
+    r.sync(ROOM, "b", {"w": {"n": 1, "mic_on": False}}, reset=False)
+    w = r.get(ROOM).members["w"]
+    assert w.connected and not w.mic_on
+    assert r.get(ROOM).members["u"].conns["b"] == 2
+
+
+def test_chunks_stay_under_the_limit():
+    snapshot = {
+        f"room-{i}": {f"user-{i}-{j}": {"n": 1, "display_name": "x" * 40} for j in range(30)}
+        for i in range(3)
+    }
+    chunks = chunk_snapshot(snapshot, 1000)
+
+    assert len(chunks) > 3
+    assert all(len(json.dumps(c, separators=(",", ":"))) <= 1000 for c in chunks)
+    seen: dict[str, dict] = {}
+    for chunk in chunks:
+        for room_key, reset, users in chunk:
+            # only a room's first part resets
+            assert reset == (room_key not in seen)
+            seen.setdefault(room_key, {}).update(users)
+    assert seen == snapshot
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(roster_mod.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_hydrate_without_bus_trusts_the_table(clock):
+    r = Roster(hydrate_ttl=30)
+    r.connect(ROOM, {"user_id": "local"}, "a")
+    r.hydrate(ROOM, [_row("local", True), _row("remote", True), _row("away", False)])
+
+    members = r.get(ROOM).members
+    assert members["local"].conns == {"a": 1}
+    assert members["remote"].conns == {DB_WORKER: 1}
+    assert not members["away"].connected
+    assert r.get(ROOM).live_count() == 2
+    assert r.snapshot(ROOM) is not None
+
+    clock[0] += 30
+    assert r.snapshot(ROOM) is None
+    r.hydrate(ROOM, [_row("local", True), _row("remote", False), _row("away", False)])
+    assert not members["remote"].connected
+    # stand-ins don't keep the room alive
+    r.disconnect(ROOM, "local", "a")
+    assert r.get(ROOM) is None
+
+
+def test_hydrate_with_bus_keeps_the_roster(clock):
+    r = Roster()
+    r.connect(ROOM, {"user_id": "u"}, "a")
+    r.hydrate(ROOM, [_row("u", False), _row("v", True)])
+
+    assert r.get(ROOM).members["u"].connected
+    assert not r.get(ROOM).members["v"].connected
+    clock[0] += 3600
+    assert r.snapshot(ROOM) is not None
+
+
+@pytest.fixture
+def hub():
+    h = RoomHub()
+    h.roster.connect(ROOM, {"user_id": "u"}, "peer")
+    h.roster.connect("room-2", {"user_id": "v"}, "peer")
+    h.roster.connect("room-2", {"user_id": "w"}, h.workers.worker_id)
+    return h
+
+
+def test_complete_snapshot_drops_rooms_it_omits(hub):
+    hub._apply("roster.sync", "", {"g": 1, "rooms": [[ROOM, True, {"u": {"n": 1}}]]}, "peer")
+    hub._apply("roster.sync_done", "", {"g": 1, "chunks": 1}, "peer")
+
+    assert hub.roster.get(ROOM).members["u"].conns == {"peer": 1}
+    assert not hub.roster.get("room-2").members["v"].connected
+
+
+def test_incomplete_snapshot_drops_nothing(hub):
+    hub._apply("roster.sync", "", {"g": 1, "rooms": [[ROOM, True, {"u": {"n": 1}}]]}, "peer")
+    hub._apply("roster.sync_done", "", {"g": 1, "chunks": 2}, "peer")
+
+    assert hub.roster.get("room-2").members["v"].connected
+
+
+def test_workers_missing_from_the_registry_expire(hub, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("backend.app.routers.ws.time.monotonic", lambda: now[0])
+    hub._expire_workers()
+    assert hub.roster.get(ROOM) is not None
+
+    now[0] += 60
+    hub._expire_workers()
+    assert hub.roster.get(ROOM) is None
+    assert hub.roster.workers() == {hub.workers.worker_id}
@@ -0,0 +1,71 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from aiortc.mediastreams import MediaStreamError
+
+from backend.app.services import sfu
+from backend.app.services.sfu import ForwardedTrack
+
+VP8 = SimpleNamespace(clockRate=90000)
+
+
+class FakeReceiver:
+    def __init__(self, kind: str):
+        self.track = SimpleNamespace(kind=kind)
+        self.plis: list[int] = []
+
+    def getSynchronizationSources(self):
+        return [SimpleNamespace(source=1234)]
+
+    async def _send_rtcp_pli(self, ssrc: int):
+        self.plis.append(ssrc)
+
+
+def _frame(data: bytes, timestamp: int):
+    return VP8, SimpleNamespace(data=data, timestamp=timestamp)
+
+
+def test_frames_reach_every_subscriber_undecoded():
+    asyncio.run(_frames_reach_every_subscriber())
+
+
+async def _frames_reach_every_subscriber():
+    receiver = FakeReceiver("video")
+    track = ForwardedTrack(receiver)
+    a, b = track.subscribe(), track.subscribe()
+    await asyncio.sleep(0)
+    # each new subscriber asks the publisher for a keyframe, rate limited
+    assert receiver.plis == [1234]
+
+    receiver._RTCRtpReceiver__decoder_queue.put(_frame(b"\x10vp8", 3000))
+    for sub in (a, b):
+        packet = await sub.recv()
+        assert bytes(packet) == b"\x10vp8"
+        assert packet.pts == 3000 and packet.time_base.denominator == 90000
+
+    # the receiver stopping ends the subscribers; the decoder thread only gets None
+    receiver._RTCRtpReceiver__decoder_queue.put(None)
+    with pytest.raises(MediaStreamError):
+        await a.recv()
+    assert receiver._RTCRtpReceiver__decoder_queue.get_nowait() is None
+
+
+def test_slow_subscriber_restarts_from_a_keyframe(monkeypatch):
+    monkeypatch.setattr(sfu, "SUBSCRIBER_QUEUE_SIZE", 2)
+    asyncio.run(_slow_subscriber())
+
+
+async def _slow_subscriber():
+    receiver = FakeReceiver("video")
+    track = ForwardedTrack(receiver)
+    sub = track.subscribe()
+    track._keyframe_at = 0.0
+    for i in range(3):
+        track.forward(*_frame(bytes([i]), i))
+    await asyncio.sleep(0)
+
+    assert receiver.plis == [1234, 1234]
+    assert bytes(await sub.recv()) == b"\x02"
+    sub.stop()
+    assert not track.subscribers
@@ -0,0 +1,102 @@
+"""Time to build the response body of a large list endpoint.
+
+Runs GET /chat/{room_id}'s query against an in-memory SQLite database
+holding --rows messages, two ways:
+
+  before  ORM objects -> dicts with isoformat() -> jsonable_encoder ->
+          JSONResponse, which is what FastAPI did with the returned list
+  after   column-only query -> rows_response (orjson, no encoder pass)
+
+Reports the best of --repeat runs, split into query and serialization.
+
+    python -m benchmarks.serialize_list --rows 10000
+"""
+import argparse
+import json
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+# before the app is imported: its engine is created from settings
+os.environ["DATABASE_URL"] = "sqlite://"
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+from sqlalchemy.pool import StaticPool  # noqa: E402
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from backend.app.db.session import Base  # noqa: E402
+from backend.app.lib.responses import rows_response  # noqa: E402
+from backend.app.models import Message  # noqa: E402
+
+
+def seed(db, rows: int):
+    room_id, users = uuid.uuid4(), [uuid.uuid4() for _ in range(20)]
+    t0 = datetime.now(timezone.utc) - timedelta(days=1)
+    db.execute(Message.__table__.insert(), [
+        {
+            "id": uuid.uuid4(),
+            "room_id": room_id,
+            "user_id": users[i % len(users)],
+            "content_ciphertext": os.urandom(96).hex(),
+            "created_at": t0 + timedelta(milliseconds=i),
+        }
+        for i in range(rows)
+    ])
+    db.commit()
+    return room_id
+
+
+def before(db, room_id):
+    t0 = time.perf_counter()
+    msgs = db.query(Message).filter(Message.room_id == room_id).order_by(Message.created_at.asc()).all()
+    t1 = time.perf_counter()
+    data = [{"id": str(m.id), "user_id": str(m.user_id), "ciphertext": m.content_ciphertext, "created_at": m.created_at.isoformat()} for m in msgs]
+    body = JSONResponse(jsonable_encoder(data)).body
+    return t1 - t0, time.perf_counter() - t1, len(body)
+
+
+def after(db, room_id):
+    t0 = time.perf_counter()
+    rows = (
+        db.query(Message.id, Message.user_id, Message.content_ciphertext.label("ciphertext"), Message.created_at)
+        .filter(Message.room_id == room_id)
+        .order_by(Message.created_at.asc())
+        .all()
+    )
+    t1 = time.perf_counter()
+    body = rows_response(rows).body
+    return t1 - t0, time.perf_counter() - t1, len(body)
+
+
+def main(rows: int, repeat: int):
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine, tables=[Message.__table__])
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        room_id = seed(db, rows)
+    report = {"rows": rows}
+    for name, fn in (("before", before), ("after", after)):
+        runs = []
+        for _ in range(repeat):
+            # fresh session each run so the identity map doesn't carry objects over
+            with Session() as db:
+                runs.append(fn(db, room_id))
+        query_s, serialize_s, size = min(runs, key=lambda r: r[0] + r[1])
+        report[name] = {
+            "query_ms": round(query_s * 1000, 1),
+            "serialize_ms": round(serialize_s * 1000, 1),
+            "total_ms": round((query_s + serialize_s) * 1000, 1),
+            "bytes": size,
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=10000)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+    main(args.rows, args.repeat)
@@ -0,0 +1,239 @@
+"""Synthetic aiortc peers in an SFU room.
+
+Creates a room with media_mode "sfu", joins N peers through its invite, has
+each publish one synthetic audio+video stream and subscribe to every other
+publisher, then counts the frames each peer receives. Reports per peer how
+many peer connections carry its upload (always 1 here, N-1 in a mesh) and
+how many it receives on.
+
+Server CPU is read from /metrics (process_cpu_seconds_total) around the
+counting window, so run the server as a single worker. With --ramp the run
+is repeated for 2..N peers and each step reports the CPU one more forwarded
+subscription costs.
+
+    python -m benchmarks.sfu_peers --base-url http://localhost:8000 --peers 4 --duration 10
+    python -m benchmarks.sfu_peers --peers 6 --duration 10 --ramp
+"""
+import argparse
+import asyncio
+import json
+import re
+import time
+from collections import Counter
+
+import aiohttp
+from aiortc import RTCPeerConnection, RTCSessionDescription
+from aiortc.mediastreams import AudioStreamTrack, MediaStreamError, VideoStreamTrack
+
+
+class Peer:
+    def __init__(self, http: aiohttp.ClientSession, base_url: str, name: str):
+        self.http = http
+        self.base_url = base_url.rstrip("/")
+        self.name = name
+        self.token: str | None = None
+        self.conn_id: str | None = None
+        self.ws: aiohttp.ClientWebSocketResponse | None = None
+        self.reader: asyncio.Task | None = None
+        self.welcomed = asyncio.Event()
+        self.published = asyncio.Event()
+        self.upstream: RTCPeerConnection | None = None
+        # publisher conn id -> downstream connection
+        self.downstream: dict[str, RTCPeerConnection] = {}
+        self.frames: Counter[str] = Counter()
+        self.errors: Counter[str] = Counter()
+        self._sinks: list[asyncio.Task] = []
+
+    def _auth(self) -> dict:
+        return {"Authorization": f"Bearer {self.token}"}
+
+    async def _post(self, path: str, **kw) -> dict:
+        async with self.http.post(self.base_url + path, **kw) as r:
+            body = await r.json(content_type=None)
+            if r.status >= 400:
+                raise RuntimeError(f"{path}: {r.status} {body}")
+            return body
+
+    async def login(self):
+        body = await self._post("/auth/anonymous", json={"display_name": self.name})
+        self.token = body["access_token"]
+
+    async def create_room(self) -> dict:
+        return await self._post("/rooms/", json={"name": "sfu-bench", "media_mode": "sfu"}, headers=self._auth())
+
+    async def join(self, invite_code: str) -> str:
+        return (await self._post(f"/rooms/join/{invite_code}", headers=self._auth()))["room_id"]
+
+    async def connect(self, room_id: str):
+        ws_url = self.base_url.replace("http", "ws", 1) + f"/ws/{room_id}?token={self.token}"
+        self.ws = await self.http.ws_connect(ws_url)
+        self.reader = asyncio.create_task(self._read())
+        await asyncio.wait_for(self.welcomed.wait(), timeout=10)
+
+    async def send(self, msg: dict):
+        await self.ws.send_str(json.dumps(msg))
+
+    async def publish(self):
+        pc = self.upstream = RTCPeerConnection()
+        pc.addTrack(AudioStreamTrack())
+        pc.addTrack(VideoStreamTrack())
+        await pc.setLocalDescription(await pc.createOffer())
+        await self.send({"type": "sfu.publish", "sdp": {"type": pc.localDescription.type, "sdp": pc.localDescription.sdp}})
+        await asyncio.wait_for(self.published.wait(), timeout=10)
+
+    async def subscribe(self, publisher: str | None):
+        if publisher and publisher != self.conn_id:
+            await self.send({"type": "sfu.subscribe", "publisher": publisher})
+
+    async def _count(self, publisher: str, track):
+        while True:
+            try:
+                await track.recv()
+            except MediaStreamError:
+                return
+            self.frames[f"{publisher}:{track.kind}"] += 1
+
+    async def _answer(self, publisher: str, sdp: dict):
+        old = self.downstream.pop(publisher, None)
+        if old is not None:
+            await old.close()
+        pc = self.downstream[publisher] = RTCPeerConnection()
+
+        @pc.on("track")
+        def on_track(track):
+            self._sinks.append(asyncio.create_task(self._count(publisher, track)))
+
+        await pc.setRemoteDescription(RTCSessionDescription(sdp=sdp["sdp"], type=sdp["type"]))
+        await pc.setLocalDescription(await pc.createAnswer())
+        await self.send({"type": "sfu.answer", "publisher": publisher, "sdp": {"type": pc.localDescription.type, "sdp": pc.localDescription.sdp}})
+
+    async def _read(self):
+        async for msg in self.ws:
+            if msg.type != aiohttp.WSMsgType.TEXT:
+                continue
+            data = json.loads(msg.data)
+            t = data.get("type")
+            if t == "welcome":
+                self.conn_id = data["conn_id"]
+                if data.get("media_mode") != "sfu":
+                    self.errors["not_sfu"] += 1
+                self.welcomed.set()
+            elif t == "sfu.publishers":
+                for p in data.get("items", []):
+                    await self.subscribe(p.get("conn_id"))
+            elif t == "sfu.publisher":
+                await self.subscribe(data.get("conn_id"))
+            elif t == "sfu.answer":
+                await self.upstream.setRemoteDescription(RTCSessionDescription(sdp=data["sdp"]["sdp"], type=data["sdp"]["type"]))
+                self.published.set()
+            elif t == "sfu.offer":
+                await self._answer(data["publisher"], data["sdp"])
+            elif t == "sfu.unpublished":
+                pc = self.downstream.pop(data.get("conn_id"), None)
+                if pc is not None:
+                    await pc.close()
+            elif t == "error":
+                self.errors[data.get("code", "unknown")] += 1
+
+    async def close(self):
+        for task in self._sinks:
+            task.cancel()
+        pcs = list(self.downstream.values()) + ([self.upstream] if self.upstream else [])
+        await asyncio.gather(*(pc.close() for pc in pcs), return_exceptions=True)
+        if self.ws is not None:
+            await self.ws.close()
+        if self.reader is not None:
+            self.reader.cancel()
+
+
+async def server_cpu(http: aiohttp.ClientSession, base_url: str) -> float | None:
+    """CPU seconds the server process has used; None if /metrics doesn't say."""
+    try:
+        async with http.get(base_url.rstrip("/") + "/metrics") as r:
+            text = await r.text()
+    except aiohttp.ClientError:
+        return None
+    m = re.search(r"^process_cpu_seconds_total ([0-9.e+-]+)$", text, re.M)
+    return float(m.group(1)) if m else None
+
+
+async def run(args, n: int) -> dict:
+    async with aiohttp.ClientSession() as http:
+        peers = [Peer(http, args.base_url, f"sfu-peer-{i}") for i in range(n)]
+        await asyncio.gather(*(p.login() for p in peers))
+        room = await peers[0].create_room()
+        room_id = room["id"]
+        for p in peers:
+            await p.join(room["invite_code"])
+            await p.connect(room_id)
+        t0 = time.perf_counter()
+        await asyncio.gather(*(p.publish() for p in peers))
+        setup = time.perf_counter() - t0
+        # subscriptions are negotiated after the publishes; measure once media flows
+        await asyncio.sleep(args.warmup)
+        for p in peers:
+            p.frames.clear()
+        cpu0 = await server_cpu(http, args.base_url)
+        await asyncio.sleep(args.duration)
+        cpu1 = await server_cpu(http, args.base_url)
+        subscriptions = sum(len(p.downstream) for p in peers)
+        cpu_pct = round((cpu1 - cpu0) / args.duration * 100, 1) if cpu0 is not None and cpu1 is not None else None
+        report = {
+            "peers": n,
+            "setup_s": round(setup, 3),
+            "duration_s": args.duration,
+            "subscriptions": subscriptions,
+            # percent of one core
+            "server_cpu_pct": cpu_pct,
+            "server_cpu_pct_per_subscription": round(cpu_pct / subscriptions, 2) if cpu_pct is not None and subscriptions else None,
+            "items": [
+                {
+                    "peer": p.name,
+                    "upstream_pcs": 1,
+                    "mesh_upstream_pcs": n - 1,
+                    "downstream_pcs": len(p.downstream),
+                    "publishers_received": len({k.split(":")[0] for k in p.frames}),
+                    "frames_per_s": round(sum(p.frames.values()) / args.duration, 1),
+                    "errors": dict(p.errors),
+                }
+                for p in peers
+            ],
+        }
+        await asyncio.gather(*(p.close() for p in peers))
+    return report
+
+
+def complete(report: dict) -> bool:
+    # every peer should receive media from every other one
+    return all(i["publishers_received"] == report["peers"] - 1 for i in report["items"])
+
+
+async def main(args) -> int:
+    if not args.ramp:
+        report = await run(args, args.peers)
+        print(json.dumps(report, indent=2))
+        return 0 if complete(report) else 1
+    steps, prev = [], None
+    for n in range(2, args.peers + 1):
+        report = await run(args, n)
+        step = {k: report[k] for k in ("peers", "subscriptions", "server_cpu_pct", "server_cpu_pct_per_subscription")}
+        step["complete"] = complete(report)
+        if prev is not None and None not in (report["server_cpu_pct"], prev["server_cpu_pct"]):
+            added = report["subscriptions"] - prev["subscriptions"]
+            step["cpu_pct_per_added_subscription"] = round((report["server_cpu_pct"] - prev["server_cpu_pct"]) / added, 2) if added else None
+        steps.append(step)
+        prev = report
+        # let the server close the previous room's connections
+        await asyncio.sleep(1)
+    print(json.dumps({"duration_s": args.duration, "steps": steps}, indent=2))
+    return 0 if all(s["complete"] for s in steps) else 1
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--base-url", default="http://localhost:8000")
+    ap.add_argument("--peers", type=int, default=4)
+    ap.add_argument("--duration", type=float, default=10.0, help="seconds to count received frames")
+    ap.add_argument("--warmup", type=float, default=3.0, help="seconds for subscriptions to start before measuring")
+    ap.add_argument("--ramp", action="store_true", help="repeat for 2..PEERS peers and report CPU per added subscription")
+    raise SystemExit(asyncio.run(main(ap.parse_args())))
@@ -0,0 +1,84 @@
+"""Bytes on the wire for one SDP offer in rooms of different sizes.
+
+Compares the old behaviour (undirected signal broadcast to the whole room)
+with addressed delivery through RoomHub.route_signal. Sockets are fakes that
+count payload bytes plus the server-to-client WebSocket frame header.
+
+    python -m benchmarks.signal_fanout --sizes 2,10,50
+"""
+import argparse
+import asyncio
+import json
+
+from backend.app.routers.ws import Connection, RoomHub
+
+
+def frame_bytes(payload: int) -> int:
+    # unmasked server frame: 2 byte header, 16/64 bit extended length
+    if payload < 126:
+        return payload + 2
+    if payload < 65536:
+        return payload + 4
+    return payload + 10
+
+
+class CountingSocket:
+    def __init__(self):
+        self.frames = 0
+        self.bytes = 0
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        self.frames += 1
+        self.bytes += frame_bytes(len(text.encode("utf-8")))
+
+
+def fake_sdp(lines: int = 90) -> str:
+    # shape of a browser audio+video offer, ~3 KB
+    body = ["v=0", "o=- 4611731400430051336 2 IN IP4 127.0.0.1", "s=-", "t=0 0", "a=group:BUNDLE 0 1"]
+    for i in range(lines):
+        body.append(f"a=candidate:{i} 1 udp 2122260223 192.168.1.{i % 250} {50000 + i} typ host generation 0")
+    return "\r\n".join(body)[:3000]
+
+
+async def measure(size: int, addressed: bool) -> tuple[int, int]:
+    hub = RoomHub()
+    room = "bench"
+    conns = []
+    for i in range(size):
+        c = Connection(CountingSocket(), f"user-{i}", f"User {i}")
+        await hub.connect(room, c)
+        conns.append(c)
+    sender, target = conns[0], conns[-1]
+    offer = {"type": "signal", "sdp": {"type": "offer", "sdp": fake_sdp()}}
+    if addressed:
+        hub.route_signal(room, sender, dict(offer, to_user=target.user_id))
+    else:
+        msg = {"type": "signal", "from": sender.user_id, "from_conn": sender.conn_id}
+        msg.update(offer)
+        await hub.broadcast(room, msg, skip_conn=sender)
+    # let writer tasks drain the queues
+    await asyncio.sleep(0)
+    while any(not c.queue.empty() for c in conns):
+        await asyncio.sleep(0)
+    for c in conns:
+        await hub.disconnect(room, c)
+    return sum(c.ws.frames for c in conns), sum(c.ws.bytes for c in conns)
+
+
+async def main(sizes: list[int]):
+    rows = []
+    for n in sizes:
+        bf, bb = await measure(n, addressed=False)
+        af, ab = await measure(n, addressed=True)
+        rows.append({"room_size": n, "broadcast_frames": bf, "broadcast_bytes": bb, "addressed_frames": af, "addressed_bytes": ab})
+    print(json.dumps(rows, indent=2))
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="2,10,50")
+    args = ap.parse_args()
+    asyncio.run(main([int(x) for x in args.sizes.split(",")]))